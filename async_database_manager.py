@@ -0,0 +1,93 @@
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List
+
+from database_manager import DatabaseManager
+from db_records import UserMapping
+from monitoring.metrics import metrics
+from monitoring.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+DB_CALL_DURATION = metrics.histogram(
+    "bot_db_call_duration_seconds",
+    "Database manager calls including wait in the database thread queue.",
+    ("method",)
+)
+
+class AsyncDatabaseManager:
+    """Асинхронный фасад над DatabaseManager.
+
+    Все обращения к SQLite выполняются в одном выделенном потоке БД (единственный
+    писатель, запросы выстраиваются в очередь), поэтому commit/fsync не блокирует
+    event loop. Имена методов совпадают с DatabaseManager, результат нужно ожидать:
+    ``await db.get_payment_request(request_id)``.
+
+    Генераторы и контекстные менеджеры (transaction, iter_table_rows) не проксируются:
+    их тело выполнялось бы там, где их перебирают или входят в блок, то есть вне потока БД.
+    Такой код оборачивается в функцию и выполняется целиком через ``await db.run(func)``
+    с обращениями к ``db.sync``.
+    """
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.sync = db_manager
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._queue_depth = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество запросов, ожидающих или выполняющихся в потоке БД"""
+        return self._queue_depth
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.sync, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        # @contextmanager сохраняет исходную функцию-генератор в __wrapped__
+        if inspect.isgeneratorfunction(inspect.unwrap(attr)):
+            raise TypeError(
+                f"{name} — генератор или контекстный менеджер и не выполняется в потоке БД через фасад; "
+                f"вызывайте db.sync.{name} внутри функции, переданной в await db.run(...)"
+            )
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        # Кешируем обертку, чтобы __getattr__ не вызывался повторно
+        setattr(self, name, method)
+        return method
+
+    async def run(self, func, *args, **kwargs):
+        """Выполнение произвольной синхронной функции в потоке БД"""
+        loop = asyncio.get_running_loop()
+        self._queue_depth += 1
+        name = getattr(func, '__name__', 'call')
+        started = time.perf_counter()
+        try:
+            with tracer.span(f"db.{name}"):
+                return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        finally:
+            self._queue_depth -= 1
+            DB_CALL_DURATION.labels(name).observe(time.perf_counter() - started)
+
+    async def get_users_by_telegram_id(self, telegram_id: int) -> List[UserMapping]:
+        """Аккаунты пользователя: попадание в кеш обслуживается без переключения в поток БД"""
+        accounts = self.sync.mapping_cache.get_accounts(telegram_id)
+        if accounts is not None:
+            return accounts
+        return await self.run(self.sync.load_users_by_telegram_id, telegram_id)
+
+    async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[UserMapping]:
+        """Получение пользователя по Telegram ID"""
+        accounts = await self.get_users_by_telegram_id(telegram_id)
+        return accounts[0] if accounts else None
+
+    def close(self):
+        """Завершение потока БД после выполнения уже поставленных запросов"""
+        self._executor.shutdown(wait=True)
+        logger.info("Поток базы данных остановлен")
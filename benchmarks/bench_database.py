@@ -0,0 +1,324 @@
+"""Микробенчмарки DatabaseManager на синтетических наборах данных
+
+Для каждого масштаба (число строк в user_telegram_mapping, payment_history и
+payment_requests) генерируется база с реалистичным распределением данных: 80%
+аккаунтов связаны с Telegram, около 1% заявок ожидают проверки, платежи и регистрации
+распределены по двум годам. Сгенерированные базы кешируются в benchmarks/.data
+(ключ — масштаб, seed и версия схемы), замеры идут на копии.
+
+    python benchmarks/bench_database.py --scales 10k,100k
+    python benchmarks/bench_database.py --scales 1m --only get_statistics,get_new_users_last_24h
+    python benchmarks/bench_database.py --scales 100k --compare benchmarks/results/db_<commit>.json
+
+Результаты сохраняются в JSON (benchmarks/results/db_<commit>_<время>.json) для
+сравнения между коммитами: медиана, p95, минимум и среднее в миллисекундах.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database_manager import DatabaseManager
+from db_profiler import QueryStats
+
+DATA_DIR = os.path.join(ROOT, "benchmarks", ".data")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+DAY = 24 * 60 * 60
+HISTORY_DAYS = 730
+TELEGRAM_BASE_ID = 100000000
+PLANS = (("1", 150.0), ("2", 400.0), ("3", 750.0))
+
+def parse_scale(value: str) -> int:
+    value = value.strip().lower()
+    multiplier = {"k": 1000, "m": 1000000}.get(value[-1], 1)
+    return int(float(value.rstrip("km")) * multiplier)
+
+def _timestamp(seconds: float) -> str:
+    """Формат CURRENT_TIMESTAMP SQLite (UTC)"""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(seconds))
+
+def schema_version() -> int:
+    """Версия схемы текущего кода (PRAGMA user_version пустой базы)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "schema.db")
+        DatabaseManager(path)
+        conn = sqlite3.connect(path)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        conn.close()
+        return version
+
+def generate_dataset(path: str, rows: int, seed: int = 1):
+    """База со схемой DatabaseManager и rows строками в каждой основной таблице"""
+    rng = random.Random(seed)
+    now = time.time()
+    db = DatabaseManager(path)
+
+    users = []
+    linked: List[Tuple[int, str]] = []
+    for index in range(rows):
+        username = f"user{index:07d}"
+        # Около 0.1% регистраций — за последние сутки (выборка /new_users)
+        age = rng.uniform(0, DAY) if rng.random() < 0.001 else rng.uniform(0, HISTORY_DAYS * DAY)
+        registered = now - age
+        is_linked = rng.random() < 0.8
+        telegram_id = TELEGRAM_BASE_ID + index if is_linked else None
+        source = 'bot' if rng.random() < 0.3 else 'marzban'
+        users.append((
+            username,
+            telegram_id,
+            f"tg_{index}" if is_linked and rng.random() < 0.6 else None,
+            f"+7900{index:07d}" if rng.random() < 0.1 else None,
+            _timestamp(registered),
+            is_linked,
+            rng.choice(('active', 'active', 'active', 'expired', 'limited', 'disabled')),
+            f"Telegram ID: {telegram_id} | Связан через бота" if is_linked else "Автоматически синхронизирован из Marzban",
+            source,
+            _timestamp(registered + rng.uniform(0, min(age, 30 * DAY))) if is_linked else None,
+            _timestamp(now - rng.uniform(0, min(age, 90 * DAY))) if is_linked else None,
+        ))
+        if is_linked:
+            linked.append((telegram_id, username))
+
+    history = []
+    for _ in range(rows):
+        telegram_id, username = rng.choice(linked)
+        plan_id, amount = rng.choice(PLANS)
+        # В payment_method пути оплаты бота записывают идентификатор плана
+        history.append((
+            telegram_id, username, amount, _timestamp(now - rng.uniform(0, HISTORY_DAYS * DAY)),
+            plan_id, f"tx{rng.getrandbits(48):012x}",
+            rng.choices(('completed', 'pending', 'failed'), (90, 5, 5))[0],
+        ))
+
+    requests = []
+    for _ in range(rows):
+        telegram_id, username = rng.choice(linked)
+        plan_id, amount = rng.choice(PLANS)
+        age = rng.uniform(0, HISTORY_DAYS * DAY)
+        # Ожидают проверки заявки последней недели — около 1% от общего числа
+        status = 'pending' if age < 7 * DAY else rng.choices(('approved', 'rejected'), (85, 15))[0]
+        created = now - age
+        processed = None if status == 'pending' else _timestamp(created + rng.uniform(60, DAY))
+        requests.append((
+            telegram_id, username, plan_id, amount, _timestamp(created), status,
+            f"receipt{rng.getrandbits(32):08x}", 'photo', None, processed,
+            None if status == 'pending' else 1,
+        ))
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany('''
+            INSERT INTO user_telegram_mapping (marzban_username, telegram_id, telegram_username, phone_number,
+                registration_date, is_verified, subscription_status, notes, registration_source, linked_at, last_seen_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', users)
+        conn.executemany('''
+            INSERT INTO payment_history (telegram_id, marzban_username, amount, payment_date, payment_method,
+                transaction_id, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', history)
+        conn.executemany('''
+            INSERT INTO payment_requests (telegram_id, marzban_username, plan_id, amount, created_at, status,
+                receipt_file_id, receipt_type, admin_comment, processed_at, processed_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', requests)
+        # Дневные агрегаты ведутся при записи, для массовой вставки — пересчет как при миграции
+        db._backfill_rollups(conn.cursor())
+    conn.execute("ANALYZE")
+    conn.execute("VACUUM")
+    conn.close()
+
+def cached_dataset(rows: int, seed: int, version: int) -> Tuple[str, Optional[float]]:
+    """Путь к сгенерированной базе и время генерации (None — взята из кеша)"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"db_{rows}_s{seed}_v{version}.db")
+    if os.path.exists(path):
+        return path, None
+    started = time.perf_counter()
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    generate_dataset(tmp_path, rows, seed)
+    os.replace(tmp_path, path)
+    return path, time.perf_counter() - started
+
+class Workload:
+    """Случайные, но воспроизводимые аргументы вызовов для одной базы"""
+
+    def __init__(self, path: str, seed: int):
+        self.rng = random.Random(seed)
+        conn = sqlite3.connect(path)
+        self.linked = [row for row in conn.execute(
+            "SELECT telegram_id, marzban_username FROM user_telegram_mapping WHERE telegram_id IS NOT NULL")]
+        self.usernames = [row[0] for row in conn.execute("SELECT marzban_username FROM user_telegram_mapping")]
+        self.request_ids = [row[0] for row in conn.execute("SELECT id FROM payment_requests")]
+        self.pending_ids = [row[0] for row in conn.execute(
+            "SELECT id FROM payment_requests WHERE status = 'pending' ORDER BY id DESC")]
+        conn.close()
+
+    def telegram_id(self) -> int:
+        return self.rng.choice(self.linked)[0]
+
+    def username(self) -> str:
+        return self.rng.choice(self.usernames)
+
+    def search_query(self) -> str:
+        """Логин целиком или без последних символов (до ~100 совпадений), как ищут админы"""
+        username = self.username()
+        return username[:len(username) - self.rng.randint(0, 2)]
+
+def build_benchmarks(db: DatabaseManager, work: Workload) -> Dict[str, Callable[[], object]]:
+    """Замеряемые вызовы: имя → функция без аргументов"""
+    middle_pending = work.pending_ids[len(work.pending_ids) // 2] if work.pending_ids else None
+    return {
+        # Чтения по ключу
+        "get_user_by_marzban_username": lambda: db.get_user_by_marzban_username(work.username()),
+        "load_users_by_telegram_id": lambda: db.load_users_by_telegram_id(work.telegram_id()),
+        "get_users_by_telegram_id": lambda: db.get_users_by_telegram_id(work.telegram_id()),
+        "get_payment_request": lambda: db.get_payment_request(work.rng.choice(work.request_ids)),
+        # Очередь заявок
+        "get_pending_payment_requests": db.get_pending_payment_requests,
+        "get_pending_payment_requests_page": db.get_pending_payment_requests_page,
+        "get_pending_payment_requests_page_middle": lambda: db.get_pending_payment_requests_page(after_id=middle_pending),
+        "count_pending_payment_requests": db.count_pending_payment_requests,
+        # История и поиск
+        "get_payment_history_by_telegram_id": lambda: db.get_payment_history(telegram_id=work.telegram_id()),
+        "get_payment_history_by_username": lambda: db.get_payment_history(marzban_username=work.rng.choice(work.linked)[1]),
+        "search_users": lambda: db.search_users(work.search_query()),
+        # Сводки
+        "get_statistics": db.get_statistics,
+        "get_new_users_last_24h": db.get_new_users_last_24h,
+        "get_unlinked_users": db.get_unlinked_users,
+        "get_daily_rollups_30d": lambda: db.get_daily_rollups(30),
+        "get_revenue_breakdown_30d": lambda: db.get_revenue_breakdown(30),
+        "warm_mapping_cache": db.warm_mapping_cache,
+        # Записи (каждая — отдельная транзакция с commit)
+        "touch_last_seen": lambda: db.touch_last_seen(work.telegram_id()),
+        "create_payment_request": lambda: db.create_payment_request(*work.rng.choice(work.linked), "1", 150.0),
+        "record_payment": lambda: db.record_payment(*work.rng.choice(work.linked), 150.0, "card", plan_id="1"),
+    }
+
+def measure(func: Callable[[], object], min_runs: int, max_runs: int, max_seconds: float) -> Dict[str, float]:
+    """Повторные вызовы до max_runs или max_seconds (но не меньше min_runs); времена в мс"""
+    func()  # прогрев: кеш страниц SQLite, подготовленные выражения
+    times = []
+    deadline = time.perf_counter() + max_seconds
+    while len(times) < max_runs and (len(times) < min_runs or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    times.sort()
+    return {
+        "runs": len(times),
+        "min_ms": round(times[0], 4),
+        "median_ms": round(times[len(times) // 2], 4),
+        "p95_ms": round(times[min(int(len(times) * 0.95), len(times) - 1)], 4),
+        "mean_ms": round(sum(times) / len(times), 4),
+    }
+
+def run_scale(rows: int, args, version: int) -> Dict:
+    source, generated = cached_dataset(rows, args.seed, version)
+    if generated is not None:
+        print(f"  сгенерирована база на {rows} строк за {generated:.1f} с")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Записи бенчмарков не должны менять закешированный набор
+        path = os.path.join(tmp, "bench.db")
+        shutil.copyfile(source, path)
+        db = DatabaseManager(path, query_stats=QueryStats(float('inf')) if args.query_stats else None)
+        work = Workload(path, args.seed)
+        benchmarks = build_benchmarks(db, work)
+        selected = args.only or list(benchmarks)
+
+        results = {}
+        for name in selected:
+            if name not in benchmarks:
+                raise SystemExit(f"Неизвестный бенчмарк: {name}")
+            results[name] = measure(benchmarks[name], args.min_runs, args.max_runs, args.max_seconds)
+            row = results[name]
+            print(f"  {name:<42} {row['median_ms']:>10.3f} {row['p95_ms']:>10.3f} {row['runs']:>7}")
+        size = os.path.getsize(source)
+    return {"rows": rows, "db_bytes": size, "generate_seconds": generated, "benchmarks": results}
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def print_comparison(current: Dict, previous: Dict):
+    """Отношение медиан текущего прогона к сохраненному (меньше 1 — быстрее)"""
+    print(f"\nСравнение с {previous['meta']['commit']} ({previous['meta']['timestamp']}):")
+    for scale, data in current["scales"].items():
+        old = previous["scales"].get(scale)
+        if not old:
+            continue
+        print(f"  {scale} строк:")
+        for name, row in data["benchmarks"].items():
+            old_row = old["benchmarks"].get(name)
+            if not old_row:
+                continue
+            ratio = row["median_ms"] / old_row["median_ms"] if old_row["median_ms"] else float('inf')
+            mark = "  ⬆ медленнее" if ratio > 1.2 else "  ⬇ быстрее" if ratio < 0.83 else ""
+            print(f"    {name:<42} {old_row['median_ms']:>10.3f} → {row['median_ms']:>10.3f} мс  ×{ratio:.2f}{mark}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки DatabaseManager")
+    parser.add_argument("--scales", default="10k,100k", help="число строк в таблицах: 10k,100k,1m")
+    parser.add_argument("--only", type=lambda value: value.split(','), help="бенчмарки через запятую")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--min-runs", type=int, default=5)
+    parser.add_argument("--max-runs", type=int, default=2000)
+    parser.add_argument("--max-seconds", type=float, default=2.0, help="бюджет времени на бенчмарк")
+    parser.add_argument("--query-stats", action="store_true", help="с учетом SQL-запросов (как в продакшене)")
+    parser.add_argument("--output", help="файл результатов JSON")
+    parser.add_argument("--compare", help="сравнить с сохраненным файлом результатов")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    version = schema_version()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "schema_version": version,
+            "seed": args.seed,
+            "query_stats": args.query_stats,
+        },
+        "scales": {},
+    }
+    for rows in (parse_scale(value) for value in args.scales.split(',')):
+        print(f"\n{rows} строк  {'бенчмарк':<40} {'медиана мс':>10} {'p95 мс':>10} {'вызовов':>7}")
+        report["scales"][str(rows)] = run_scale(rows, args, version)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"db_{commit}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print_comparison(report, json.load(f))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Стоимость маршрутизации текстовых сообщений (кнопки нижнего меню)
+
+Сравнивает прежнюю цепочку if/elif (get_json и класс FakeQuery на каждое
+сообщение) с таблицами BotCoordinator и замеряет полный вызов
+handle_text_messages с пустыми обработчиками.
+
+    python benchmarks/bench_text_dispatch.py -n 200000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_database_manager import AsyncDatabaseManager
+from bot_coordinator import BotCoordinator
+from database_manager import DatabaseManager
+from marzban_api import MarzbanAPI
+from texts import get_json
+
+def legacy_route(text: str, is_admin_user: bool):
+    """Прежняя логика handle_text_messages без вызова обработчиков"""
+    buttons = get_json("handlers.user_messages")["menu"]["buttons"]
+
+    class FakeQuery:
+        def __init__(self, message, user):
+            self.message = message
+            self.from_user = user
+
+    for key in ("my_status", "subscription_link", "apps", "support", "help",
+                "main_menu", "payment", "create_account", "link_account"):
+        if text == buttons[key]:
+            return key
+    if is_admin_user and text == buttons.get("admin_panel"):
+        return "admin_panel"
+    return None
+
+def bench(label: str, func, iterations: int):
+    start = time.perf_counter()
+    func(iterations)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed / iterations * 1e9:>10.0f} нс/сообщение")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--iterations", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncDatabaseManager(DatabaseManager(os.path.join(tmp, "bench.db")))
+        coordinator = BotCoordinator(db, MarzbanAPI("http://127.0.0.1:9", "bench", "bench"))
+
+        buttons = get_json("handlers.user_messages")["menu"]["buttons"]
+        # Смесь как в реальном трафике: в основном кнопки меню и немного свободного ввода
+        texts = [buttons[key] for key in ("my_status", "subscription_link", "payment", "main_menu", "help")]
+        texts.append("произвольный текст")
+
+        def run_legacy(n):
+            for i in range(n):
+                legacy_route(texts[i % len(texts)], False)
+
+        def run_table(n):
+            routes = coordinator._user_text_routes
+            for i in range(n):
+                routes.get(texts[i % len(texts)])
+
+        bench("if/elif + get_json + FakeQuery", run_legacy, args.iterations)
+        bench("таблица маршрутов", run_table, args.iterations)
+
+        # Полный handle_text_messages: обработчики заменены пустыми корутинами
+        async def noop(update, context):
+            return None
+
+        for routes in (coordinator._user_text_routes, coordinator._admin_text_routes):
+            for key in routes:
+                routes[key] = noop
+        coordinator.registration_handlers.handle_text_messages = noop
+
+        user = SimpleNamespace(id=0)
+        updates = [SimpleNamespace(message=SimpleNamespace(text=text), effective_user=user) for text in texts]
+
+        async def run_full(n):
+            for i in range(n):
+                await coordinator.handle_text_messages(updates[i % len(updates)], None)
+
+        bench("handle_text_messages (пустые обработчики)",
+              lambda n: asyncio.run(run_full(n)), args.iterations)
+        db.close()
+
+if __name__ == "__main__":
+    main()
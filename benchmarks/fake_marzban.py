@@ -0,0 +1,263 @@
+"""Локальная заглушка панели Marzban для нагрузочных тестов и бенчмарков
+
+Реализует эндпоинты, которыми пользуется MarzbanAPI: выдачу токена, пользователей
+(GET/PUT/PATCH/POST), список с постраничной выдачей и ссылки подписки /sub/{username}.
+Набор пользователей генерируется детерминированно из seed; задержку ответа,
+долю ошибок 500 и поддержку PATCH (настоящая панель отвечает 405) можно задать.
+
+    python benchmarks/fake_marzban.py --users 10000 --latency-ms 30 --jitter-ms 20 --error-rate 0.01
+
+В том же процессе, что и синхронный MarzbanAPI, сервер запускается в своем потоке:
+
+    fake = FakeMarzban(users=1000, latency=0.02)
+    base_url = fake.start_in_thread()
+    api = MarzbanAPI(base_url, fake.admin_username, fake.admin_password)
+    ...
+    fake.stop_thread()
+
+GET /_fake/stats — число запросов по эндпоинтам и статусам, POST /_fake/reset — сброс
+данных и счетчиков.
+"""
+import argparse
+import asyncio
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+DAY = 24 * 60 * 60
+GB = 1024 ** 3
+
+class FakeMarzban:
+    """Заглушка панели Marzban на aiohttp"""
+
+    def __init__(self, users: int = 1000, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 seed: int = 1, support_patch: bool = True,
+                 admin_username: str = "admin", admin_password: str = "admin"):
+        self.users_count = users
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.seed = seed
+        self.support_patch = support_patch
+        self.admin_username = admin_username
+        self.admin_password = admin_password
+        self.tokens = set()
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.stats: Counter = Counter()
+        self._random = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.reset()
+
+    def reset(self):
+        """Пересоздание набора пользователей и счетчиков (детерминированно из seed)"""
+        self._random = random.Random(self.seed)
+        self.stats.clear()
+        self.users = {}
+        now = int(time.time())
+        statuses = ("active", "active", "active", "expired", "limited", "disabled")
+        for index in range(self.users_count):
+            username = f"user{index:06d}"
+            status = self._random.choice(statuses)
+            expire = now + self._random.randint(1, 90) * DAY if status == "active" else now - self._random.randint(1, 30) * DAY
+            data_limit = self._random.choice((None, 50 * GB, 100 * GB))
+            self.users[username] = {
+                "username": username,
+                "proxies": {"vless": {"id": f"{self._random.getrandbits(128):032x}", "flow": "xtls-rprx-vision"}},
+                "status": status,
+                "expire": expire,
+                "data_limit": data_limit,
+                "used_traffic": self._random.randint(0, data_limit or 200 * GB),
+                "lifetime_used_traffic": self._random.randint(0, 500 * GB),
+                # У части пользователей Telegram ID уже записан в примечание (импорт связей)
+                "note": f"Telegram ID: {100000000 + index}" if index % 3 == 0 else "",
+                "created_at": time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(now - self._random.randint(1, 365) * DAY)),
+                "online_at": None,
+            }
+
+    def make_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_post('/api/admin/token', self.handle_token)
+        app.router.add_post('/api/user', self.handle_create_user)
+        app.router.add_get('/api/user/{username}', self.handle_get_user)
+        app.router.add_put('/api/user/{username}', self.handle_put_user)
+        app.router.add_patch('/api/user/{username}', self.handle_patch_user)
+        app.router.add_get('/api/users', self.handle_list_users)
+        # add_get регистрирует и HEAD, которым MarzbanAPI проверяет ссылки подписки
+        app.router.add_get('/sub/{username}', self.handle_subscription)
+        app.router.add_get('/_fake/stats', self.handle_stats)
+        app.router.add_post('/_fake/reset', self.handle_reset)
+        return app
+
+    # ========== СЕРВЕР ==========
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Запуск в текущем event loop; port=0 — свободный порт. Возвращает базовый URL"""
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{self._runner.addresses[0][1]}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def start_in_thread(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Запуск в отдельном потоке со своим event loop (для синхронных клиентов)"""
+        started = threading.Event()
+        result = {}
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            result['url'] = self._loop.run_until_complete(self.start(host, port))
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="fake-marzban", daemon=True)
+        self._thread.start()
+        started.wait()
+        return result['url']
+
+    def stop_thread(self):
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    # ========== ОБРАБОТЧИКИ ==========
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        route = request.match_info.route.resource
+        endpoint = route.canonical if route is not None else "unknown"
+        if not endpoint.startswith('/_fake/'):
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            if delay:
+                await asyncio.sleep(delay)
+            if self.error_rate and self._random.random() < self.error_rate:
+                response = web.json_response({"detail": "Injected error"}, status=500)
+                self.stats[f"{request.method} {endpoint} 500"] += 1
+                return response
+            if endpoint.startswith('/api/') and endpoint != '/api/admin/token':
+                token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+                if token not in self.tokens:
+                    self.stats[f"{request.method} {endpoint} 401"] += 1
+                    return web.json_response({"detail": "Could not validate credentials"}, status=401)
+        try:
+            response = await handler(request)
+        except web.HTTPException as e:
+            response = e
+        self.stats[f"{request.method} {endpoint} {response.status}"] += 1
+        return response
+
+    async def handle_token(self, request: web.Request):
+        form = await request.post()
+        if form.get('username') != self.admin_username or form.get('password') != self.admin_password:
+            return web.json_response({"detail": "Incorrect username or password"}, status=401)
+        token = secrets.token_hex(16)
+        self.tokens.add(token)
+        return web.json_response({"access_token": token, "token_type": "bearer"})
+
+    def _user_response(self, request: web.Request, user: Dict[str, Any]) -> web.Response:
+        return web.json_response({**user, "subscription_url": f"{request.scheme}://{request.host}/sub/{user['username']}"})
+
+    def _find_user(self, request: web.Request) -> Dict[str, Any]:
+        user = self.users.get(request.match_info['username'])
+        if user is None:
+            raise web.HTTPNotFound(text='{"detail": "User not found"}', content_type='application/json')
+        return user
+
+    async def handle_get_user(self, request: web.Request):
+        return self._user_response(request, self._find_user(request))
+
+    async def handle_create_user(self, request: web.Request):
+        data = await request.json()
+        username = data.get('username')
+        if not username:
+            return web.json_response({"detail": "username is required"}, status=422)
+        if username in self.users:
+            return web.json_response({"detail": "User already exists"}, status=409)
+        user = {
+            "username": username,
+            "proxies": data.get('proxies') or {"vless": {}},
+            "status": data.get('status', 'active'),
+            "expire": data.get('expire'),
+            "data_limit": data.get('data_limit'),
+            "used_traffic": 0,
+            "lifetime_used_traffic": 0,
+            "note": data.get('note', ''),
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime()),
+            "online_at": None,
+        }
+        self.users[username] = user
+        return self._user_response(request, user)
+
+    async def handle_put_user(self, request: web.Request):
+        user = self._find_user(request)
+        data = await request.json()
+        user.update({key: value for key, value in data.items() if key in user and key != 'username'})
+        return self._user_response(request, user)
+
+    async def handle_patch_user(self, request: web.Request):
+        if not self.support_patch:
+            return web.json_response({"detail": "Method Not Allowed"}, status=405)
+        return await self.handle_put_user(request)
+
+    async def handle_list_users(self, request: web.Request):
+        try:
+            offset = int(request.query.get('offset', 0))
+            limit = int(request.query.get('limit', 100))
+        except ValueError:
+            return web.json_response({"detail": "offset and limit must be integers"}, status=422)
+        usernames = list(self.users)[offset:offset + limit]
+        users = [
+            {**self.users[name], "subscription_url": f"{request.scheme}://{request.host}/sub/{name}"}
+            for name in usernames
+        ]
+        return web.json_response({"users": users, "total": len(self.users)})
+
+    async def handle_subscription(self, request: web.Request):
+        user = self._find_user(request)
+        uuid = user['proxies'].get('vless', {}).get('id', '')
+        lines = [
+            f"vless://{uuid}@{request.host.split(':')[0]}:443?security=reality&flow=xtls-rprx-vision#{user['username']}-{index}"
+            for index in range(3)
+        ]
+        return web.Response(text="\n".join(lines))
+
+    async def handle_stats(self, request: web.Request):
+        return web.json_response(dict(self.stats))
+
+    async def handle_reset(self, request: web.Request):
+        self.reset()
+        return web.json_response({"users": len(self.users)})
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка панели Marzban")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--users", type=int, default=1000, help="размер набора пользователей")
+    parser.add_argument("--latency-ms", type=float, default=0, help="задержка каждого ответа")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="случайная добавка к задержке (0..jitter)")
+    parser.add_argument("--error-rate", type=float, default=0, help="доля ответов 500")
+    parser.add_argument("--no-patch", action="store_true", help="PATCH отвечает 405, как настоящая панель")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    fake = FakeMarzban(args.users, args.latency_ms / 1000, args.jitter_ms / 1000, args.error_rate,
+                       args.seed, not args.no_patch)
+    print(f"Заглушка Marzban: http://{args.host}:{args.port}, пользователей {args.users}, "
+          f"логин {fake.admin_username}/{fake.admin_password}")
+    web.run_app(fake.make_app(), host=args.host, port=args.port, access_log=None, print=None)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
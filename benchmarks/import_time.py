@@ -0,0 +1,140 @@
+"""Время холодного импорта бота и проверка бюджета запуска
+
+Каждый прогон — новый процесс `python -X importtime -c "import main"`: интерпретатор
+без прогретых модулей, как при перезапуске после деплоя. Отчет показывает медиану
+времени импорта, самые тяжелые модули по полному и собственному времени и сумму
+собственного времени по пакетам верхнего уровня (telegram, requests, модули бота).
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 10 --top 30
+    python benchmarks/import_time.py --budget 400 --quiet   # для CI: код 1 при превышении
+
+Бюджет по умолчанию — MONITORING['import_time_budget_ms'] (IMPORT_TIME_BUDGET_MS).
+С --output разбор медианного прогона сохраняется в JSON.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def project_packages() -> set:
+    """Имена модулей и пакетов бота верхнего уровня"""
+    names = set()
+    for entry in os.listdir(ROOT):
+        path = os.path.join(ROOT, entry)
+        if entry.endswith('.py'):
+            names.add(entry[:-3])
+        elif os.path.isfile(os.path.join(path, '__init__.py')):
+            names.add(entry)
+    return names
+
+def parse_importtime(output: str) -> List[Dict]:
+    """Строки `import time: self | cumulative | name` в словари (время в микросекундах)"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        if not self_us.strip().isdigit():
+            continue  # заголовок
+        rows.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+        })
+    return rows
+
+def run_once(module: str) -> Dict:
+    """Один холодный импорт в отдельном процессе"""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} завершился с кодом {result.returncode}:\n{result.stderr[-2000:]}")
+    rows = parse_importtime(result.stderr)
+    top = next((row for row in reversed(rows) if row["module"] == module and row["depth"] == 0), None)
+    if top is None:
+        raise RuntimeError(f"В выводе -X importtime нет модуля {module}")
+    return {"import_ms": top["cumulative_us"] / 1000, "process_ms": wall * 1000, "rows": rows}
+
+def group_by_package(rows: List[Dict], project: set) -> Dict[str, float]:
+    """Собственное время модулей, сложенное по пакету верхнего уровня, мс"""
+    totals = defaultdict(float)
+    for row in rows:
+        package = row["module"].split('.')[0]
+        totals["(бот) " + package if package in project else package] += row["self_us"] / 1000
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+def print_report(run: Dict, module: str, top: int, project: set):
+    rows = run["rows"]
+    print(f"\nСамые тяжелые модули по полному времени (медианный прогон, {len(rows)} модулей):")
+    print(f"  {'всего мс':>9} {'свое мс':>8}  модуль")
+    for row in sorted(rows, key=lambda row: row["cumulative_us"], reverse=True)[:top]:
+        if row["module"] == module:
+            continue
+        print(f"  {row['cumulative_us'] / 1000:>9.1f} {row['self_us'] / 1000:>8.1f}  {'  ' * row['depth']}{row['module']}")
+
+    print("\nСобственное время по пакетам:")
+    for package, total in list(group_by_package(rows, project).items())[:top]:
+        print(f"  {total:>9.1f} мс  {package}")
+
+    own = sum(row["self_us"] for row in rows if row["module"].split('.')[0] in project) / 1000
+    print(f"\nМодули бота: {own:.1f} мс собственного времени из {run['import_ms']:.1f} мс")
+
+def default_budget() -> int:
+    sys.path.insert(0, ROOT)
+    from config import get_config
+    return get_config().MONITORING['import_time_budget_ms']
+
+def main():
+    parser = argparse.ArgumentParser(description="Время холодного импорта бота (-X importtime)")
+    parser.add_argument("--module", default="main", help="импортируемый модуль")
+    parser.add_argument("--runs", type=int, default=5, help="число холодных запусков")
+    parser.add_argument("--top", type=int, default=20, help="строк в отчете")
+    parser.add_argument("--budget", type=float, help="бюджет медианы импорта, мс (по умолчанию из конфигурации)")
+    parser.add_argument("--quiet", action="store_true", help="только итог и проверка бюджета")
+    parser.add_argument("--output", help="файл JSON с разбором медианного прогона")
+    args = parser.parse_args()
+
+    budget = args.budget if args.budget is not None else default_budget()
+    try:
+        # Первый запуск прогревает кеш байткода и файловой системы и в замер не входит
+        run_once(args.module)
+        runs = [run_once(args.module) for _ in range(args.runs)]
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    runs.sort(key=lambda run: run["import_ms"])
+    median_run = runs[len(runs) // 2]
+    median = statistics.median(run["import_ms"] for run in runs)
+    print(f"import {args.module}: медиана {median:.1f} мс, минимум {runs[0]['import_ms']:.1f}, "
+          f"максимум {runs[-1]['import_ms']:.1f} ({args.runs} запусков); "
+          f"процесс целиком {statistics.median(run['process_ms'] for run in runs):.1f} мс")
+    if not args.quiet:
+        print_report(median_run, args.module, args.top, project_packages())
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"module": args.module, "budget_ms": budget, "median_ms": median,
+                       "runs_ms": [run["import_ms"] for run in runs], "modules": median_run["rows"]},
+                      f, ensure_ascii=False, indent=2)
+
+    if median > budget:
+        print(f"\n❌ Бюджет превышен: {median:.1f} мс > {budget:g} мс")
+        return 1
+    print(f"\n✅ В пределах бюджета: {median:.1f} мс ≤ {budget:g} мс")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
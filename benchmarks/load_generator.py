@@ -0,0 +1,298 @@
+"""Нагрузочный стенд: синтетические апдейты Telegram через приложение PaymentBot
+
+Бот собирается как в продакшене (PaymentBot.initialize: база, MarzbanAPI, обработчики,
+замер задержек), но Bot API заменен транспортом в памяти, а панель — заглушкой
+benchmarks/fake_marzban.py в отдельном потоке. Виртуальные пользователи проходят
+сценарии (/start, статус, подписка, оплата, регистрация) и отправляют апдейты
+через update_processor приложения — с той же очередностью обработки, что и при polling.
+
+    python benchmarks/load_generator.py --users 200 --duration 30
+    python benchmarks/load_generator.py --users 50 --flows status,payment --marzban-latency-ms 40
+
+По каждому сценарию выводятся пропускная способность и перцентили времени ответа
+на апдейт (от отправки до завершения обработчика, включая ожидание в очереди).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Update
+from telegram.request import BaseRequest, RequestData
+
+from benchmarks.fake_marzban import FakeMarzban
+from catalog import catalog
+from main import PaymentBot
+from monitoring import latency
+
+logger = logging.getLogger("load_generator")
+
+BOT_ID = 7000000001
+ADMIN_ID = 1
+LINKED_BASE_ID = 200000000
+NEW_USER_BASE_ID = 300000000
+
+FLOW_WEIGHTS = {"start": 3, "status": 4, "subscription": 3, "payment": 1, "registration": 1}
+
+class FakeBotRequest(BaseRequest):
+    """Транспорт Bot API в памяти: отвечает на методы бота без обращения к сети"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Dict[str, int] = defaultdict(int)
+        self._message_id = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, params: Dict) -> Dict:
+        self._message_id += 1
+        return {
+            "message_id": params.get("message_id", self._message_id),
+            "date": int(time.time()),
+            "chat": {"id": params.get("chat_id", 0), "type": "private"},
+            "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bot", "username": "load_test_bot"},
+            "text": params.get("text", ""),
+        }
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         *args, **kwargs) -> Tuple[int, bytes]:
+        bot_method = url.rsplit('/', 1)[-1]
+        self.calls[bot_method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data else {}
+        if bot_method == "getMe":
+            result = {"id": BOT_ID, "is_bot": True, "first_name": "Bot", "username": "load_test_bot",
+                      "can_join_groups": False, "can_read_all_group_messages": False,
+                      "supports_inline_queries": False}
+        elif bot_method.startswith(("send", "edit", "copy", "forward")):
+            result = self._message(params)
+        else:
+            result = True  # answerCallbackQuery, deleteMessage, setMyCommands...
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+class VirtualUser:
+    """Пользователь Telegram, который отправляет апдейты по сценариям"""
+
+    def __init__(self, telegram_id: int, marzban_username: Optional[str]):
+        self.telegram_id = telegram_id
+        self.marzban_username = marzban_username
+        self.registrations = 0
+
+    def _user(self) -> Dict:
+        return {"id": self.telegram_id, "is_bot": False, "first_name": f"User{self.telegram_id}",
+                "username": f"u{self.telegram_id}"}
+
+    def message(self, update_id: int, text: str) -> Dict:
+        data = {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": self.telegram_id, "type": "private"},
+            "from": self._user(),
+            "text": text,
+        }
+        if text.startswith('/'):
+            data["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return {"update_id": update_id, "message": data}
+
+    def callback(self, update_id: int, data: str) -> Dict:
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": self._user(),
+                "chat_instance": str(self.telegram_id),
+                "data": data,
+                "message": {
+                    "message_id": update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": self.telegram_id, "type": "private"},
+                    "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bot"},
+                    "text": "menu",
+                },
+            },
+        }
+
+class LoadGenerator:
+    """Запуск виртуальных пользователей и сбор времени ответа по сценариям"""
+
+    def __init__(self, bot: PaymentBot, users: List[VirtualUser], flows: Dict[str, int], seed: int = 1):
+        self.bot = bot
+        self.application = bot.application
+        self.users = users
+        self.flows = flows
+        self.random = random.Random(seed)
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self._update_id = 0
+        self._update_flows: Dict[int, str] = {}
+        self.application.add_error_handler(self._count_error)
+
+    async def _count_error(self, update, context):
+        flow = self._update_flows.get(getattr(update, 'update_id', None)) or "?"
+        if not self.errors[flow]:
+            # Первое исключение сценария — с трассировкой, остальные только считаются
+            logger.error(f"Ошибка в сценарии {flow}: {context.error!r}", exc_info=context.error)
+        self.errors[flow] += 1
+
+    def _steps(self, flow: str, user: VirtualUser) -> List[Tuple[str, str]]:
+        """Апдейты сценария: ("message" | "callback", текст или callback_data)"""
+        if flow == "start":
+            return [("message", "/start")]
+        if flow == "status":
+            return [("callback", "status")]
+        if flow == "subscription":
+            return [("callback", f"get_subscription_{user.marzban_username}")]
+        if flow == "payment":
+            plan = self.random.choice(catalog.plans)
+            return [
+                ("callback", "payment"),
+                ("callback", f"payacc_{user.marzban_username}"),
+                ("callback", f"plan_{plan.id}_{user.marzban_username}"),
+                ("callback", f"paid_{plan.id}_{user.marzban_username}"),
+            ]
+        if flow == "registration":
+            user.registrations += 1
+            return [("callback", "create_account"), ("message", f"lg{user.telegram_id}x{user.registrations}")]
+        raise ValueError(f"Неизвестный сценарий: {flow}")
+
+    async def _send(self, flow: str, user: VirtualUser, kind: str, payload: str) -> float:
+        self._update_id += 1
+        update_id = self._update_id
+        data = user.message(update_id, payload) if kind == "message" else user.callback(update_id, payload)
+        update = Update.de_json(data, self.application.bot)
+        self._update_flows[update_id] = flow
+        started = time.perf_counter()
+        # Через update_processor: апдейты ждут своей очереди, как при polling
+        await self.application.update_processor.process_update(update, self.application.process_update(update))
+        elapsed = time.perf_counter() - started
+        del self._update_flows[update_id]
+        return elapsed
+
+    async def _run_user(self, user: VirtualUser, deadline: float, think_time: float):
+        while time.perf_counter() < deadline:
+            # Пользователь без аккаунта только регистрируется, после регистрации — обычные сценарии
+            linked = user.marzban_username is not None
+            names = [name for name in self.flows if linked != (name == "registration")]
+            if not names:
+                return
+            flow = self.random.choices(names, [self.flows[name] for name in names])[0]
+            for kind, payload in self._steps(flow, user):
+                self.samples[flow].append(await self._send(flow, user, kind, payload))
+            if flow == "registration" and await self.bot.async_db.get_user_by_telegram_id(user.telegram_id):
+                user.marzban_username = payload
+            if think_time:
+                await asyncio.sleep(self.random.uniform(0, 2 * think_time))
+
+    async def run(self, duration: float, think_time: float) -> float:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(self._run_user(user, deadline, think_time) for user in self.users))
+        return time.perf_counter() - started
+
+def percentile(sorted_values: List[float], quantile: float) -> float:
+    index = min(int(quantile * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def print_report(generator: LoadGenerator, elapsed: float, transport: FakeBotRequest, fake: FakeMarzban):
+    print(f"\n{'сценарий':<14} {'апдейтов':>9} {'в сек':>8} {'ошибок':>7} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'макс':>8}")
+    total = 0
+    for flow, values in sorted(generator.samples.items()):
+        values.sort()
+        total += len(values)
+        print(f"{flow:<14} {len(values):>9} {len(values) / elapsed:>8.1f} {generator.errors.get(flow, 0):>7} "
+              f"{percentile(values, 0.5) * 1000:>8.1f} {percentile(values, 0.95) * 1000:>8.1f} "
+              f"{percentile(values, 0.99) * 1000:>8.1f} {values[-1] * 1000:>8.1f}")
+    print(f"{'всего':<14} {total:>9} {total / elapsed:>8.1f} за {elapsed:.1f} с")
+
+    print("\nОбработчики (/perf за время прогона):")
+    for name, row in sorted(latency.snapshot(int(elapsed) + 2 * latency.bucket_seconds).items(), key=lambda item: -item[1]['count']):
+        print(f"  {name:<44} {row['count']:>7} p95 {row['p95'] * 1000:>7.1f} мс  ошибок {row['errors']}")
+    print(f"\nBot API: {dict(transport.calls)}")
+    marzban_calls = {key: value for key, value in fake.stats.items()}
+    print(f"Marzban: {marzban_calls}")
+
+async def run_load(args) -> int:
+    fake = FakeMarzban(args.marzban_users, args.marzban_latency_ms / 1000, args.marzban_jitter_ms / 1000,
+                       args.marzban_error_rate, args.seed, support_patch=False)
+    marzban_url = fake.start_in_thread()
+
+    workdir = tempfile.mkdtemp(prefix="load_")
+    bot = PaymentBot(request=FakeBotRequest(args.telegram_latency_ms / 1000))
+    bot.config.TELEGRAM_TOKEN = "1:load-test"
+    bot.config.MARZBAN_URL = marzban_url
+    bot.config.MARZBAN_USERNAME = fake.admin_username
+    bot.config.MARZBAN_PASSWORD = fake.admin_password
+    bot.config.DATABASE_PATH = os.path.join(workdir, "load.db")
+    bot.config.ADMIN_IDS = [ADMIN_ID]
+    try:
+        if not await bot.initialize():
+            print("Не удалось инициализировать бота")
+            return 1
+
+        # Связываем часть пользователей панели с виртуальными пользователями Telegram;
+        # остальные (--new-users) без аккаунта и проходят регистрацию.
+        # Импорт при запуске берет первую страницу /api/users (1000 пользователей)
+        linked_count = min(args.users - args.new_users, args.marzban_users, 1000)
+        imported = sorted(fake.users)[:linked_count]
+        users = []
+        for index, username in enumerate(imported):
+            bot.db_manager.link_telegram_account(username, LINKED_BASE_ID + index)
+            users.append(VirtualUser(LINKED_BASE_ID + index, username))
+        for index in range(args.users - len(users)):
+            users.append(VirtualUser(NEW_USER_BASE_ID + index, None))
+        fake.stats.clear()
+
+        flows = {name: FLOW_WEIGHTS[name] for name in args.flows}
+        async with bot.application:
+            generator = LoadGenerator(bot, users, flows, args.seed)
+            print(f"Пользователей: {len(users)} (связанных {len(imported)}), сценарии: {', '.join(flows)}, "
+                  f"длительность {args.duration:g} с")
+            elapsed = await generator.run(args.duration, args.think_ms / 1000)
+        print_report(generator, elapsed, bot.request, fake)
+        return 0
+    finally:
+        if bot.async_db:
+            bot.async_db.close()
+        fake.stop_thread()
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный стенд бота на синтетических апдейтах")
+    parser.add_argument("--users", type=int, default=100, help="одновременных виртуальных пользователей")
+    parser.add_argument("--new-users", type=int, help="из них без аккаунта (регистрация), по умолчанию 10%%")
+    parser.add_argument("--duration", type=float, default=20, help="длительность прогона, секунды")
+    parser.add_argument("--think-ms", type=float, default=0, help="средняя пауза пользователя между сценариями")
+    parser.add_argument("--flows", type=lambda value: value.split(','), default=list(FLOW_WEIGHTS),
+                        help=f"сценарии через запятую: {','.join(FLOW_WEIGHTS)}")
+    parser.add_argument("--telegram-latency-ms", type=float, default=0, help="задержка ответа Bot API")
+    parser.add_argument("--marzban-users", type=int, default=2000)
+    parser.add_argument("--marzban-latency-ms", type=float, default=20)
+    parser.add_argument("--marzban-jitter-ms", type=float, default=10)
+    parser.add_argument("--marzban-error-rate", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="логи бота в консоль")
+    args = parser.parse_args()
+
+    if args.new_users is None:
+        args.new_users = args.users // 10 if "registration" in args.flows else 0
+    unknown = set(args.flows) - set(FLOW_WEIGHTS)
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+    return asyncio.run(run_load(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,15 +10,31 @@ from handlers.payment_handlers import PaymentHandlers
 from handlers.subscription_handlers import SubscriptionHandlers
 from handlers.registration_handlers import RegistrationHandlers
 
-from database_manager import DatabaseManager
+from async_database_manager import AsyncDatabaseManager
+from callback_router import CallbackRouter
 from marzban_api import MarzbanAPI
+from monitoring import latency
 
 logger = logging.getLogger(__name__)
 
+class _MessageQuery:
+    """Обертка над сообщением с интерфейсом CallbackQuery для обработчиков inline-кнопок"""
+    __slots__ = ('message', 'from_user')
+
+    def __init__(self, message, user):
+        self.message = message
+        self.from_user = user
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_text(self, *args, **kwargs):
+        return await self.message.reply_text(*args, **kwargs)
+
 class BotCoordinator:
     """Главный координатор всех обработчиков бота"""
 
-    def __init__(self, db_manager: DatabaseManager, marzban_api: MarzbanAPI):
+    def __init__(self, db_manager: AsyncDatabaseManager, marzban_api: MarzbanAPI):
         self.db = db_manager
         self.marzban = marzban_api
         
@@ -28,6 +44,15 @@ class BotCoordinator:
         self.payment_handlers = PaymentHandlers(db_manager, marzban_api)
         self.subscription_handlers = SubscriptionHandlers(db_manager, marzban_api)
         self.registration_handlers = RegistrationHandlers(db_manager, marzban_api)
+        
+        # Каждый обработчик регистрирует свои inline-кнопки
+        self.callback_router = CallbackRouter()
+        for handler in (self.user_handlers, self.admin_handlers, self.payment_handlers,
+                        self.subscription_handlers, self.registration_handlers):
+            handler.register_callbacks(self.callback_router)
+        
+        # Кнопки нижнего меню: надписи не меняются во время работы, таблицы строятся один раз
+        self._user_text_routes, self._admin_text_routes = self._build_text_routes()
 
     # --- Весь остальной код этого файла остается таким же, как в предыдущем ответе ---
     # (методы start_command, status_command, handle_text_messages и т.д.)
@@ -58,59 +83,127 @@ class BotCoordinator:
     async def test_subscription_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await self.subscription_handlers.test_subscription_command(update, context)
     
-    # ... и другие методы ...
+    # ========== АДМИНСКИЕ КОМАНДЫ ==========
+    async def admin_panel_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.admin_handlers.admin_panel_command(update, context)
+    
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.admin_handlers.stats_command(update, context)
+    
+    async def user_info_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.admin_handlers.user_info_command(update, context)
+    
+    async def pending_payments_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.admin_handlers.pending_payments_command(update, context)
+    
+    async def new_users_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.admin_handlers.new_users_command(update, context)
+    
+    async def delete_user_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.admin_handlers.delete_user_command(update, context)
+    
+    async def admin_links_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.admin_handlers.admin_links_command(update, context)
+    
+    async def export_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.admin_handlers.export_command(update, context)
+    
+    async def analytics_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.admin_handlers.analytics_command(update, context)
+    
+    async def backup_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.admin_handlers.backup_command(update, context)
+    
+    async def find_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.admin_handlers.find_command(update, context)
+    
+    async def reload_plans_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.admin_handlers.reload_plans_command(update, context)
+    
+    async def perf_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.admin_handlers.perf_command(update, context)
+    
+    async def db_stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.admin_handlers.db_stats_command(update, context)
+    
+    async def profile_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.admin_handlers.profile_command(update, context)
+    
+    async def memory_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.admin_handlers.memory_command(update, context)
+    
+    # ========== ПЛАТЕЖИ ==========
+    async def confirm_payment_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.payment_handlers.confirm_payment_command(update, context)
+    
+    async def approve_payment_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.payment_handlers.approve_payment_command(update, context)
+    
+    async def reject_payment_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        return await self.payment_handlers.reject_payment_command(update, context)
 
     # ========== ОБРАБОТЧИКИ ФАЙЛОВ И СООБЩЕНИЙ ==========
     async def handle_receipt_upload(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await self.payment_handlers.handle_receipt_upload(update, context)
 
+    def _build_text_routes(self):
+        """Таблицы «надпись кнопки нижнего меню → обработчик» для обычных пользователей и админов"""
+        buttons = get_json("handlers.user_messages")["menu"]["buttons"]
+        
+        def as_query(handler, with_context=False):
+            # Обработчики inline-кнопок ждут query: подставляем обертку над сообщением
+            if with_context:
+                return lambda update, context: handler(_MessageQuery(update.message, update.effective_user), context)
+            return lambda update, context: handler(_MessageQuery(update.message, update.effective_user))
+        
+        user_handlers = {
+            "my_status": self.status_command,
+            "subscription_link": self.subscription_command,
+            "apps": lambda update, context: self.user_handlers.download_app_callback(update),
+            "support": self.user_handlers.support_command,
+            "help": self.help_command,
+            "main_menu": self.start_command,
+            "payment": as_query(self.payment_handlers.show_payment_accounts),
+            "create_account": as_query(self.registration_handlers.start_registration_callback, with_context=True),
+            "link_account": as_query(self.registration_handlers.link_existing_callback),
+        }
+        admin_handlers = {
+            **user_handlers,
+            "admin_panel": self.admin_panel_command,
+            # Админская клавиатура (create_admin_keyboard)
+            "stats": self.stats_command,
+            "new_users": self.new_users_command,
+            "pending_payments": self.pending_payments_command,
+            "links": self.admin_links_command,
+            "commands": self.admin_panel_command,
+            "back": self.start_command,
+        }
+        # Задержка каждой кнопки учитывается отдельно (/perf)
+        instrumented = {key: latency.instrument(f"text:{key}", handler) for key, handler in admin_handlers.items()}
+        user_routes = {buttons[key]: instrumented[key] for key in user_handlers}
+        admin_routes = {buttons[key]: instrumented[key] for key in admin_handlers}
+        return user_routes, admin_routes
+
     async def handle_text_messages(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка текстовых сообщений (кнопки нижнего меню и ввод пользователя)"""
         if not (update.message and update.message.text):
             return
 
-        text = update.message.text
         telegram_id = update.effective_user.id
-        buttons = get_json("handlers.user_messages")["menu"]["buttons"]
-
         is_admin_user = self.user_handlers.is_admin(telegram_id)
 
-        class FakeQuery:
-            def __init__(self, message, user):
-                self.message = message
-                self.from_user = user
-            async def answer(self, *args, **kwargs): pass
-            async def edit_message_text(self, *args, **kwargs):
-                return await self.message.reply_text(*args, **kwargs)
-
-        if text == buttons["my_status"]:
-            return await self.status_command(update, context)
-        elif text == buttons["subscription_link"]:
-            return await self.subscription_command(update, context)
-        elif text == buttons["apps"]:
-            return await self.user_handlers.download_app_callback(update)
-        elif text == buttons["support"]:
-            return await self.user_handlers.support_command(update, context)
-        elif text == buttons["help"]:
-            return await self.help_command(update, context)
-        elif text == buttons["main_menu"]:
-            return await self.start_command(update, context)
-        elif text == buttons["payment"]:
-            return await self.payment_handlers.show_payment_accounts(FakeQuery(update.message, update.effective_user))
-        elif text == buttons["create_account"]:
-            return await self.registration_handlers.start_registration_callback(FakeQuery(update.message, update.effective_user), context)
-        elif text == buttons["link_account"]:
-            return await self.registration_handlers.link_existing_callback(FakeQuery(update.message, update.effective_user))
-        elif is_admin_user and text == buttons.get("admin_panel"):
-            return await self.admin_handlers.admin_panel_command(update, context)
-        # ... и другие кнопки
-        else:
-            return await self.registration_handlers.handle_text_messages(update, context)
+        routes = self._admin_text_routes if is_admin_user else self._user_text_routes
+        handler = routes.get(update.message.text)
+        if handler is not None:
+            return await handler(update, context)
+
+        if is_admin_user and self.payment_handlers.get_user_state(telegram_id).get('state') == 'waiting_reject_reason':
+            return await self.payment_handlers.handle_reject_reason(update, context)
+        return await self.registration_handlers.handle_text_messages(update, context)
 
     # ========== ОБРАБОТЧИК КОЛБЭКОВ ==========
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        # ... код этого метода остается без изменений
-        pass
+        return await self.callback_router.dispatch(update, context)
         
     # ========== ОБРАБОТЧИК ОШИБОК ==========
     async def error_handler(self, update: object, context: ContextTypes.DEFAULT_TYPE):
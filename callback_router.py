@@ -0,0 +1,141 @@
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from config import get_config
+from monitoring import latency
+from texts import get_text
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+CallbackHandler = Callable[..., Awaitable[Any]]
+
+# Типы параметров в шаблонах: {request_id:int}, {username} (str по умолчанию)
+_PARAM_TYPES = {'str': str, 'int': int}
+_PARAM_RE = re.compile(r'\{(\w+)(?::(\w+))?(\?)?\}')
+
+@dataclass(frozen=True, slots=True)
+class CallbackRoute:
+    """Маршрут callback_data: шаблон, обработчик и параметры"""
+    pattern: str
+    handler: CallbackHandler
+    params: Tuple[Tuple[str, type, bool], ...]  # (имя, тип, обязательный)
+    admin_only: bool = False
+    answer: bool = True
+
+    def parse(self, tail: str) -> Optional[Dict[str, Any]]:
+        """Разбор части callback_data после префикса; None — данные не подходят под шаблон"""
+        if not self.params:
+            return {} if not tail else None
+
+        # Параметры разделены "_", последний забирает остаток (в логинах бывает "_")
+        parts = tail.split('_', len(self.params) - 1) if tail else []
+        values = {}
+        for index, (name, param_type, required) in enumerate(self.params):
+            if index >= len(parts):
+                if required:
+                    return None
+                values[name] = None
+                continue
+            try:
+                values[name] = param_type(parts[index])
+            except ValueError:
+                return None
+        return values
+
+class _TrieNode:
+    __slots__ = ('children', 'exact', 'prefix')
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.exact: Optional[CallbackRoute] = None
+        self.prefix: Optional[CallbackRoute] = None
+
+class CallbackRouter:
+    """Маршрутизатор callback_data на префиксном дереве
+
+    Обработчики регистрируются шаблонами вида "main_menu" (точное совпадение)
+    или "plan_{plan_id:int}_{username?}" (префикс "plan_" + параметры).
+    Поиск идет по символам callback_data (длина ограничена Telegram 64 байтами),
+    поэтому не зависит от количества зарегистрированных маршрутов.
+    Обработчик вызывается как handler(update, context, **params).
+    """
+
+    def __init__(self):
+        self._root = _TrieNode()
+        self._routes: List[CallbackRoute] = []
+
+    def register(self, pattern: str, handler: CallbackHandler, admin_only: bool = False, answer: bool = True):
+        """Регистрация маршрута
+
+        answer=True — роутер сам отвечает на callback перед вызовом обработчика;
+        False — для обработчиков, которые показывают свой текст в query.answer().
+        """
+        match = _PARAM_RE.search(pattern)
+        prefix = pattern[:match.start()] if match else pattern
+        params = tuple(
+            (name, _PARAM_TYPES[type_name or 'str'], not optional)
+            for name, type_name, optional in _PARAM_RE.findall(pattern[len(prefix):])
+        )
+        # Задержка учитывается по шаблону, а не по callback_data с параметрами (/perf)
+        handler = latency.instrument(f"callback:{pattern}", handler)
+        route = CallbackRoute(pattern, handler, params, admin_only, answer)
+
+        node = self._root
+        for char in prefix:
+            node = node.children.setdefault(char, _TrieNode())
+        slot = 'prefix' if params else 'exact'
+        if getattr(node, slot) is not None:
+            raise ValueError(f"Маршрут для '{pattern}' уже зарегистрирован: {getattr(node, slot).pattern}")
+        setattr(node, slot, route)
+        self._routes.append(route)
+
+    def resolve(self, data: str) -> Optional[Tuple[CallbackRoute, Dict[str, Any]]]:
+        """Поиск маршрута: точное совпадение, иначе самый длинный подходящий префикс"""
+        node = self._root
+        candidates = []
+        for index, char in enumerate(data):
+            if node.prefix is not None:
+                candidates.append((node.prefix, index))
+            node = node.children.get(char)
+            if node is None:
+                break
+        else:
+            if node.exact is not None:
+                return node.exact, {}
+            if node.prefix is not None:
+                candidates.append((node.prefix, len(data)))
+
+        for route, index in reversed(candidates):
+            params = route.parse(data[index:])
+            if params is not None:
+                return route, params
+        return None
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработка callback_query"""
+        query = update.callback_query
+        resolved = self.resolve(query.data or "")
+        if resolved is None:
+            logger.warning(f"Неизвестный callback '{query.data}' от {query.from_user.id}")
+            await query.answer(get_text("messages.UNKNOWN_CALLBACK"))
+            return
+
+        route, params = resolved
+        if route.admin_only and not config.is_admin(query.from_user.id):
+            await query.answer(get_text("messages.errors.NO_ADMIN_RIGHTS"), show_alert=True)
+            return
+
+        if route.answer:
+            await query.answer()
+        return await route.handler(update, context, **params)
+
+    @property
+    def routes(self) -> List[CallbackRoute]:
+        """Зарегистрированные маршруты в порядке регистрации"""
+        return list(self._routes)
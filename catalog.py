@@ -0,0 +1,112 @@
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from keyboards import keyboard_registry
+from payment_methods import PAYMENT_METHODS_PATH, PaymentMethodData, load_payment_methods
+from plans import PLANS_PATH, Plan, load_plans
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Catalog:
+    """Снимок тарифов и способов оплаты; после создания не меняется"""
+    plans: Tuple[Plan, ...]
+    payment_methods: Tuple[PaymentMethodData, ...]
+    version: int = 0
+    plans_by_id: Dict[str, Plan] = field(init=False, repr=False)
+    methods_by_id: Dict[str, PaymentMethodData] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        # Ключи — строки: id тарифа приходит из callback_data, команд и базы как str
+        object.__setattr__(self, 'plans_by_id', {str(plan.id): plan for plan in self.plans})
+        object.__setattr__(self, 'methods_by_id', {method.id: method for method in self.payment_methods})
+
+class CatalogRegistry:
+    """Тарифы и способы оплаты с перезагрузкой без перезапуска бота
+
+    Читатели берут текущий снимок Catalog одной операцией; перезагрузка строит
+    новый снимок целиком и подменяет ссылку, поэтому обработчик никогда не увидит
+    наполовину обновленный список. При ошибке в файлах остается прежний снимок.
+    Файлы читаются при первом обращении к каталогу, а не при импорте модуля.
+    """
+
+    def __init__(self, plans_path=PLANS_PATH, methods_path: str = PAYMENT_METHODS_PATH):
+        self.plans_path = plans_path
+        self.methods_path = methods_path
+        self._lock = threading.Lock()
+        self._mtimes: Optional[Tuple[float, float]] = None
+        self._catalog: Optional[Catalog] = None
+
+    @property
+    def current(self) -> Catalog:
+        catalog = self._catalog
+        if catalog is None:
+            with self._lock:
+                if self._catalog is None:
+                    self._mtimes = self._read_mtimes()
+                    self._catalog = Catalog(tuple(load_plans(self.plans_path)),
+                                            tuple(load_payment_methods(self.methods_path)))
+                catalog = self._catalog
+        return catalog
+
+    @property
+    def plans(self) -> Tuple[Plan, ...]:
+        return self.current.plans
+
+    @property
+    def payment_methods(self) -> Tuple[PaymentMethodData, ...]:
+        return self.current.payment_methods
+
+    @property
+    def version(self) -> int:
+        return self.current.version
+
+    def get_plan(self, plan_id) -> Optional[Plan]:
+        """Тариф по id (int или str)"""
+        return self.current.plans_by_id.get(str(plan_id))
+
+    def get_payment_method(self, method_id: str) -> Optional[PaymentMethodData]:
+        return self.current.methods_by_id.get(method_id)
+
+    def _read_mtimes(self) -> Tuple[float, float]:
+        return os.path.getmtime(self.plans_path), os.path.getmtime(self.methods_path)
+
+    def reload(self) -> bool:
+        """Перечитать файлы тарифов и способов оплаты; False — файлы с ошибкой, снимок прежний"""
+        with self._lock:
+            try:
+                # Время изменения запоминаем и при ошибке: файл с ошибкой не перечитывается до следующей правки
+                self._mtimes = self._read_mtimes()
+                catalog = Catalog(
+                    tuple(load_plans(self.plans_path)),
+                    tuple(load_payment_methods(self.methods_path)),
+                    self._catalog.version + 1 if self._catalog is not None else 0,
+                )
+            except (OSError, ValueError, TypeError, KeyError) as e:
+                logger.error(f"Не удалось перечитать тарифы и способы оплаты: {e}")
+                return False
+
+            self._catalog = catalog
+
+        # Раскладки с тарифами привязаны к версии снимка, старые больше не нужны
+        keyboard_registry.clear()
+        logger.info(
+            f"Тарифы перезагружены (версия {catalog.version}): "
+            f"{len(catalog.plans)} тарифов, {len(catalog.payment_methods)} способов оплаты"
+        )
+        return True
+
+    def reload_if_changed(self) -> bool:
+        """Перезагрузка, если файлы изменились с прошлого чтения"""
+        try:
+            changed = self._read_mtimes() != self._mtimes
+        except OSError as e:
+            logger.error(f"Не удалось проверить файлы тарифов: {e}")
+            return False
+        return self.reload() if changed else False
+
+# Общий реестр для всех обработчиков
+catalog = CatalogRegistry()
@@ -35,6 +35,91 @@ class Config:
         "backup_count": 5
     }
 
+    # Статистика SQL-запросов (/db_stats) и журнал медленных запросов
+    DATABASE_PROFILING = {
+        "enabled": os.getenv("DB_PROFILING", "1") == "1",
+        # Запросы дольше порога пишутся в лог вместе с EXPLAIN QUERY PLAN, секунды
+        "slow_query_threshold": float(os.getenv("DB_SLOW_QUERY_MS", "100")) / 1000,
+    }
+
+    # HTTP-клиент Marzban
+    MARZBAN_CLIENT = {
+        "connect_retries": 1,  # повторы только при ошибке соединения
+        # Вызовы дольше порога пишутся в лог как медленные, секунды
+        "slow_call_threshold": float(os.getenv("MARZBAN_SLOW_CALL_MS", "1000")) / 1000,
+    }
+
+    # Кеш связей Telegram ↔ Marzban
+    CACHE = {
+        "mapping_max_entries": int(os.getenv("MAPPING_CACHE_SIZE", "10000")),
+        "mapping_verify_interval": 600,  # секунды между сверками кеша с базой
+        "mapping_verify_sample": 200,
+    }
+
+    # Выгрузка данных командой /export
+    EXPORT = {
+        "directory": os.getenv("EXPORT_DIR", "exports"),
+        "batch_size": 1000,  # строк в одном запросе к базе
+    }
+
+    # Архив старых платежей (отдельный файл, подключается через ATTACH)
+    ARCHIVE = {
+        "enabled": os.getenv("ARCHIVE_ENABLED", "1") == "1",
+        "path": os.getenv("ARCHIVE_DATABASE_PATH", "users_archive.db"),
+        # /stats считает выручку за 30 дней по рабочей базе, поэтому горизонт не меньше 31 дня
+        "horizon_days": max(int(os.getenv("ARCHIVE_HORIZON_DAYS", "180")), 31),
+        "batch_size": 500,  # строк в одной транзакции переноса
+        "interval": 24 * 3600,  # секунды между запусками
+    }
+
+    # Резервное копирование рабочей базы и архива платежей (ARCHIVE["path"])
+    BACKUP = {
+        "enabled": os.getenv("BACKUP_ENABLED", "1") == "1",
+        "directory": os.getenv("BACKUP_DIR", "backups"),
+        "interval": int(os.getenv("BACKUP_INTERVAL", str(24 * 3600))),  # секунды между копиями
+        "keep": int(os.getenv("BACKUP_KEEP", "7")),
+        "compress": True,
+        "pages_per_step": 1024,  # страниц за один шаг backup API
+        "step_pause": 0.01,  # пауза между шагами, секунды
+    }
+
+    # Тарифы и способы оплаты (texts/plans.json, texts/payment_methods.json)
+    CATALOG = {
+        # Как часто проверять время изменения файлов, секунды; 0 — только командой /reload_plans
+        "reload_interval": int(os.getenv("CATALOG_RELOAD_INTERVAL", "60")),
+    }
+
+    # Мониторинг производительности (/perf)
+    MONITORING = {
+        "latency_bucket_seconds": 10,  # шаг скользящих окон
+        # Окна для /perf: подпись → секунды; самое длинное определяет срок хранения
+        "latency_windows": {"1m": 60, "5m": 300, "15m": 900, "1h": 3600},
+        "latency_default_window": "5m",
+        # HTTP-эндпоинт /metrics в формате Prometheus
+        "metrics_enabled": os.getenv("METRICS_ENABLED", "0") == "1",
+        "metrics_host": os.getenv("METRICS_HOST", "127.0.0.1"),
+        "metrics_port": int(os.getenv("METRICS_PORT", "9108")),
+        # Трассировка апдейтов в JSONL: доля апдейтов с трейсом (0 — выключено)
+        "trace_sample_rate": float(os.getenv("TRACE_SAMPLE_RATE", "0.01")),
+        "trace_path": os.getenv("TRACE_PATH", "logs/traces.jsonl"),
+        "trace_max_bytes": 10 * 1024 * 1024,
+        "trace_backup_count": 3,
+        # Профилирование по запросу: /profile, /memory, SIGUSR1 (cProfile), SIGUSR2 (tracemalloc)
+        "profile_dir": "logs/profiles",
+        "profile_default_seconds": 10,
+        "profile_max_seconds": 120,
+        "profile_top": 15,
+        "tracemalloc_frames": 1,
+        "memory_top": 10,
+        # Бюджет холодного импорта main, мс (benchmarks/import_time.py --budget)
+        "import_time_budget_ms": int(os.getenv("IMPORT_TIME_BUDGET_MS", "600")),
+    }
+
+    # Уведомления администраторам
+    ADMIN_NOTIFICATIONS = {
+        "new_user_registration": True,
+    }
+
     # Настройки для новых пользователей (регистрация)
     NEW_USER_SETTINGS = {
         "username_min_length": 4,
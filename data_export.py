@@ -0,0 +1,50 @@
+import csv
+import gzip
+import json
+import logging
+from typing import Optional
+
+from database_manager import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+# Наборы данных команды /export
+EXPORT_DATASETS = {
+    'payments': 'payment_history',
+    'requests': 'payment_requests',
+    'users': 'user_telegram_mapping',
+}
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+def export_table(db_manager: DatabaseManager, table: str, fmt: str, path: str,
+                 date_from: Optional[str] = None, date_to: Optional[str] = None,
+                 batch_size: int = 1000, include_archive: bool = True) -> int:
+    """Потоковая выгрузка таблицы в gzip-файл CSV или JSONL
+
+    Строки пишутся по мере чтения пачек из базы, поэтому расход памяти не зависит
+    от размера таблицы. Платежи и заявки, перенесенные в архив, выгружаются вместе
+    с рабочими (include_archive=False — только рабочая база).
+    Возвращает количество выгруженных строк.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+
+    columns = db_manager.get_table_columns(table)
+    rows = db_manager.iter_table_rows(table, date_from, date_to, batch_size, include_archive)
+    count = 0
+
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows:
+                f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+                f.write('\n')
+                count += 1
+
+    logger.info(f"Выгрузка {table} ({fmt}): {count} строк → {path}")
+    return count
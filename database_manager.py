@@ -1,18 +1,111 @@
+import random
+import re
 import sqlite3
 import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Iterator, Tuple
+
+from db_profiler import ProfiledConnection, QueryStats
+from mapping_cache import UserMappingCache
+from db_records import UserMapping, PaymentRequest, PaymentRecord
 
 logger = logging.getLogger(__name__)
 
+class _RollbackTransaction(Exception):
+    """Сигнал отката unit of work без ошибки базы"""
+
+class _BackupRestarted(Exception):
+    """Онлайн-копия слишком часто перезапускается из-за параллельной записи"""
+
+class _TransactionConnection:
+    """Соединение активной транзакции: commit/close откладываются до конца unit of work"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
 class DatabaseManager:
-    def __init__(self, db_path: str = "users_database.db"):
+    # Таблицы, доступные для выгрузки, и колонка даты для фильтра по периоду
+    EXPORT_TABLES = {
+        'payment_history': 'payment_date',
+        'payment_requests': 'created_at',
+        'user_telegram_mapping': 'registration_date',
+    }
+    
+    # Таблицы, строки которых переносятся в архив, и условие «строка закрыта и старше горизонта»
+    ARCHIVE_TABLES = {
+        'payment_history': "payment_date < date('now', ?)",
+        'payment_requests': "status != 'pending' AND COALESCE(processed_at, created_at) < date('now', ?)",
+    }
+    
+    def __init__(self, db_path: str = "users_database.db", mapping_cache_size: int = 10000,
+                 archive_path: Optional[str] = None, query_stats: Optional[QueryStats] = None):
         self.db_path = db_path
+        self.archive_path = archive_path
+        self.mapping_cache = UserMappingCache(mapping_cache_size)
+        # Статистика SQL и журнал медленных запросов; None — соединения без замеров
+        self.query_stats = query_stats
+        self._local = threading.local()
         self.init_database()
     
+    def _open(self, path: Optional[str] = None, **kwargs) -> sqlite3.Connection:
+        """Новое соединение (с замером запросов, если включена статистика)"""
+        if self.query_stats is None:
+            return sqlite3.connect(path or self.db_path, **kwargs)
+        conn = sqlite3.connect(path or self.db_path, factory=ProfiledConnection, **kwargs)
+        conn.query_stats = self.query_stats
+        return conn
+    
+    def _connect(self):
+        """Соединение с базой; внутри transaction() возвращается соединение транзакции"""
+        tx_conn = getattr(self._local, 'tx_conn', None)
+        if tx_conn is not None:
+            return tx_conn
+        return self._open()
+    
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Unit of work: все записи методов менеджера внутри блока фиксируются одним commit.
+        
+        При исключении изменения откатываются. Вложенные вызовы присоединяются к внешней транзакции.
+        """
+        if getattr(self._local, 'tx_conn', None) is not None:
+            yield self._local.tx_conn
+            return
+        
+        conn = self._open()
+        self._local.tx_conn = _TransactionConnection(conn)
+        self._local.tx_touched = set()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield self._local.tx_conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            # Write-through записи кеша могли увидеть откатываемые данные
+            for telegram_id in self._local.tx_touched:
+                self.mapping_cache.invalidate_telegram_id(telegram_id)
+            raise
+        finally:
+            self._local.tx_conn = None
+            self._local.tx_touched = None
+            conn.close()
+    
     def init_database(self):
         """Инициализация базы данных и создание таблиц"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         # Таблица для связи пользователей Marzban с Telegram
@@ -72,20 +165,200 @@ class DatabaseManager:
             )
         ''')
         
+        self._migrate_schema(cursor)
+        
         conn.commit()
         conn.close()
         logger.info("База данных инициализирована")
     
+    def _migrate_schema(self, cursor: sqlite3.Cursor):
+        """Пошаговые миграции схемы; номер версии хранится в PRAGMA user_version"""
+        cursor.execute("PRAGMA user_version")
+        version = cursor.fetchone()[0]
+        
+        if version < 1:
+            # Структурированные поля вместо разбора текста notes
+            cursor.execute("PRAGMA table_info(user_telegram_mapping)")
+            existing = {row[1] for row in cursor.fetchall()}
+            for column, definition in (
+                ('registration_source', "TEXT DEFAULT 'marzban'"),
+                ('linked_at', 'DATETIME'),
+                ('last_seen_at', 'DATETIME'),
+            ):
+                if column not in existing:
+                    cursor.execute(f"ALTER TABLE user_telegram_mapping ADD COLUMN {column} {definition}")
+            
+            # Однократный перенос данных из notes
+            cursor.execute('''
+                UPDATE user_telegram_mapping
+                SET registration_source = CASE
+                        WHEN notes LIKE '%Зарегистрирован через бота%' THEN 'bot'
+                        ELSE 'marzban'
+                    END
+            ''')
+            # Точное время привязки раньше не хранилось, используем дату регистрации
+            cursor.execute('''
+                UPDATE user_telegram_mapping
+                SET linked_at = registration_date
+                WHERE telegram_id IS NOT NULL AND linked_at IS NULL
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_user_mapping_source_registered
+                ON user_telegram_mapping (registration_source, registration_date)
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_mapping_linked_at ON user_telegram_mapping (linked_at)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_mapping_last_seen ON user_telegram_mapping (last_seen_at)")
+            cursor.execute("PRAGMA user_version = 1")
+            logger.info("Миграция схемы v1: registration_source, linked_at, last_seen_at")
+        
+        if version < 2:
+            # Индекс под постраничную выборку очереди заявок (status = ? AND id < ?)
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_payment_requests_status_id
+                ON payment_requests (status, id)
+            ''')
+            cursor.execute("PRAGMA user_version = 2")
+            logger.info("Миграция схемы v2: индекс очереди заявок")
+        
+        if version < 3:
+            # Дневные агрегаты: обновляются при каждой записи, аналитика не сканирует историю
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS daily_stats (
+                    day DATE PRIMARY KEY,
+                    payments INTEGER NOT NULL DEFAULT 0,
+                    revenue DECIMAL(10,2) NOT NULL DEFAULT 0,
+                    approvals INTEGER NOT NULL DEFAULT 0,
+                    rejections INTEGER NOT NULL DEFAULT 0,
+                    registrations INTEGER NOT NULL DEFAULT 0,
+                    links INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS daily_revenue (
+                    day DATE NOT NULL,
+                    plan_id TEXT NOT NULL,
+                    payment_method TEXT NOT NULL,
+                    payments INTEGER NOT NULL DEFAULT 0,
+                    revenue DECIMAL(10,2) NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, plan_id, payment_method)
+                )
+            ''')
+            self._backfill_rollups(cursor)
+            cursor.execute("PRAGMA user_version = 3")
+            logger.info("Миграция схемы v3: дневные агрегаты")
+        
+        if version < 4:
+            # Выборка истории пользователя и отбор строк для архива без полного сканирования
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_payment_history_telegram_date ON payment_history (telegram_id, payment_date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_payment_history_username_date ON payment_history (marzban_username, payment_date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_payment_history_date ON payment_history (payment_date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_payment_requests_processed ON payment_requests (processed_at)")
+            cursor.execute("PRAGMA user_version = 4")
+            logger.info("Миграция схемы v4: индексы истории платежей")
+        
+        if version < 5:
+            # Полнотекстовый индекс для поиска пользователей админами (/find)
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5(
+                    marzban_username, telegram_username, phone_number, notes,
+                    content='user_telegram_mapping', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+                )
+            ''')
+            # Индекс внешнего содержимого синхронизируется триггерами
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS user_search_insert AFTER INSERT ON user_telegram_mapping BEGIN
+                    INSERT INTO user_search (rowid, marzban_username, telegram_username, phone_number, notes)
+                    VALUES (new.id, new.marzban_username, new.telegram_username, new.phone_number, new.notes);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS user_search_delete AFTER DELETE ON user_telegram_mapping BEGIN
+                    INSERT INTO user_search (user_search, rowid, marzban_username, telegram_username, phone_number, notes)
+                    VALUES ('delete', old.id, old.marzban_username, old.telegram_username, old.phone_number, old.notes);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS user_search_update
+                AFTER UPDATE OF marzban_username, telegram_username, phone_number, notes ON user_telegram_mapping BEGIN
+                    INSERT INTO user_search (user_search, rowid, marzban_username, telegram_username, phone_number, notes)
+                    VALUES ('delete', old.id, old.marzban_username, old.telegram_username, old.phone_number, old.notes);
+                    INSERT INTO user_search (rowid, marzban_username, telegram_username, phone_number, notes)
+                    VALUES (new.id, new.marzban_username, new.telegram_username, new.phone_number, new.notes);
+                END
+            ''')
+            cursor.execute("INSERT INTO user_search (user_search) VALUES ('rebuild')")
+            cursor.execute("PRAGMA user_version = 5")
+            logger.info("Миграция схемы v5: полнотекстовый поиск пользователей")
+        
+        if version < 6:
+            # Первое заполнение агрегатов записало идентификатор плана и в способ оплаты
+            cursor.execute('''
+                INSERT INTO daily_revenue (day, plan_id, payment_method, payments, revenue)
+                SELECT day, plan_id, '', payments, revenue FROM daily_revenue
+                WHERE payment_method = plan_id AND payment_method != ''
+                ON CONFLICT(day, plan_id, payment_method) DO UPDATE SET
+                    payments = payments + excluded.payments, revenue = revenue + excluded.revenue
+            ''')
+            cursor.execute("DELETE FROM daily_revenue WHERE payment_method = plan_id AND payment_method != ''")
+            cursor.execute("PRAGMA user_version = 6")
+            logger.info("Миграция схемы v6: неизвестный способ оплаты в агрегатах выручки")
+        
+        if version < 7:
+            # add_telegram_id_to_notes отмечал linked_at без привязки telegram_id
+            cursor.execute("UPDATE user_telegram_mapping SET linked_at = NULL WHERE telegram_id IS NULL AND linked_at IS NOT NULL")
+            cursor.execute("PRAGMA user_version = 7")
+            logger.info("Миграция схемы v7: linked_at только у привязанных аккаунтов")
+    
+    def _backfill_rollups(self, cursor: sqlite3.Cursor):
+        """Однократное заполнение агрегатов по уже накопленным данным"""
+        # Оба пути оплаты записывали в payment_method идентификатор плана; способ оплаты
+        # (карта, QIWI) бот не сохранял, поэтому он неизвестен ('')
+        cursor.execute('''
+            INSERT INTO daily_revenue (day, plan_id, payment_method, payments, revenue)
+            SELECT date(payment_date), COALESCE(payment_method, ''), '',
+                   COUNT(*), COALESCE(SUM(amount), 0)
+            FROM payment_history
+            WHERE status = 'completed'
+            GROUP BY 1, 2, 3
+        ''')
+        
+        for column, query in (
+            ('payments', "SELECT date(payment_date), COUNT(*) FROM payment_history WHERE status = 'completed' GROUP BY 1"),
+            ('revenue', "SELECT date(payment_date), SUM(amount) FROM payment_history WHERE status = 'completed' GROUP BY 1"),
+            ('approvals', "SELECT date(processed_at), COUNT(*) FROM payment_requests WHERE status = 'approved' GROUP BY 1"),
+            ('rejections', "SELECT date(processed_at), COUNT(*) FROM payment_requests WHERE status = 'rejected' GROUP BY 1"),
+            ('registrations', "SELECT date(registration_date), COUNT(*) FROM user_telegram_mapping WHERE registration_source = 'bot' GROUP BY 1"),
+            ('links', "SELECT date(linked_at), COUNT(*) FROM user_telegram_mapping WHERE linked_at IS NOT NULL GROUP BY 1"),
+        ):
+            # WHERE нужен парсеру SQLite для INSERT ... SELECT ... ON CONFLICT
+            cursor.execute(f'''
+                INSERT INTO daily_stats (day, {column})
+                SELECT * FROM ({query}) WHERE 1
+                ON CONFLICT(day) DO UPDATE SET {column} = excluded.{column}
+            ''')
+    
+    def _bump_daily_stats(self, cursor: sqlite3.Cursor, **increments):
+        """Инкремент дневных агрегатов в той же транзакции, что и основная запись"""
+        columns = ", ".join(increments)
+        placeholders = ", ".join("?" for _ in increments)
+        updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in increments)
+        cursor.execute(f'''
+            INSERT INTO daily_stats (day, {columns}) VALUES (date('now'), {placeholders})
+            ON CONFLICT(day) DO UPDATE SET {updates}
+        ''', tuple(increments.values()))
+    
     def add_user(self, marzban_username: str, subscription_status: str = 'active', notes: str = None) -> bool:
         """Добавление нового пользователя"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
             cursor.execute('''
                 INSERT OR IGNORE INTO user_telegram_mapping 
-                (marzban_username, subscription_status, notes) 
-                VALUES (?, ?, ?)
+                (marzban_username, subscription_status, notes, registration_source) 
+                VALUES (?, ?, ?, 'marzban')
             ''', (marzban_username, subscription_status, notes))
             
             success = cursor.rowcount > 0
@@ -100,7 +373,7 @@ class DatabaseManager:
     
     def create_payment_request(self, telegram_id: int, marzban_username: str, plan_id: str, amount: float) -> int:
         """Создание заявки на оплату"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
@@ -124,7 +397,7 @@ class DatabaseManager:
     
     def add_receipt_to_request(self, request_id: int, file_id: str, file_type: str) -> bool:
         """Добавление чека к заявке на оплату"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
@@ -148,38 +421,71 @@ class DatabaseManager:
         finally:
             conn.close()
     
-    def get_pending_payment_requests(self) -> List[Dict]:
+    def get_pending_payment_requests(self) -> List[PaymentRequest]:
         """Получение ожидающих обработки заявок"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
+        cursor.row_factory = PaymentRequest.row_factory
         
-        cursor.execute('''
-            SELECT id, telegram_id, marzban_username, plan_id, amount, 
-                   created_at, receipt_file_id, receipt_type
+        cursor.execute(f'''
+            SELECT {PaymentRequest.columns()}
             FROM payment_requests 
             WHERE status = 'pending'
             ORDER BY created_at DESC
         ''')
         
-        requests = []
-        for row in cursor.fetchall():
-            requests.append({
-                'id': row[0],
-                'telegram_id': row[1],
-                'marzban_username': row[2],
-                'plan_id': row[3],
-                'amount': row[4],
-                'created_at': row[5],
-                'receipt_file_id': row[6],
-                'receipt_type': row[7]
-            })
-        
+        requests = cursor.fetchall()
         conn.close()
         return requests
     
+    def get_pending_payment_requests_page(self, after_id: Optional[int] = None, before_id: Optional[int] = None,
+                                          limit: int = 10) -> Tuple[List[PaymentRequest], bool]:
+        """Страница ожидающих заявок (новые сверху) по ключу id вместо OFFSET
+
+        after_id — следующая страница (заявки старше указанной), before_id — предыдущая.
+        Возвращает заявки страницы и признак наличия еще одной страницы в том же направлении.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.row_factory = PaymentRequest.row_factory
+        
+        # Запрашиваем на одну запись больше, чтобы узнать о следующей странице без COUNT(*)
+        if before_id is not None:
+            condition, params, order = "AND id > ?", (before_id,), "ASC"
+        elif after_id is not None:
+            condition, params, order = "AND id < ?", (after_id,), "DESC"
+        else:
+            condition, params, order = "", (), "DESC"
+        
+        cursor.execute(f'''
+            SELECT {PaymentRequest.columns()}
+            FROM payment_requests
+            WHERE status = 'pending' {condition}
+            ORDER BY id {order}
+            LIMIT ?
+        ''', params + (limit + 1,))
+        
+        requests = cursor.fetchall()
+        conn.close()
+        
+        has_more = len(requests) > limit
+        requests = requests[:limit]
+        if before_id is not None:
+            requests.reverse()
+        return requests, has_more
+    
+    def count_pending_payment_requests(self) -> int:
+        """Количество ожидающих заявок (покрывается индексом status, id)"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM payment_requests WHERE status = 'pending'")
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
+    
     def approve_payment_request(self, request_id: int, admin_id: int, comment: str = None) -> bool:
         """Одобрение заявки на оплату"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
@@ -191,6 +497,8 @@ class DatabaseManager:
             ''', (admin_id, comment, request_id))
             
             success = cursor.rowcount > 0
+            if success:
+                self._bump_daily_stats(cursor, approvals=1)
             conn.commit()
             
             if success:
@@ -206,7 +514,7 @@ class DatabaseManager:
     
     def reject_payment_request(self, request_id: int, admin_id: int, comment: str) -> bool:
         """Отклонение заявки на оплату"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
@@ -218,6 +526,8 @@ class DatabaseManager:
             ''', (admin_id, comment, request_id))
             
             success = cursor.rowcount > 0
+            if success:
+                self._bump_daily_stats(cursor, rejections=1)
             conn.commit()
             
             if success:
@@ -231,38 +541,52 @@ class DatabaseManager:
         finally:
             conn.close()
     
-    def get_payment_request(self, request_id: int) -> Optional[Dict]:
+    def complete_payment_request(self, request_id: int, admin_id: int, payment_method: str,
+                                 comment: str = None) -> bool:
+        """Одобрение заявки и запись платежа в историю одной транзакцией"""
+        try:
+            with self.transaction():
+                request = self.get_payment_request(request_id)
+                if not request or request['status'] != 'pending':
+                    raise _RollbackTransaction()
+                if not self.approve_payment_request(request_id, admin_id, comment):
+                    raise _RollbackTransaction()
+                if not self.record_payment(
+                    telegram_id=request['telegram_id'],
+                    marzban_username=request['marzban_username'],
+                    amount=request['amount'],
+                    payment_method=payment_method,
+                    status='completed',
+                    plan_id=request['plan_id']
+                ):
+                    raise _RollbackTransaction()
+            return True
+        except _RollbackTransaction:
+            logger.warning(f"Заявка #{request_id} не завершена, изменения откатены")
+            return False
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка завершения заявки #{request_id}: {e}")
+            return False
+    
+    def get_payment_request(self, request_id: int) -> Optional[PaymentRequest]:
         """Получение заявки по ID"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
+        cursor.row_factory = PaymentRequest.row_factory
         
-        cursor.execute('''
-            SELECT id, telegram_id, marzban_username, plan_id, amount, 
-                   created_at, status, receipt_file_id, receipt_type
+        cursor.execute(f'''
+            SELECT {PaymentRequest.columns()}
             FROM payment_requests 
             WHERE id = ?
         ''', (request_id,))
         
         row = cursor.fetchone()
         conn.close()
-        
-        if row:
-            return {
-                'id': row[0],
-                'telegram_id': row[1],
-                'marzban_username': row[2],
-                'plan_id': row[3],
-                'amount': row[4],
-                'created_at': row[5],
-                'status': row[6],
-                'receipt_file_id': row[7],
-                'receipt_type': row[8]
-            }
-        return None
+        return row
     
     def create_new_user_record(self, username: str, telegram_id: int, telegram_username: str = None) -> bool:
         """Создание записи для нового зарегистрированного пользователя"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
@@ -275,14 +599,17 @@ class DatabaseManager:
             cursor.execute('''
                 INSERT INTO user_telegram_mapping 
                 (marzban_username, telegram_id, telegram_username, is_verified, 
-                 subscription_status, notes) 
-                VALUES (?, ?, ?, TRUE, 'active', ?)
+                 subscription_status, notes, registration_source, linked_at, last_seen_at) 
+                VALUES (?, ?, ?, TRUE, 'active', ?, 'bot', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
             ''', (username, telegram_id, telegram_username, notes))
             
             success = cursor.rowcount > 0
+            if success:
+                self._bump_daily_stats(cursor, registrations=1, links=1)
             conn.commit()
             
             if success:
+                self._refresh_cached_accounts(cursor, telegram_id)
                 logger.info(f"Запись для нового пользователя {username} создана")
             
             return success
@@ -293,34 +620,97 @@ class DatabaseManager:
         finally:
             conn.close()
 
-    def get_users_by_telegram_id(self, telegram_id: int) -> List[Dict]:
+    def get_users_by_telegram_id(self, telegram_id: int) -> List[UserMapping]:
         """Получение всех аккаунтов пользователя по Telegram ID"""
-        conn = sqlite3.connect(self.db_path)
+        accounts = self.mapping_cache.get_accounts(telegram_id)
+        if accounts is not None:
+            return accounts
+        return self.load_users_by_telegram_id(telegram_id)
+    
+    def load_users_by_telegram_id(self, telegram_id: int) -> List[UserMapping]:
+        """Чтение аккаунтов пользователя из базы в обход кеша с последующим кешированием"""
+        conn = self._connect()
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT marzban_username, telegram_id, telegram_username, 
-                   subscription_status, registration_date, is_verified, notes
+        result = self._fetch_accounts(cursor, telegram_id)
+        conn.close()
+        self.mapping_cache.set_accounts(telegram_id, result)
+        return result
+    
+    def _fetch_accounts(self, cursor: sqlite3.Cursor, telegram_id: int) -> List[UserMapping]:
+        """Чтение аккаунтов пользователя из базы в рамках открытого соединения"""
+        cursor = cursor.connection.cursor()
+        cursor.row_factory = UserMapping.row_factory
+        cursor.execute(f'''
+            SELECT {UserMapping.columns()}
             FROM user_telegram_mapping 
             WHERE telegram_id = ?
         ''', (telegram_id,))
-        rows = cursor.fetchall()
-        conn.close()
-        result = []
-        for row in rows:
-            result.append({
-                'marzban_username': row[0],
-                'telegram_id': row[1],
-                'telegram_username': row[2],
-                'subscription_status': row[3],
-                'registration_date': row[4],
-                'is_verified': bool(row[5]),
-                'notes': row[6]
-            })
-        return result
+        return cursor.fetchall()
+    
+    def _refresh_cached_accounts(self, cursor: sqlite3.Cursor, telegram_id: int):
+        """Write-through обновление кеша после изменения связей пользователя"""
+        touched = getattr(self._local, 'tx_touched', None)
+        if touched is not None:
+            touched.add(telegram_id)
+        self.mapping_cache.set_accounts(telegram_id, self._fetch_accounts(cursor, telegram_id))
+    
+    def warm_mapping_cache(self) -> int:
+        """Заполнение кеша связей при запуске (в пределах лимита кеша)"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        try:
+            # telegram_id уникален, каждая строка — отдельный пользователь
+            cursor.execute('''
+                SELECT telegram_id FROM user_telegram_mapping 
+                WHERE telegram_id IS NOT NULL
+                ORDER BY id DESC
+                LIMIT ?
+            ''', (self.mapping_cache.max_entries,))
+            telegram_ids = [row[0] for row in cursor.fetchall()]
+            for telegram_id in reversed(telegram_ids):
+                self._refresh_cached_accounts(cursor, telegram_id)
+            logger.info(f"Кеш связей Telegram заполнен: {len(telegram_ids)} пользователей")
+            return len(telegram_ids)
+            
+        except sqlite3.Error as e:
+            # Без прогрева кеш заполняется по мере обращений, запуск бота не прерывается
+            logger.error(f"Ошибка заполнения кеша связей: {e}")
+            return 0
+        finally:
+            conn.close()
+    
+    def verify_mapping_cache(self, sample_size: int = 200) -> int:
+        """Сверка случайной выборки кеша с базой; расхождения исправляются. Возвращает число расхождений
+
+        Вызывать в потоке БД (AsyncDatabaseManager.run): между чтением из базы и записью
+        в кеш не должно быть записей из других потоков, иначе в кеш вернутся устаревшие данные.
+        """
+        cached_ids = self.mapping_cache.cached_telegram_ids()
+        if not cached_ids:
+            return 0
+        sample = random.sample(cached_ids, min(sample_size, len(cached_ids)))
+        
+        conn = self._connect()
+        cursor = conn.cursor()
+        mismatches = 0
+        try:
+            for telegram_id in sample:
+                actual = self._fetch_accounts(cursor, telegram_id)
+                cached = self.mapping_cache.peek_accounts(telegram_id)
+                if cached is None:
+                    continue
+                if cached != actual:
+                    mismatches += 1
+                    logger.warning(f"Кеш связей расходится с базой для Telegram ID {telegram_id}, запись обновлена")
+                    self.mapping_cache.set_accounts(telegram_id, actual)
+        finally:
+            conn.close()
+        return mismatches
     
     def add_telegram_id_to_notes(self, marzban_username: str, telegram_id: int) -> bool:
-        """Добавление Telegram ID в примечания пользователя"""
-        conn = sqlite3.connect(self.db_path)
+        """Добавление Telegram ID в примечания пользователя (прежняя отметка заменяется, а не дописывается)"""
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
@@ -339,7 +729,11 @@ class DatabaseManager:
                 logger.info(f"Telegram ID {telegram_id} уже есть в примечаниях для {marzban_username}")
                 return True
             
-            new_notes = f"{current_notes} | Telegram ID: {telegram_id}" if current_notes else f"Telegram ID: {telegram_id}"
+            marker = f"Telegram ID: {telegram_id}"
+            if re.search(r'Telegram ID: \d+', current_notes):
+                new_notes = re.sub(r'Telegram ID: \d+', marker, current_notes, count=1)
+            else:
+                new_notes = f"{current_notes} | {marker}" if current_notes else marker
             
             cursor.execute('''
                 UPDATE user_telegram_mapping 
@@ -351,6 +745,7 @@ class DatabaseManager:
             conn.commit()
             
             if success:
+                self.mapping_cache.invalidate_username(marzban_username)
                 logger.info(f"Telegram ID {telegram_id} добавлен в примечания для {marzban_username}")
             
             return success
@@ -363,7 +758,7 @@ class DatabaseManager:
     
     def update_user_notes(self, marzban_username: str, notes: str) -> bool:
         """Обновление примечаний пользователя"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
@@ -375,6 +770,8 @@ class DatabaseManager:
             
             success = cursor.rowcount > 0
             conn.commit()
+            if success:
+                self.mapping_cache.invalidate_username(marzban_username)
             return success
             
         except sqlite3.Error as e:
@@ -383,64 +780,31 @@ class DatabaseManager:
         finally:
             conn.close()
     
-    def get_user_by_telegram_id(self, telegram_id: int) -> Optional[Dict]:
+    def get_user_by_telegram_id(self, telegram_id: int) -> Optional[UserMapping]:
         """Получение пользователя по Telegram ID"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT marzban_username, telegram_id, telegram_username, 
-                   subscription_status, registration_date, is_verified, notes
-            FROM user_telegram_mapping 
-            WHERE telegram_id = ?
-        ''', (telegram_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            return {
-                'marzban_username': row[0],
-                'telegram_id': row[1],
-                'telegram_username': row[2],
-                'subscription_status': row[3],
-                'registration_date': row[4],
-                'is_verified': bool(row[5]),
-                'notes': row[6]
-            }
-        return None
-    
-    def get_user_by_marzban_username(self, marzban_username: str) -> Optional[Dict]:
+        accounts = self.get_users_by_telegram_id(telegram_id)
+        return accounts[0] if accounts else None
+    
+    def get_user_by_marzban_username(self, marzban_username: str) -> Optional[UserMapping]:
         """Получение пользователя по имени в Marzban"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
+        cursor.row_factory = UserMapping.row_factory
         
-        cursor.execute('''
-            SELECT marzban_username, telegram_id, telegram_username, 
-                   subscription_status, registration_date, is_verified, notes
+        cursor.execute(f'''
+            SELECT {UserMapping.columns()}
             FROM user_telegram_mapping 
             WHERE marzban_username = ?
         ''', (marzban_username,))
         
         row = cursor.fetchone()
         conn.close()
-        
-        if row:
-            return {
-                'marzban_username': row[0],
-                'telegram_id': row[1],
-                'telegram_username': row[2],
-                'subscription_status': row[3],
-                'registration_date': row[4],
-                'is_verified': bool(row[5]),
-                'notes': row[6]
-            }
-        return None
+        return row
     
     def link_telegram_account(self, marzban_username: str, telegram_id: int, 
                              telegram_username: str = None, phone_number: str = None) -> bool:
         """Связывание аккаунта Marzban с Telegram"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
@@ -453,14 +817,18 @@ class DatabaseManager:
             cursor.execute('''
                 UPDATE user_telegram_mapping 
                 SET telegram_id = ?, telegram_username = ?, phone_number = ?, 
-                    is_verified = TRUE, notes = ?
+                    is_verified = TRUE, notes = ?,
+                    linked_at = CURRENT_TIMESTAMP, last_seen_at = CURRENT_TIMESTAMP
                 WHERE marzban_username = ? AND telegram_id IS NULL
             ''', (telegram_id, telegram_username, phone_number, notes, marzban_username))
             
             success = cursor.rowcount > 0
+            if success:
+                self._bump_daily_stats(cursor, links=1)
             conn.commit()
             
             if success:
+                self._refresh_cached_accounts(cursor, telegram_id)
                 logger.info(f"Пользователь {marzban_username} связан с Telegram ID {telegram_id}")
             
             return success
@@ -471,9 +839,179 @@ class DatabaseManager:
         finally:
             conn.close()
     
+    def touch_last_seen(self, telegram_id: int) -> bool:
+        """Обновление времени последней активности пользователя"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                UPDATE user_telegram_mapping 
+                SET last_seen_at = CURRENT_TIMESTAMP
+                WHERE telegram_id = ?
+            ''', (telegram_id,))
+            
+            success = cursor.rowcount > 0
+            conn.commit()
+            return success
+            
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка обновления активности пользователя {telegram_id}: {e}")
+            return False
+        finally:
+            conn.close()
+    
+    def backup_to(self, target_path: str, pages_per_step: int = 1024, step_pause: float = 0.01,
+                  max_restarts: int = 3, source_path: Optional[str] = None) -> int:
+        """Онлайн-копия базы через SQLite backup API порциями по pages_per_step страниц
+
+        Блокировка чтения берется только на время одного шага, между шагами записи
+        бота проходят без ожидания. Запись из другого соединения заставляет SQLite
+        начать копирование заново; после max_restarts перезапусков шаг увеличивается
+        в 8 раз, в крайнем случае копия делается за один шаг.
+        source_path — другая база (архив), по умолчанию рабочая.
+        Возвращает количество скопированных страниц.
+        """
+        source_path = source_path or self.db_path
+        pages = pages_per_step
+        while True:
+            try:
+                return self._backup_attempt(source_path, target_path, pages, step_pause, max_restarts)
+            except _BackupRestarted:
+                if pages == -1:
+                    raise
+                pages = -1 if pages * 8 >= self._page_count(source_path) else pages * 8
+                logger.info(f"Резервная копия перезапускается из-за записи, шаг увеличен до {pages} страниц")
+    
+    def _backup_attempt(self, source_path: str, target_path: str, pages: int, step_pause: float,
+                        max_restarts: int) -> int:
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(target_path)
+        state = {'copied': 0, 'remaining': None, 'restarts': 0}
+        
+        def progress(status, remaining, total):
+            # Число оставшихся страниц не уменьшилось — копирование началось заново
+            if state['remaining'] is not None and remaining >= state['remaining']:
+                state['restarts'] += 1
+                if pages != -1 and state['restarts'] > max_restarts:
+                    raise _BackupRestarted()
+            state['remaining'] = remaining
+            state['copied'] = total - remaining
+            if remaining and step_pause:
+                time.sleep(step_pause)
+        
+        try:
+            source.backup(target, pages=pages, progress=progress)
+        finally:
+            target.close()
+            source.close()
+        return state['copied']
+    
+    def _page_count(self, path: Optional[str] = None) -> int:
+        conn = self._open(path)
+        count = conn.execute("PRAGMA page_count").fetchone()[0]
+        conn.close()
+        return count
+    
+    def get_table_columns(self, table: str) -> List[str]:
+        """Имена колонок таблицы из EXPORT_TABLES в порядке выдачи iter_table_rows"""
+        if table not in self.EXPORT_TABLES:
+            raise ValueError(f"Таблица {table} недоступна для выгрузки")
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = [row[1] for row in cursor.fetchall()]
+        conn.close()
+        return columns
+    
+    def iter_table_rows(self, table: str, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                        batch_size: int = 1000, include_archive: bool = True) -> Iterator[tuple]:
+        """Построчная выгрузка таблицы пачками по ключу id
+        
+        Каждая пачка читается отдельным коротким запросом, поэтому блокировка чтения
+        не удерживается на время всей выгрузки и не мешает записи.
+        Даты в формате 'YYYY-MM-DD', date_to включительно.
+        Для таблиц из ARCHIVE_TABLES после рабочей базы выдаются строки архива с теми же
+        фильтрами (include_archive=False — только рабочая база).
+        """
+        if table not in self.EXPORT_TABLES:
+            raise ValueError(f"Таблица {table} недоступна для выгрузки")
+        date_column = self.EXPORT_TABLES[table]
+        
+        conditions, params = ["id > ?"], []
+        if date_from:
+            conditions.append(f"{date_column} >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append(f"{date_column} < date(?, '+1 day')")
+            params.append(date_to)
+        where = ' AND '.join(conditions)
+        
+        conn = self._connect()
+        try:
+            yield from self._iter_batches(conn, f"SELECT * FROM {table} WHERE {where} ORDER BY id LIMIT ?",
+                                          params, batch_size)
+        finally:
+            conn.close()
+        
+        if not (include_archive and table in self.ARCHIVE_TABLES and self._archive_exists()):
+            return
+        columns = self.get_table_columns(table)
+        archive_conn = self._open(self.archive_path)
+        try:
+            archived = {row[1] for row in archive_conn.execute(f"PRAGMA table_info({table})")}
+            if not archived:
+                return  # таблица появляется в архиве при первом переносе
+            # Колонки в порядке рабочей схемы; добавленных после последнего переноса в архиве еще нет
+            select = ", ".join(column if column in archived else f"NULL AS {column}" for column in columns)
+            yield from self._iter_batches(
+                archive_conn, f"SELECT {select} FROM {table} WHERE {where} ORDER BY id LIMIT ?", params, batch_size
+            )
+        finally:
+            archive_conn.close()
+    
+    @staticmethod
+    def _iter_batches(conn: sqlite3.Connection, query: str, params: list, batch_size: int) -> Iterator[tuple]:
+        """Keyset-пагинация: первый параметр запроса — последний выданный id, первая колонка — id"""
+        last_id = 0
+        while True:
+            rows = conn.execute(query, [last_id, *params, batch_size]).fetchall()
+            if not rows:
+                break
+            yield from rows
+            last_id = rows[-1][0]
+    
+    def search_users(self, query: str, limit: int = 10, offset: int = 0) -> Tuple[List[UserMapping], bool]:
+        """Поиск пользователей по логину, Telegram, телефону и примечаниям
+
+        Каждое слово запроса ищется как префикс, результаты упорядочены по bm25
+        (совпадение в логине весит больше, чем в примечаниях).
+        Возвращает страницу результатов и признак наличия следующей.
+        """
+        # Слова запроса экранируются, чтобы ввод админа не разбирался как синтаксис FTS5
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return [], False
+        match = " ".join(f'"{term}"*' for term in terms)
+        
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.row_factory = UserMapping.row_factory
+        cursor.execute(f'''
+            SELECT {UserMapping.columns('m')}
+            FROM user_search
+            JOIN user_telegram_mapping m ON m.id = user_search.rowid
+            WHERE user_search MATCH ?
+            ORDER BY bm25(user_search, 10.0, 5.0, 5.0, 1.0)
+            LIMIT ? OFFSET ?
+        ''', (match, limit + 1, offset))
+        users = cursor.fetchall()
+        conn.close()
+        return users[:limit], len(users) > limit
+    
     def get_unlinked_users(self) -> List[str]:
         """Получение списка пользователей без связанного Telegram ID"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -486,9 +1024,10 @@ class DatabaseManager:
         return users
     
     def record_payment(self, telegram_id: int, marzban_username: str, amount: float, 
-                      payment_method: str, transaction_id: str = None, status: str = 'completed') -> bool:
-        """Запись платежа в историю"""
-        conn = sqlite3.connect(self.db_path)
+                      payment_method: str, transaction_id: str = None, status: str = 'completed',
+                      plan_id: str = None) -> bool:
+        """Запись платежа в историю (завершенные платежи учитываются в дневных агрегатах)"""
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
@@ -501,6 +1040,15 @@ class DatabaseManager:
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (telegram_id, marzban_username, amount, payment_method, transaction_id, status))
             
+            if status == 'completed':
+                self._bump_daily_stats(cursor, payments=1, revenue=amount)
+                cursor.execute('''
+                    INSERT INTO daily_revenue (day, plan_id, payment_method, payments, revenue)
+                    VALUES (date('now'), ?, ?, 1, ?)
+                    ON CONFLICT(day, plan_id, payment_method) DO UPDATE SET
+                        payments = payments + 1, revenue = revenue + excluded.revenue
+                ''', (plan_id or '', payment_method or '', amount))
+            
             conn.commit()
             logger.info(f"Платеж записан: {marzban_username} - {amount} руб.")
             return True
@@ -511,73 +1059,170 @@ class DatabaseManager:
         finally:
             conn.close()
     
-    def get_payment_history(self, telegram_id: int = None, marzban_username: str = None, 
-                           limit: int = 10) -> List[Dict]:
-        """Получение истории платежей"""
-        conn = sqlite3.connect(self.db_path)
+    def get_daily_rollups(self, days: int) -> List[Dict]:
+        """Дневные агрегаты за последние days дней (включая сегодня) по возрастанию даты"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute('''
+            SELECT day, payments, revenue, approvals, rejections, registrations, links
+            FROM daily_stats
+            WHERE day > date('now', ?)
+            ORDER BY day
+        ''', (f"-{days} days",))
+        rows = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return rows
+    
+    def get_revenue_breakdown(self, days: int) -> List[Dict]:
+        """Выручка за последние days дней в разрезе плана и способа оплаты"""
+        conn = self._connect()
         cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute('''
+            SELECT plan_id, payment_method, SUM(payments) AS payments, SUM(revenue) AS revenue
+            FROM daily_revenue
+            WHERE day > date('now', ?)
+            GROUP BY plan_id, payment_method
+            ORDER BY revenue DESC
+        ''', (f"-{days} days",))
+        rows = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return rows
+    
+    def get_payment_history(self, telegram_id: int = None, marzban_username: str = None, 
+                           limit: int = 10, include_archive: bool = True) -> List[PaymentRecord]:
+        """Получение истории платежей
+
+        Платежи рабочей базы и архива читаются одним запросом (ATTACH + UNION ALL),
+        поэтому пачка, перенесенная архиватором во время чтения, не пропадет и не
+        повторится (include_archive=False — только рабочая база).
+        """
+        # Внутри transaction() ATTACH недоступен, там читается только рабочая база
+        if not include_archive or not self._archive_exists() or getattr(self._local, 'tx_conn', None) is not None:
+            conn = self._connect()
+            try:
+                return self._select_payment_history(conn, ("main",), telegram_id, marzban_username, limit)
+            finally:
+                conn.close()
         
-        query = '''
-            SELECT telegram_id, marzban_username, amount, payment_date, 
-                   payment_method, transaction_id, status
-            FROM payment_history 
-        '''
-        params = []
+        conn = self._open()
+        try:
+            conn.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+            schemas = ("main",)
+            # Таблица появляется в архиве при первом переносе
+            if conn.execute("SELECT 1 FROM archive.sqlite_master WHERE type = 'table' AND name = 'payment_history'").fetchone():
+                schemas += ("archive",)
+            return self._select_payment_history(conn, schemas, telegram_id, marzban_username, limit)
+        finally:
+            conn.close()
+    
+    def _select_payment_history(self, conn, schemas: Tuple[str, ...], telegram_id: Optional[int],
+                                marzban_username: Optional[str], limit: int) -> List[PaymentRecord]:
+        cursor = conn.cursor()
+        cursor.row_factory = PaymentRecord.row_factory
         
+        condition, params = '', []
         if telegram_id:
-            query += 'WHERE telegram_id = ? '
-            params.append(telegram_id)
+            condition = 'WHERE telegram_id = ?'
+            params = [telegram_id] * len(schemas)
         elif marzban_username:
-            query += 'WHERE marzban_username = ? '
-            params.append(marzban_username)
+            condition = 'WHERE marzban_username = ?'
+            params = [marzban_username] * len(schemas)
         
-        query += 'ORDER BY payment_date DESC LIMIT ?'
+        query = ' UNION ALL '.join(
+            f'SELECT {PaymentRecord.columns()} FROM {schema}.payment_history {condition}' for schema in schemas
+        )
+        query += ' ORDER BY payment_date DESC LIMIT ?'
         params.append(limit)
         
         cursor.execute(query, tuple(params))
+        return cursor.fetchall()
+    
+    def _archive_exists(self) -> bool:
+        return bool(self.archive_path) and os.path.exists(self.archive_path)
+    
+    def archive_old_payments(self, horizon_days: int, batch_size: int = 500) -> Dict[str, int]:
+        """Перенос платежей и закрытых заявок старше horizon_days в архивную базу
+
+        Архив подключается через ATTACH; каждая пачка переносится (INSERT + DELETE)
+        отдельной короткой транзакцией, поэтому запись бота не ждет весь перенос.
+        Возвращает количество перенесенных строк по таблицам.
+        """
+        if not self.archive_path:
+            raise ValueError("Путь к архивной базе не задан")
         
-        payments = []
-        for row in cursor.fetchall():
-            payments.append({
-                'telegram_id': row[0],
-                'marzban_username': row[1],
-                'amount': row[2],
-                'payment_date': row[3],
-                'payment_method': row[4],
-                'transaction_id': row[5],
-                'status': row[6]
-            })
+        moved = {table: 0 for table in self.ARCHIVE_TABLES}
+        conn = self._open(isolation_level=None)
+        try:
+            conn.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+            for table, condition in self.ARCHIVE_TABLES.items():
+                columns = ", ".join(row[1] for row in conn.execute(f"PRAGMA main.table_info({table})"))
+                # Копия структуры без ограничений: id и значения переносятся как есть
+                conn.execute(f"CREATE TABLE IF NOT EXISTS archive.{table} AS SELECT {columns} FROM main.{table} WHERE 0")
+                self._sync_archive_columns(conn, table)
+                # CREATE TABLE AS не переносит первичный ключ; без индекса по id каждая пачка
+                # выгрузки архива (iter_table_rows) читала бы всю таблицу и сортировала ее
+                conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_archive_{table}_id ON {table} (id)")
+                
+                while True:
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        ids = [row[0] for row in conn.execute(
+                            f"SELECT id FROM main.{table} WHERE {condition} LIMIT ?",
+                            (f"-{horizon_days} days", batch_size)
+                        )]
+                        if ids:
+                            placeholders = ", ".join("?" for _ in ids)
+                            conn.execute(
+                                f"INSERT INTO archive.{table} ({columns}) SELECT {columns} FROM main.{table} WHERE id IN ({placeholders})",
+                                ids
+                            )
+                            conn.execute(f"DELETE FROM main.{table} WHERE id IN ({placeholders})", ids)
+                        conn.execute("COMMIT")
+                    except BaseException:
+                        conn.execute("ROLLBACK")
+                        raise
+                    moved[table] += len(ids)
+                    if len(ids) < batch_size:
+                        break
+            
+            conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_history_telegram_date ON payment_history (telegram_id, payment_date)")
+            conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_history_username_date ON payment_history (marzban_username, payment_date)")
+        finally:
+            conn.close()
         
-        conn.close()
-        return payments
+        if any(moved.values()):
+            logger.info(f"Архивировано строк: {moved}")
+        return moved
+    
+    def _sync_archive_columns(self, conn: sqlite3.Connection, table: str):
+        """Добавление в архивную таблицу колонок, появившихся в рабочей схеме после ее создания"""
+        archived = {row[1] for row in conn.execute(f"PRAGMA archive.table_info({table})")}
+        for row in conn.execute(f"PRAGMA main.table_info({table})").fetchall():
+            if row[1] not in archived:
+                conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {row[1]} {row[2]}")
     
     # ДОБАВЛЕНО: Новый метод для инкапсуляции запроса
-    def get_new_users_last_24h(self) -> List[Dict]:
+    def get_new_users_last_24h(self) -> List[UserMapping]:
         """Получение новых пользователей, зарегистрированных за последние 24 часа."""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT marzban_username, telegram_id, telegram_username, registration_date, notes
+        cursor.row_factory = UserMapping.row_factory
+        cursor.execute(f'''
+            SELECT {UserMapping.columns()}
             FROM user_telegram_mapping 
-            WHERE registration_date >= datetime('now', '-1 day')
-            AND notes LIKE '%Зарегистрирован через бота%'
+            WHERE registration_source = 'bot'
+            AND registration_date >= datetime('now', '-1 day')
             ORDER BY registration_date DESC
         ''')
-        users = []
-        for row in cursor.fetchall():
-            users.append({
-                'marzban_username': row[0],
-                'telegram_id': row[1],
-                'telegram_username': row[2],
-                'registration_date': row[3],
-                'notes': row[4]
-            })
+        users = cursor.fetchall()
         conn.close()
         return users
 
     def get_statistics(self) -> Dict:
         """Получение статистики базы данных"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         stats = {}
@@ -602,7 +1247,7 @@ class DatabaseManager:
     
     def update_user_status(self, marzban_username: str, status: str) -> bool:
         """Обновление статуса пользователя"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
@@ -614,6 +1259,8 @@ class DatabaseManager:
             
             success = cursor.rowcount > 0
             conn.commit()
+            if success:
+                self.mapping_cache.invalidate_username(marzban_username)
             return success
             
         except sqlite3.Error as e:
@@ -624,7 +1271,7 @@ class DatabaseManager:
     
     def get_setting(self, key: str) -> Optional[str]:
         """Получение настройки бота"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute("SELECT setting_value FROM bot_settings WHERE setting_key = ?", (key,))
@@ -635,7 +1282,7 @@ class DatabaseManager:
     
     def set_setting(self, key: str, value: str) -> bool:
         """Установка настройки бота"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
@@ -655,10 +1302,14 @@ class DatabaseManager:
     
     def delete_user_by_username(self, marzban_username: str) -> bool:
         """Удалить пользователя по marzban_username"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
+        cursor.execute("SELECT telegram_id FROM user_telegram_mapping WHERE marzban_username = ?", (marzban_username,))
+        row = cursor.fetchone()
         cursor.execute("DELETE FROM user_telegram_mapping WHERE marzban_username = ?", (marzban_username,))
         deleted = cursor.rowcount > 0
         conn.commit()
+        if deleted and row and row[0] is not None:
+            self._refresh_cached_accounts(cursor, row[0])
         conn.close()
         return deleted
\ No newline at end of file
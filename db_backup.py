@@ -0,0 +1,86 @@
+import gzip
+import logging
+import os
+import shutil
+import threading
+from typing import List, Optional
+
+from database_manager import DatabaseManager
+from utils.helpers import create_backup_filename
+
+logger = logging.getLogger(__name__)
+
+class BackupManager:
+    """Резервные копии базы: онлайн-копия, сжатие и ротация старых файлов"""
+
+    def __init__(self, db_manager: DatabaseManager, directory: str = "backups", keep: int = 7,
+                 compress: bool = True, pages_per_step: int = 1024, step_pause: float = 0.01,
+                 prefix: str = "users_database", archive_prefix: str = "users_archive"):
+        self.db = db_manager
+        self.directory = directory
+        self.keep = keep
+        self.compress = compress
+        self.pages_per_step = pages_per_step
+        self.step_pause = step_pause
+        self.prefix = prefix
+        self.archive_prefix = archive_prefix
+        # Плановая копия и команда /backup не должны писать одновременно
+        self._lock = threading.Lock()
+
+    def create_backup(self) -> str:
+        """Резервная копия рабочей базы и архива платежей; возвращает путь к копии рабочей базы"""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._backup_file(self.db.db_path, self.prefix)
+            # После архивации старые платежи есть только в архивной базе. Архив копируется
+            # после рабочей базы: строка, перенесенная между копиями, попадет в обе, а не потеряется
+            archive_path = self.db.archive_path
+            if archive_path and os.path.exists(archive_path):
+                self._backup_file(archive_path, self.archive_prefix)
+            return path
+
+    def _backup_file(self, source_path: str, prefix: str) -> str:
+        """Копия одной базы с последующей ротацией копий с тем же префиксом"""
+        path = os.path.join(self.directory, create_backup_filename(prefix))
+        # Копия пишется во временный файл, чтобы ротация не увидела недописанный бэкап
+        tmp_path = f"{path}.tmp"
+        try:
+            pages = self.db.backup_to(tmp_path, self.pages_per_step, self.step_pause, source_path=source_path)
+            if self.compress:
+                with open(tmp_path, 'rb') as src, gzip.open(f"{tmp_path}.gz", 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(tmp_path)
+                tmp_path, path = f"{tmp_path}.gz", f"{path}.gz"
+            os.replace(tmp_path, path)
+        finally:
+            for leftover in (tmp_path, f"{tmp_path}.gz"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+        logger.info(f"Резервная копия создана: {path} ({pages} страниц)")
+        self.rotate(prefix)
+        return path
+
+    def list_backups(self, prefix: Optional[str] = None) -> List[str]:
+        """Существующие копии от старых к новым (по умолчанию — копии рабочей базы)"""
+        if not os.path.isdir(self.directory):
+            return []
+        prefix = prefix or self.prefix
+        files = [
+            name for name in os.listdir(self.directory)
+            if name.startswith(f"{prefix}_") and name.endswith(('.db', '.db.gz'))
+        ]
+        # В имени метка времени YYYYmmdd_HHMMSS, поэтому сортировка по имени хронологическая
+        return [os.path.join(self.directory, name) for name in sorted(files)]
+
+    def rotate(self, prefix: Optional[str] = None) -> int:
+        """Удаление копий сверх лимита keep; возвращает число удаленных файлов"""
+        backups = self.list_backups(prefix)
+        removed = 0
+        for path in backups[:max(len(backups) - self.keep, 0)]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                logger.error(f"Не удалось удалить старую копию {path}: {e}")
+        return removed
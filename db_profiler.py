@@ -0,0 +1,203 @@
+import functools
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+# Списки плейсхолдеров разной длины (IN (?, ?, ?)) считаются одним запросом
+_PLACEHOLDERS_RE = re.compile(r'\?(?:\s*,\s*\?)+')
+# EXPLAIN QUERY PLAN имеет смысл только для запросов к данным
+_EXPLAINABLE_RE = re.compile(r'^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+@functools.lru_cache(maxsize=1024)
+def normalize_sql(sql: str) -> str:
+    """Текст запроса без лишних пробелов; ключ статистики"""
+    return _PLACEHOLDERS_RE.sub('?, ...', _WHITESPACE_RE.sub(' ', sql).strip())
+
+class _StatementStats:
+    __slots__ = ('count', 'total', 'max', 'rows', 'slow')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.slow = 0
+
+class QueryStats:
+    """Статистика выполнения SQL по тексту запроса и журнал медленных запросов
+
+    Для медленного запроса один раз пишется план (EXPLAIN QUERY PLAN),
+    дальше — только строка с длительностью, чтобы не засорять лог.
+    """
+
+    def __init__(self, slow_threshold: float = 0.1):
+        self.slow_threshold = slow_threshold
+        self._stats: Dict[str, _StatementStats] = {}
+        self._explained = set()
+        self._lock = threading.Lock()
+
+    def record(self, sql: str, duration: float, rows: int = 0, new_call: bool = True) -> _StatementStats:
+        """Учет выполнения (new_call=True) или дочитывания строк того же запроса"""
+        key = normalize_sql(sql)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _StatementStats()
+            if new_call:
+                stats.count += 1
+            stats.total += duration
+            stats.rows += rows
+            return stats
+
+    def finish(self, stats: _StatementStats, duration: float, already_slow: bool = False) -> bool:
+        """Обновление максимума; True — запрос только что превысил порог медленного"""
+        with self._lock:
+            if duration > stats.max:
+                stats.max = duration
+            if duration >= self.slow_threshold and not already_slow:
+                stats.slow += 1
+                return True
+        return False
+
+    def log_slow(self, conn: sqlite3.Connection, sql: str, params, duration: float, rows: int):
+        key = normalize_sql(sql)
+        message = f"Медленный запрос {duration * 1000:.0f} мс, строк {rows}: {key}"
+        with self._lock:
+            explain = key not in self._explained and _EXPLAINABLE_RE.match(sql) is not None
+            self._explained.add(key)
+        if explain:
+            try:
+                plan = sqlite3.Connection.execute(conn, f"EXPLAIN QUERY PLAN {sql}", params or ()).fetchall()
+                message += "\n" + "\n".join(f"  {row[3]}" for row in plan)
+            except sqlite3.Error as e:
+                message += f"\n  план недоступен: {e}"
+        logger.warning(message)
+
+    def report(self, limit: int = 15, order_by: str = 'total') -> List[Dict]:
+        """Самые затратные запросы: count, total, avg, max, rows, slow"""
+        with self._lock:
+            rows = [
+                {
+                    'sql': key,
+                    'count': stats.count,
+                    'total': stats.total,
+                    'avg': stats.total / stats.count if stats.count else 0.0,
+                    'max': stats.max,
+                    'rows': stats.rows,
+                    'slow': stats.slow,
+                }
+                for key, stats in self._stats.items()
+            ]
+        rows.sort(key=lambda row: row[order_by], reverse=True)
+        return rows[:limit]
+
+    def totals(self) -> Dict:
+        with self._lock:
+            return {
+                'statements': sum(stats.count for stats in self._stats.values()),
+                'seconds': sum(stats.total for stats in self._stats.values()),
+                'slow': sum(stats.slow for stats in self._stats.values()),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._explained.clear()
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Курсор с замером выполнения и чтения строк"""
+
+    _query_stats: Optional[QueryStats] = None
+
+    def _begin(self, sql: str, params, started: float):
+        stats = self.connection.query_stats
+        self._query_stats = stats
+        self._sql = sql
+        self._params = params
+        self._rows = 0
+        self._elapsed = time.perf_counter() - started
+        self._entry = stats.record(sql, self._elapsed)
+        self._slow = stats.finish(self._entry, self._elapsed)
+        if self._slow:
+            stats.log_slow(self.connection, sql, params, self._elapsed, 0)
+
+    def _fetched(self, rows: int, started: float):
+        if self._query_stats is None:
+            return
+        duration = time.perf_counter() - started
+        self._rows += rows
+        self._elapsed += duration
+        self._query_stats.record(self._sql, duration, rows, new_call=False)
+        if self._query_stats.finish(self._entry, self._elapsed, self._slow):
+            # Запрос стал медленным на чтении строк (большой результат)
+            self._slow = True
+            self._query_stats.log_slow(self.connection, self._sql, self._params, self._elapsed, self._rows)
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        result = super().execute(sql, parameters)
+        self._begin(sql, parameters, started)
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        result = super().executemany(sql, seq_of_parameters)
+        self._begin(sql, None, started)
+        return result
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(row is not None, started)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(len(rows), started)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(len(rows), started)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        row = super().__next__()
+        self._fetched(1, started)
+        return row
+
+class ProfiledConnection(sqlite3.Connection):
+    """Соединение, все курсоры которого учитываются в QueryStats
+
+    Используется как factory для sqlite3.connect; после подключения
+    нужно присвоить query_stats.
+    """
+
+    query_stats: QueryStats
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        # Фиксация (fsync) часто дороже самих запросов, учитываем ее отдельной строкой
+        started = time.perf_counter()
+        super().commit()
+        duration = time.perf_counter() - started
+        stats = self.query_stats.record("COMMIT", duration)
+        if self.query_stats.finish(stats, duration):
+            logger.warning(f"Медленная фиксация транзакции: {duration * 1000:.0f} мс")
@@ -0,0 +1,75 @@
+from dataclasses import dataclass
+from typing import Optional, Any
+
+class _Record:
+    """Словарная совместимость для записей БД (record['field'], record.get('field'))"""
+    __slots__ = ()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__match_args__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__match_args__
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self.__match_args__ else default
+
+    def keys(self):
+        return self.__match_args__
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.__match_args__}
+
+    @classmethod
+    def columns(cls, alias: str = "") -> str:
+        """Список колонок для SELECT в порядке полей записи (alias — псевдоним таблицы в JOIN)"""
+        prefix = f"{alias}." if alias else ""
+        return ", ".join(f"{prefix}{column}" for column in cls.__match_args__)
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        return cls(*row)
+
+@dataclass(frozen=True, slots=True)
+class UserMapping(_Record):
+    """Связь аккаунта Marzban с Telegram (таблица user_telegram_mapping)"""
+    marzban_username: str
+    telegram_id: Optional[int]
+    telegram_username: Optional[str]
+    subscription_status: Optional[str]
+    registration_date: Optional[str]
+    is_verified: bool
+    notes: Optional[str]
+    registration_source: Optional[str]
+    linked_at: Optional[str]
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        return cls(row[0], row[1], row[2], row[3], row[4], bool(row[5]), row[6], row[7], row[8])
+
+@dataclass(frozen=True, slots=True)
+class PaymentRequest(_Record):
+    """Заявка на оплату (таблица payment_requests)"""
+    id: int
+    telegram_id: int
+    marzban_username: str
+    plan_id: str
+    amount: float
+    created_at: Optional[str]
+    status: str
+    receipt_file_id: Optional[str]
+    receipt_type: Optional[str]
+
+@dataclass(frozen=True, slots=True)
+class PaymentRecord(_Record):
+    """Платеж из истории (таблица payment_history)"""
+    id: int
+    telegram_id: int
+    marzban_username: str
+    amount: float
+    payment_date: Optional[str]
+    payment_method: Optional[str]
+    transaction_id: Optional[str]
+    status: Optional[str]
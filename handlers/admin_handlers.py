@@ -1,664 +1,507 @@
-import sqlite3
-import logging
-from datetime import datetime
-from typing import Optional, Dict, List
-
-logger = logging.getLogger(__name__)
-
-class DatabaseManager:
-    def __init__(self, db_path: str = "users_database.db"):
-        self.db_path = db_path
-        self.init_database()
-    
-    def init_database(self):
-        """Инициализация базы данных и создание таблиц"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Таблица для связи пользователей Marzban с Telegram
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_telegram_mapping (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                marzban_username TEXT UNIQUE NOT NULL,
-                telegram_id INTEGER UNIQUE,
-                telegram_username TEXT,
-                phone_number TEXT,
-                registration_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                is_verified BOOLEAN DEFAULT FALSE,
-                subscription_status TEXT DEFAULT 'active',
-                notes TEXT
-            )
-        ''')
-        
-        # Таблица для истории платежей
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS payment_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                telegram_id INTEGER NOT NULL,
-                marzban_username TEXT NOT NULL,
-                amount DECIMAL(10,2),
-                payment_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                payment_method TEXT,
-                transaction_id TEXT,
-                status TEXT DEFAULT 'pending'
-            )
-        ''')
-
-        # Таблица для заявок на оплату
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS payment_requests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                telegram_id INTEGER NOT NULL,
-                marzban_username TEXT NOT NULL,
-                plan_id TEXT NOT NULL,
-                amount DECIMAL(10,2) NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                status TEXT DEFAULT 'pending',
-                receipt_file_id TEXT,
-                receipt_type TEXT,
-                admin_comment TEXT,
-                processed_at DATETIME,
-                processed_by INTEGER
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+from typing import Dict, List, Optional
+
+from .base_handler import BaseHandler
+from utils.formatters import (
+    format_statistics_message, format_user_info_message, format_pending_payments_page, format_perf_message,
+    format_query_stats_message, format_profile_message, format_memory_message,
+    format_analytics_message
+)
+from utils.helpers import generate_invite_code, format_file_size
+from catalog import catalog
+from monitoring import latency
+from monitoring.profiler import PROFILE_SORTS, ProfilerBusyError, profiler
+from db_backup import BackupManager
+from data_export import EXPORT_DATASETS, EXPORT_FORMATS, export_table
+from texts import get_json, get_text
+
+class AdminHandlers(BaseHandler):
+    """Обработчики админских команд"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.messages = get_json("handlers.admin_messages")
+        self.pending_messages = self.messages["pending"]
+        self.pending_page_size = self.pending_messages["page_size"]
+        backup_config = self.config.BACKUP
+        self.backup_manager = BackupManager(
+            self.db.sync,
+            directory=backup_config["directory"],
+            keep=backup_config["keep"],
+            compress=backup_config["compress"],
+            pages_per_step=backup_config["pages_per_step"],
+            step_pause=backup_config["step_pause"]
+        )
+
+    def register_callbacks(self, router):
+        router.register("pending_page_first", lambda update, context: self.pending_page_callback(update.callback_query), admin_only=True, answer=False)
+        router.register("pending_page_{after_id:int}", lambda update, context, after_id: self.pending_page_callback(update.callback_query, after_id=after_id), admin_only=True, answer=False)
+        router.register("pending_prev_{before_id:int}", lambda update, context, before_id: self.pending_page_callback(update.callback_query, before_id=before_id), admin_only=True, answer=False)
+        router.register("find_page_{offset:int}", lambda update, context, offset: self.find_page_callback(update.callback_query, context, offset), admin_only=True, answer=False)
+
+    async def admin_panel_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Админ панель: список команд и админская клавиатура"""
+        if not await self.require_admin(update):
+            return
+
+        await update.message.reply_text(
+            get_text("admin.commands"),
+            parse_mode='Markdown',
+            reply_markup=self.create_admin_keyboard()
+        )
+
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /stats"""
+        if not await self.require_admin(update):
+            return
+
+        try:
+            stats = await self.db.get_statistics()
+            stats['new_users_24h'] = len(await self.db.get_new_users_last_24h())
+        except Exception as e:
+            self.logger.error(f"Ошибка получения статистики: {e}")
+            await update.message.reply_text(self.messages["stats"]["error"])
+            return
+
+        await update.message.reply_text(format_statistics_message(stats))
+
+    async def new_users_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /new_users — регистрации через бота за последние 24 часа"""
+        if not await self.require_admin(update):
+            return
+
+        texts = self.messages["new_users"]
+        users = await self.db.get_new_users_last_24h()
+        if not users:
+            await update.message.reply_text(texts["empty"])
+            return
+
+        message = texts["header"].format(count=len(users))
+        for user in users:
+            telegram = f"@{user['telegram_username']}" if user['telegram_username'] else str(user['telegram_id'])
+            message += texts["line"].format(
+                username=user['marzban_username'],
+                telegram=telegram,
+                date=user['registration_date']
             )
-        ''')
-        
-        # Таблица для настроек бота
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS bot_settings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                setting_key TEXT UNIQUE NOT NULL,
-                setting_value TEXT,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        await update.message.reply_text(message)
+
+    async def pending_payments_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /pending — первая страница очереди заявок"""
+        if not await self.require_admin(update):
+            return
+
+        text, keyboard = await self._render_pending_page()
+        await update.message.reply_text(text, reply_markup=keyboard)
+
+    async def pending_page_callback(self, query, after_id: Optional[int] = None, before_id: Optional[int] = None):
+        """Переход по страницам очереди заявок (кнопки под сообщением /pending)"""
+        await query.answer()
+        text, keyboard = await self._render_pending_page(after_id, before_id)
+        await self.edit_message_with_keyboard(query, text, is_admin=True, inline_keyboard=keyboard)
+
+    async def _render_pending_page(self, after_id: Optional[int] = None, before_id: Optional[int] = None):
+        """Текст и клавиатура страницы очереди заявок"""
+        requests, has_more = await self.db.get_pending_payment_requests_page(
+            after_id=after_id, before_id=before_id, limit=self.pending_page_size
+        )
+        if before_id is not None and not has_more:
+            # Дошли до начала очереди: показываем полную первую страницу
+            after_id = before_id = None
+            requests, has_more = await self.db.get_pending_payment_requests_page(limit=self.pending_page_size)
+
+        total = await self.db.count_pending_payment_requests()
+        if not requests:
+            text = self.pending_messages["empty_page"] if total else format_pending_payments_page([], 0)
+        else:
+            text = format_pending_payments_page(requests, total)
+
+        # Навигация: при движении назад has_more означает наличие более новых заявок
+        if before_id is not None:
+            has_newer, has_older = has_more, bool(requests)
+        else:
+            has_newer, has_older = after_id is not None, has_more
+        return text, self._pending_keyboard(requests, has_newer, has_older)
+
+    def _pending_keyboard(self, requests: List, has_newer: bool, has_older: bool) -> InlineKeyboardMarkup:
+        """Кнопки одобрения/отклонения для каждой заявки и навигация по страницам"""
+        buttons = self.pending_messages["buttons"]
+        keyboard = [
+            [
+                InlineKeyboardButton(buttons["approve"].format(request_id=req['id']), callback_data=f"pending_approve_{req['id']}"),
+                InlineKeyboardButton(buttons["reject"].format(request_id=req['id']), callback_data=f"pending_reject_{req['id']}")
+            ]
+            for req in requests
+        ]
+
+        navigation = []
+        if has_newer and requests:
+            navigation.append(InlineKeyboardButton(buttons["prev"], callback_data=f"pending_prev_{requests[0]['id']}"))
+        navigation.append(InlineKeyboardButton(buttons["refresh"], callback_data="pending_page_first"))
+        if has_older and requests:
+            navigation.append(InlineKeyboardButton(buttons["next"], callback_data=f"pending_page_{requests[-1]['id']}"))
+        keyboard.append(navigation)
+        return InlineKeyboardMarkup(keyboard)
+
+    async def analytics_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /analytics [week|month] — тренды по дневным агрегатам"""
+        if not await self.require_admin(update):
+            return
+
+        texts = self.messages["analytics"]
+        period = texts["periods"].get(context.args[0] if context.args else "week")
+        if not period:
+            await update.message.reply_text(texts["usage"], parse_mode='Markdown')
+            return
+
+        days, bucket_days = period["days"], period["bucket_days"]
+        # Текущий и предыдущий период одним запросом к daily_stats
+        rows = await self.db.get_daily_rollups(days * 2)
+        breakdown = await self.db.get_revenue_breakdown(days)
+
+        # Агрегаты ведутся по date('now') SQLite, то есть в UTC
+        start = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+        current = self._sum_rollups(row for row in rows if row['day'] >= start.isoformat())
+        previous = self._sum_rollups(row for row in rows if row['day'] < start.isoformat())
+
+        by_day = {row['day']: row for row in rows}
+        buckets = []
+        for offset in range(0, days, bucket_days):
+            bucket_start = start + timedelta(days=offset)
+            bucket_days_list = (
+                (bucket_start + timedelta(days=i)).isoformat()
+                for i in range(min(bucket_days, days - offset))
             )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        logger.info("База данных инициализирована")
-    
-    def add_user(self, marzban_username: str, subscription_status: str = 'active', notes: str = None) -> bool:
-        """Добавление нового пользователя"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('''
-                INSERT OR IGNORE INTO user_telegram_mapping 
-                (marzban_username, subscription_status, notes) 
-                VALUES (?, ?, ?)
-            ''', (marzban_username, subscription_status, notes))
-            
-            success = cursor.rowcount > 0
-            conn.commit()
-            return success
-            
-        except sqlite3.Error as e:
-            logger.error(f"Ошибка добавления пользователя {marzban_username}: {e}")
-            return False
-        finally:
-            conn.close()
-    
-    def create_payment_request(self, telegram_id: int, marzban_username: str, plan_id: str, amount: float) -> int:
-        """Создание заявки на оплату"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('''
-                INSERT INTO payment_requests 
-                (telegram_id, marzban_username, plan_id, amount)
-                VALUES (?, ?, ?, ?)
-            ''', (telegram_id, marzban_username, plan_id, amount))
-            
-            request_id = cursor.lastrowid
-            conn.commit()
-            
-            logger.info(f"Создана заявка на оплату #{request_id} для {marzban_username}")
-            return request_id
-            
-        except sqlite3.Error as e:
-            logger.error(f"Ошибка создания заявки на оплату: {e}")
-            return 0
-        finally:
-            conn.close()
-    
-    def add_receipt_to_request(self, request_id: int, file_id: str, file_type: str) -> bool:
-        """Добавление чека к заявке на оплату"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('''
-                UPDATE payment_requests 
-                SET receipt_file_id = ?, receipt_type = ?
-                WHERE id = ?
-            ''', (file_id, file_type, request_id))
-            
-            success = cursor.rowcount > 0
-            conn.commit()
-            
-            if success:
-                logger.info(f"Чек добавлен к заявке #{request_id}")
-            
-            return success
-            
-        except sqlite3.Error as e:
-            logger.error(f"Ошибка добавления чека: {e}")
-            return False
-        finally:
-            conn.close()
-    
-    def get_pending_payment_requests(self) -> List[Dict]:
-        """Получение ожидающих обработки заявок"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, telegram_id, marzban_username, plan_id, amount, 
-                   created_at, receipt_file_id, receipt_type
-            FROM payment_requests 
-            WHERE status = 'pending'
-            ORDER BY created_at DESC
-        ''')
-        
-        requests = []
-        for row in cursor.fetchall():
-            requests.append({
-                'id': row[0],
-                'telegram_id': row[1],
-                'marzban_username': row[2],
-                'plan_id': row[3],
-                'amount': row[4],
-                'created_at': row[5],
-                'receipt_file_id': row[6],
-                'receipt_type': row[7]
-            })
-        
-        conn.close()
-        return requests
-    
-    def approve_payment_request(self, request_id: int, admin_id: int, comment: str = None) -> bool:
-        """Одобрение заявки на оплату"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('''
-                UPDATE payment_requests 
-                SET status = 'approved', processed_at = CURRENT_TIMESTAMP, 
-                    processed_by = ?, admin_comment = ?
-                WHERE id = ? AND status = 'pending'
-            ''', (admin_id, comment, request_id))
-            
-            success = cursor.rowcount > 0
-            conn.commit()
-            
-            if success:
-                logger.info(f"Заявка #{request_id} одобрена админом {admin_id}")
-            
-            return success
-            
-        except sqlite3.Error as e:
-            logger.error(f"Ошибка одобрения заявки: {e}")
-            return False
-        finally:
-            conn.close()
-    
-    def reject_payment_request(self, request_id: int, admin_id: int, comment: str) -> bool:
-        """Отклонение заявки на оплату"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('''
-                UPDATE payment_requests 
-                SET status = 'rejected', processed_at = CURRENT_TIMESTAMP, 
-                    processed_by = ?, admin_comment = ?
-                WHERE id = ? AND status = 'pending'
-            ''', (admin_id, comment, request_id))
-            
-            success = cursor.rowcount > 0
-            conn.commit()
-            
-            if success:
-                logger.info(f"Заявка #{request_id} отклонена админом {admin_id}")
-            
-            return success
-            
-        except sqlite3.Error as e:
-            logger.error(f"Ошибка отклонения заявки: {e}")
-            return False
-        finally:
-            conn.close()
-    
-    def get_payment_request(self, request_id: int) -> Optional[Dict]:
-        """Получение заявки по ID"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, telegram_id, marzban_username, plan_id, amount, 
-                   created_at, status, receipt_file_id, receipt_type
-            FROM payment_requests 
-            WHERE id = ?
-        ''', (request_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            return {
-                'id': row[0],
-                'telegram_id': row[1],
-                'marzban_username': row[2],
-                'plan_id': row[3],
-                'amount': row[4],
-                'created_at': row[5],
-                'status': row[6],
-                'receipt_file_id': row[7],
-                'receipt_type': row[8]
-            }
-        return None
-    
-    def create_new_user_record(self, username: str, telegram_id: int, telegram_username: str = None) -> bool:
-        """Создание записи для нового зарегистрированного пользователя"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            note_parts = [f"Telegram ID: {telegram_id}"]
-            if telegram_username:
-                note_parts.append(f"@{telegram_username}")
-            note_parts.append("Зарегистрирован через бота")
-            notes = " | ".join(note_parts)
-            
-            cursor.execute('''
-                INSERT INTO user_telegram_mapping 
-                (marzban_username, telegram_id, telegram_username, is_verified, 
-                 subscription_status, notes) 
-                VALUES (?, ?, ?, TRUE, 'active', ?)
-            ''', (username, telegram_id, telegram_username, notes))
-            
-            success = cursor.rowcount > 0
-            conn.commit()
-            
-            if success:
-                logger.info(f"Запись для нового пользователя {username} создана")
-            
-            return success
-            
-        except sqlite3.Error as e:
-            logger.error(f"Ошибка создания записи пользователя: {e}")
-            return False
-        finally:
-            conn.close()
-
-    def get_users_by_telegram_id(self, telegram_id: int) -> List[Dict]:
-        """Получение всех аккаунтов пользователя по Telegram ID"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT marzban_username, telegram_id, telegram_username, 
-                   subscription_status, registration_date, is_verified, notes
-            FROM user_telegram_mapping 
-            WHERE telegram_id = ?
-        ''', (telegram_id,))
-        rows = cursor.fetchall()
-        conn.close()
-        result = []
+            totals = self._sum_rollups(by_day[day] for day in bucket_days_list if day in by_day)
+            buckets.append((bucket_start.strftime('%d.%m'), totals))
+
+        plan_names = {str(plan.id): plan.name for plan in catalog.plans}
+        for row in breakdown:
+            row['plan'] = plan_names.get(row['plan_id'], row['plan_id'] or '-')
+
+        await update.message.reply_text(
+            format_analytics_message(period["title"], buckets, current, previous, breakdown)
+        )
+
+    @staticmethod
+    def _sum_rollups(rows) -> Dict:
+        """Сумма дневных агрегатов"""
+        totals = {}
         for row in rows:
-            result.append({
-                'marzban_username': row[0],
-                'telegram_id': row[1],
-                'telegram_username': row[2],
-                'subscription_status': row[3],
-                'registration_date': row[4],
-                'is_verified': bool(row[5]),
-                'notes': row[6]
-            })
-        return result
-    
-    def add_telegram_id_to_notes(self, marzban_username: str, telegram_id: int) -> bool:
-        """Добавление Telegram ID в примечания пользователя"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute(
-                "SELECT notes FROM user_telegram_mapping WHERE marzban_username = ?",
-                (marzban_username,)
-            )
-            result = cursor.fetchone()
-            
-            if not result:
-                return False
-            
-            current_notes = result[0] or ""
-            
-            if f"Telegram ID: {telegram_id}" in current_notes:
-                logger.info(f"Telegram ID {telegram_id} уже есть в примечаниях для {marzban_username}")
-                return True
-            
-            new_notes = f"{current_notes} | Telegram ID: {telegram_id}" if current_notes else f"Telegram ID: {telegram_id}"
-            
-            cursor.execute('''
-                UPDATE user_telegram_mapping 
-                SET notes = ?
-                WHERE marzban_username = ?
-            ''', (new_notes, marzban_username))
-            
-            success = cursor.rowcount > 0
-            conn.commit()
-            
-            if success:
-                logger.info(f"Telegram ID {telegram_id} добавлен в примечания для {marzban_username}")
-            
-            return success
-            
-        except sqlite3.Error as e:
-            logger.error(f"Ошибка обновления примечаний: {e}")
-            return False
-        finally:
-            conn.close()
-    
-    def update_user_notes(self, marzban_username: str, notes: str) -> bool:
-        """Обновление примечаний пользователя"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('''
-                UPDATE user_telegram_mapping 
-                SET notes = ?
-                WHERE marzban_username = ?
-            ''', (notes, marzban_username))
-            
-            success = cursor.rowcount > 0
-            conn.commit()
-            return success
-            
-        except sqlite3.Error as e:
-            logger.error(f"Ошибка обновления примечаний: {e}")
-            return False
-        finally:
-            conn.close()
-    
-    def get_user_by_telegram_id(self, telegram_id: int) -> Optional[Dict]:
-        """Получение пользователя по Telegram ID"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT marzban_username, telegram_id, telegram_username, 
-                   subscription_status, registration_date, is_verified, notes
-            FROM user_telegram_mapping 
-            WHERE telegram_id = ?
-        ''', (telegram_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            return {
-                'marzban_username': row[0],
-                'telegram_id': row[1],
-                'telegram_username': row[2],
-                'subscription_status': row[3],
-                'registration_date': row[4],
-                'is_verified': bool(row[5]),
-                'notes': row[6]
-            }
-        return None
-    
-    def get_user_by_marzban_username(self, marzban_username: str) -> Optional[Dict]:
-        """Получение пользователя по имени в Marzban"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT marzban_username, telegram_id, telegram_username, 
-                   subscription_status, registration_date, is_verified, notes
-            FROM user_telegram_mapping 
-            WHERE marzban_username = ?
-        ''', (marzban_username,))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            return {
-                'marzban_username': row[0],
-                'telegram_id': row[1],
-                'telegram_username': row[2],
-                'subscription_status': row[3],
-                'registration_date': row[4],
-                'is_verified': bool(row[5]),
-                'notes': row[6]
-            }
-        return None
-    
-    def link_telegram_account(self, marzban_username: str, telegram_id: int, 
-                             telegram_username: str = None, phone_number: str = None) -> bool:
-        """Связывание аккаунта Marzban с Telegram"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            note_parts = [f"Telegram ID: {telegram_id}"]
-            if telegram_username:
-                note_parts.append(f"@{telegram_username}")
-            note_parts.append("Связан через бота")
-            notes = " | ".join(note_parts)
-            
-            cursor.execute('''
-                UPDATE user_telegram_mapping 
-                SET telegram_id = ?, telegram_username = ?, phone_number = ?, 
-                    is_verified = TRUE, notes = ?
-                WHERE marzban_username = ? AND telegram_id IS NULL
-            ''', (telegram_id, telegram_username, phone_number, notes, marzban_username))
-            
-            success = cursor.rowcount > 0
-            conn.commit()
-            
-            if success:
-                logger.info(f"Пользователь {marzban_username} связан с Telegram ID {telegram_id}")
-            
-            return success
-            
-        except sqlite3.Error as e:
-            logger.error(f"Ошибка связывания аккаунта: {e}")
-            return False
-        finally:
-            conn.close()
-    
-    def get_unlinked_users(self) -> List[str]:
-        """Получение списка пользователей без связанного Telegram ID"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT marzban_username FROM user_telegram_mapping 
-            WHERE telegram_id IS NULL
-        ''')
-        
-        users = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return users
-    
-    def record_payment(self, telegram_id: int, marzban_username: str, amount: float, 
-                      payment_method: str, transaction_id: str = None, status: str = 'completed') -> bool:
-        """Запись платежа в историю"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+            for key, value in row.items():
+                if key != 'day':
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    async def find_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /find запрос — полнотекстовый поиск пользователей"""
+        if not await self.require_admin(update):
+            return
+
+        query = " ".join(context.args or []).strip()
+        if not query:
+            await update.message.reply_text(self.messages["find"]["usage"], parse_mode='Markdown')
+            return
+
+        # Запрос хранится у админа, в callback_data передается только смещение
+        context.user_data['find_query'] = query
+        text, keyboard = await self._render_find_page(query, 0)
+        await update.message.reply_text(text, reply_markup=keyboard)
+
+    async def find_page_callback(self, query, context: ContextTypes.DEFAULT_TYPE, offset: int):
+        """Листание результатов /find"""
+        search_query = context.user_data.get('find_query')
+        if not search_query:
+            await query.answer(self.messages["find"]["expired"], show_alert=True)
+            return
+
+        await query.answer()
+        text, keyboard = await self._render_find_page(search_query, offset)
+        await self.edit_message_with_keyboard(query, text, is_admin=True, inline_keyboard=keyboard)
+
+    async def _render_find_page(self, search_query: str, offset: int):
+        """Текст и клавиатура страницы результатов поиска"""
+        texts = self.messages["find"]
+        page_size = texts["page_size"]
+        users, has_more = await self.db.search_users(search_query, limit=page_size, offset=offset)
+        if not users:
+            return texts["empty"].format(query=search_query), None
+
+        message = texts["header"].format(query=search_query)
+        for number, user in enumerate(users, start=offset + 1):
+            telegram = f"@{user['telegram_username']}" if user['telegram_username'] else (user['telegram_id'] or "-")
+            status = f" ({user['subscription_status']})" if user['subscription_status'] else ""
+            message += texts["line"].format(number=number, username=user['marzban_username'], telegram=telegram, status=status)
+        message += texts["footer"]
+
+        navigation = []
+        if offset > 0:
+            navigation.append(InlineKeyboardButton(texts["buttons"]["prev"], callback_data=f"find_page_{max(offset - page_size, 0)}"))
+        if has_more:
+            navigation.append(InlineKeyboardButton(texts["buttons"]["next"], callback_data=f"find_page_{offset + page_size}"))
+        return message, InlineKeyboardMarkup([navigation]) if navigation else None
+
+    async def user_info_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /user_info username"""
+        if not await self.require_admin(update):
+            return
+
+        if not context.args:
+            await update.message.reply_text(get_text("admin.USER_INFO_USAGE"), parse_mode='Markdown')
+            return
+
+        username = context.args[0]
+        user = await self.db.get_user_by_marzban_username(username)
+        if not user:
+            await update.message.reply_text(get_text("admin.USER_NOT_FOUND").format(username=username))
+            return
+
+        user_data = user.to_dict()
+        payments = await self.db.get_payment_history(marzban_username=username, limit=5)
+        user_data['payments'] = [
+            {'date': p['payment_date'], 'amount': p['amount'], 'status': p['status']}
+            for p in payments
+        ]
+        stats = self.marzban.get_user_usage_stats(username)
+
+        await update.message.reply_text(
+            format_user_info_message(user_data, stats, self.marzban),
+            parse_mode='MarkdownV2'
+        )
+
+    async def admin_links_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /admin_links — ссылки привязки для аккаунтов без Telegram"""
+        if not await self.require_admin(update):
+            return
+
+        unlinked = await self.db.get_unlinked_users()
+        if not unlinked:
+            await update.message.reply_text(get_text("admin.ALL_USERS_LINKED"))
+            return
+
+        bot_username = context.bot.username
+        message = get_text("admin.LINKS_HEADER") + "\n\n"
+        for username in unlinked:
+            link = f"https://t.me/{bot_username}?start={generate_invite_code(username)}"
+            entry = get_text("admin.LINK_USER").format(username=username, link=link) + "\n\n"
+            # Ограничение Telegram на длину сообщения
+            if len(message) + len(entry) > 4000:
+                await update.message.reply_text(message, disable_web_page_preview=True)
+                message = ""
+            message += entry
+
+        message += get_text("admin.LINKS_SUMMARY").format(count=len(unlinked))
+        await update.message.reply_text(message, disable_web_page_preview=True)
+
+    async def delete_user_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /delete_user username"""
+        if not await self.require_admin(update):
+            return
+
+        texts = self.messages["delete_user"]
+        if not context.args:
+            await update.message.reply_text(texts["usage"], parse_mode='Markdown')
+            return
+
+        username = context.args[0]
+        if await self.db.delete_user_by_username(username):
+            self.logger.info(f"Админ {update.effective_user.id} удалил пользователя {username}")
+            await update.message.reply_text(texts["success"].format(username=username))
+        else:
+            await update.message.reply_text(texts["not_found"].format(username=username))
+
+    async def export_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /export — выгрузка таблиц в gzip CSV/JSONL документом"""
+        if not await self.require_admin(update):
+            return
+
+        texts = self.messages["export"]
+        args = list(context.args or [])
+        if not args or (args[0] not in EXPORT_DATASETS and args[0] != 'all'):
+            await update.message.reply_text(texts["usage"], parse_mode='Markdown')
+            return
+
+        datasets = list(EXPORT_DATASETS) if args[0] == 'all' else [args[0]]
+        fmt = args.pop(1) if len(args) > 1 and args[1] in EXPORT_FORMATS else 'csv'
+        dates = args[1:3]
+        for value in dates:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                await update.message.reply_text(texts["invalid_date"].format(value=value))
+                return
+        date_from = dates[0] if len(dates) > 0 else None
+        date_to = dates[1] if len(dates) > 1 else None
+
+        await update.message.reply_text(texts["started"])
+        export_config = self.config.EXPORT
+        os.makedirs(export_config["directory"], exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+        for dataset in datasets:
+            path = os.path.join(export_config["directory"], f"{dataset}_{timestamp}.{fmt}.gz")
+            try:
+                # Отдельный поток с собственным соединением: очередь потока БД не занимается
+                count = await asyncio.to_thread(
+                    export_table, self.db.sync, EXPORT_DATASETS[dataset], fmt, path,
+                    date_from, date_to, export_config["batch_size"]
+                )
+                with open(path, 'rb') as document:
+                    await update.message.reply_document(
+                        document,
+                        filename=os.path.basename(path),
+                        caption=texts["caption"].format(dataset=dataset, count=count)
+                    )
+            except Exception as e:
+                self.logger.error(f"Ошибка выгрузки {dataset}: {e}")
+                await update.message.reply_text(texts["error"].format(dataset=dataset))
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    async def backup_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /backup — внеплановая резервная копия базы"""
+        if not await self.require_admin(update):
+            return
+
+        texts = self.messages["backup"]
+        await update.message.reply_text(texts["started"])
         try:
-            if not transaction_id:
-                transaction_id = f"manual_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            
-            cursor.execute('''
-                INSERT INTO payment_history 
-                (telegram_id, marzban_username, amount, payment_method, transaction_id, status)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (telegram_id, marzban_username, amount, payment_method, transaction_id, status))
-            
-            conn.commit()
-            logger.info(f"Платеж записан: {marzban_username} - {amount} руб.")
-            return True
-            
-        except sqlite3.Error as e:
-            logger.error(f"Ошибка записи платежа: {e}")
-            return False
-        finally:
-            conn.close()
-    
-    def get_payment_history(self, telegram_id: int = None, marzban_username: str = None, 
-                           limit: int = 10) -> List[Dict]:
-        """Получение истории платежей"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        query = '''
-            SELECT telegram_id, marzban_username, amount, payment_date, 
-                   payment_method, transaction_id, status
-            FROM payment_history 
-        '''
-        params = []
-        
-        if telegram_id:
-            query += 'WHERE telegram_id = ? '
-            params.append(telegram_id)
-        elif marzban_username:
-            query += 'WHERE marzban_username = ? '
-            params.append(marzban_username)
-        
-        query += 'ORDER BY payment_date DESC LIMIT ?'
-        params.append(limit)
-        
-        cursor.execute(query, tuple(params))
-        
-        payments = []
-        for row in cursor.fetchall():
-            payments.append({
-                'telegram_id': row[0],
-                'marzban_username': row[1],
-                'amount': row[2],
-                'payment_date': row[3],
-                'payment_method': row[4],
-                'transaction_id': row[5],
-                'status': row[6]
-            })
-        
-        conn.close()
-        return payments
-    
-    # ДОБАВЛЕНО: Новый метод для инкапсуляции запроса
-    def get_new_users_last_24h(self) -> List[Dict]:
-        """Получение новых пользователей, зарегистрированных за последние 24 часа."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT marzban_username, telegram_id, telegram_username, registration_date, notes
-            FROM user_telegram_mapping 
-            WHERE registration_date >= datetime('now', '-1 day')
-            AND notes LIKE '%Зарегистрирован через бота%'
-            ORDER BY registration_date DESC
-        ''')
-        users = []
-        for row in cursor.fetchall():
-            users.append({
-                'marzban_username': row[0],
-                'telegram_id': row[1],
-                'telegram_username': row[2],
-                'registration_date': row[3],
-                'notes': row[4]
-            })
-        conn.close()
-        return users
-
-    def get_statistics(self) -> Dict:
-        """Получение статистики базы данных"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        stats = {}
-        
-        cursor.execute("SELECT COUNT(*) FROM user_telegram_mapping")
-        stats['total_users'] = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM user_telegram_mapping WHERE telegram_id IS NOT NULL")
-        stats['linked_users'] = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM payment_requests WHERE status = 'pending'")
-        stats['pending_payments'] = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(*) FROM payment_requests WHERE status = 'approved' AND date(processed_at) = date('now')")
-        stats['approved_today'] = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT SUM(amount) FROM payment_history WHERE status = 'completed' AND datetime(payment_date) >= datetime('now', '-30 days')")
-        stats['monthly_revenue'] = cursor.fetchone()[0] or 0
-        
-        conn.close()
-        return stats
-    
-    def update_user_status(self, marzban_username: str, status: str) -> bool:
-        """Обновление статуса пользователя"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+            # Копирование идет в отдельном потоке и не занимает поток БД
+            path = await asyncio.to_thread(self.backup_manager.create_backup)
+        except Exception as e:
+            self.logger.error(f"Ошибка резервного копирования: {e}")
+            await update.message.reply_text(texts["error"])
+            return
+
+        await update.message.reply_text(texts["done"].format(
+            file=os.path.basename(path),
+            size=format_file_size(os.path.getsize(path)),
+            count=len(self.backup_manager.list_backups())
+        ))
+
+    async def perf_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /perf [окно] — перцентили задержек обработчиков за скользящее окно"""
+        if not await self.require_admin(update):
+            return
+
+        windows = self.config.MONITORING['latency_windows']
+        window = context.args[0] if context.args else self.config.MONITORING['latency_default_window']
+        if window not in windows:
+            await update.message.reply_text(self.messages["perf"]["usage"].format(windows=", ".join(windows)))
+            return
+
+        stats = latency.snapshot(windows[window])
+        await update.message.reply_text(format_perf_message(window, stats), parse_mode='HTML')
+
+    async def db_stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /db_stats [total|count|max|avg] [reset] — самые затратные SQL-запросы"""
+        if not await self.require_admin(update):
+            return
+
+        texts = self.messages["db_stats"]
+        query_stats = self.db.sync.query_stats
+        if query_stats is None:
+            await update.message.reply_text(texts["disabled"])
+            return
+
+        args = list(context.args or [])
+        if "reset" in args:
+            query_stats.reset()
+            await update.message.reply_text(texts["reset"])
+            return
+
+        order_by = args[0] if args else "total"
+        if order_by not in ("total", "count", "max", "avg"):
+            await update.message.reply_text(texts["usage"])
+            return
+
+        report = query_stats.report(texts["limit"], order_by)
+        await update.message.reply_text(
+            format_query_stats_message(order_by, report, query_stats.totals()),
+            parse_mode='HTML'
+        )
+
+    async def profile_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /profile [секунды] [tottime|cumtime|ncalls] — cProfile event loop под живой нагрузкой"""
+        if not await self.require_admin(update):
+            return
+
+        texts = self.messages["profile"]
+        monitoring = self.config.MONITORING
+        args = list(context.args or [])
+        sort = args.pop() if args and args[-1] in PROFILE_SORTS else PROFILE_SORTS[0]
         try:
-            cursor.execute('''
-                UPDATE user_telegram_mapping 
-                SET subscription_status = ?
-                WHERE marzban_username = ?
-            ''', (status, marzban_username))
-            
-            success = cursor.rowcount > 0
-            conn.commit()
-            return success
-            
-        except sqlite3.Error as e:
-            logger.error(f"Ошибка обновления статуса пользователя: {e}")
-            return False
-        finally:
-            conn.close()
-    
-    def get_setting(self, key: str) -> Optional[str]:
-        """Получение настройки бота"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT setting_value FROM bot_settings WHERE setting_key = ?", (key,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        return result[0] if result else None
-    
-    def set_setting(self, key: str, value: str) -> bool:
-        """Установка настройки бота"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+            seconds = int(args[0]) if args else monitoring['profile_default_seconds']
+        except ValueError:
+            seconds = 0
+        if not 0 < seconds <= monitoring['profile_max_seconds'] or len(args) > 1:
+            await update.message.reply_text(texts["usage"].format(max_seconds=monitoring['profile_max_seconds']))
+            return
+
+        if profiler.busy:
+            await update.message.reply_text(texts["busy"])
+            return
+
+        # Апдейты обрабатываются последовательно: сеанс идет в отдельной задаче,
+        # иначе обработчик ждал бы seconds секунд и профиль был бы пустым
+        context.application.create_task(self._send_profile(context, update.effective_chat.id, seconds, sort))
+        await update.message.reply_text(texts["started"].format(seconds=seconds))
+
+    async def _send_profile(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, seconds: int, sort: str):
+        """Сеанс профилирования и отправка результата админу"""
+        texts = self.messages["profile"]
         try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO bot_settings (setting_key, setting_value, updated_at)
-                VALUES (?, ?, CURRENT_TIMESTAMP)
-            ''', (key, value))
-            
-            conn.commit()
-            return True
-            
-        except sqlite3.Error as e:
-            logger.error(f"Ошибка сохранения настройки: {e}")
-            return False
-        finally:
-            conn.close()
-    
-    def delete_user_by_username(self, marzban_username: str) -> bool:
-        """Удалить пользователя по marzban_username"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM user_telegram_mapping WHERE marzban_username = ?", (marzban_username,))
-        deleted = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
-        return deleted
\ No newline at end of file
+            path, rows = await profiler.profile(seconds, sort, self.config.MONITORING['profile_top'])
+        except ProfilerBusyError:
+            await context.bot.send_message(chat_id, texts["busy"])
+            return
+        except OSError as e:
+            self.logger.error(f"Ошибка сохранения профиля: {e}")
+            await context.bot.send_message(chat_id, texts["error"].format(error=e))
+            return
+        await context.bot.send_message(chat_id, format_profile_message(seconds, sort, rows, path), parse_mode='HTML')
+
+    async def memory_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /memory [stop] — снимок tracemalloc и рост памяти с предыдущего снимка"""
+        if not await self.require_admin(update):
+            return
+
+        texts = self.messages["memory"]
+        args = list(context.args or [])
+        if args == ["stop"]:
+            await update.message.reply_text(texts["stopped"] if profiler.stop_memory() else texts["not_running"])
+            return
+        if args:
+            await update.message.reply_text(texts["usage"])
+            return
+
+        # Снимок кучи занимает заметное время на большом процессе — вне event loop
+        report = await asyncio.to_thread(profiler.memory_snapshot, self.config.MONITORING['memory_top'])
+        if report is None:
+            await update.message.reply_text(texts["started"])
+            return
+        await update.message.reply_text(format_memory_message(report), parse_mode='HTML')
+
+    async def reload_plans_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /reload_plans — перечитать тарифы и способы оплаты без перезапуска"""
+        if not await self.require_admin(update):
+            return
+
+        texts = self.messages["reload_plans"]
+        if not catalog.reload():
+            await update.message.reply_text(texts["error"])
+            return
+
+        plans = "\n".join(
+            texts["plan_line"].format(id=plan.id, name=plan.name, price=plan.price, days=plan.duration_days)
+            for plan in catalog.plans
+        )
+        await update.message.reply_text(texts["done"].format(
+            version=catalog.version,
+            methods=len(catalog.payment_methods),
+            plans=plans
+        ))
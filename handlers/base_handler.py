@@ -5,7 +5,9 @@ from typing import Dict, Any
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import ContextTypes
 
-from database_manager import DatabaseManager
+from async_database_manager import AsyncDatabaseManager
+from callback_router import CallbackRouter
+from keyboards import keyboard_registry
 from marzban_api import MarzbanAPI
 from config import get_config
 from texts import get_text
@@ -19,12 +21,15 @@ user_states = {}
 class BaseHandler(ABC):
     """Базовый класс для всех обработчиков"""
     
-    def __init__(self, db_manager: DatabaseManager, marzban_api: MarzbanAPI):
+    def __init__(self, db_manager: AsyncDatabaseManager, marzban_api: MarzbanAPI):
         self.db = db_manager
         self.marzban = marzban_api
         self.config = config
         self.logger = logger
     
+    def register_callbacks(self, router: CallbackRouter):
+        """Регистрация inline-кнопок обработчика в маршрутизаторе callback_data"""
+    
     def is_admin(self, user_id: int) -> bool:
         """Проверка прав администратора"""
         return self.config.is_admin(user_id)
@@ -38,7 +43,7 @@ class BaseHandler(ABC):
     
     async def get_verified_user(self, telegram_id: int) -> Dict[str, Any]:
         """Получение верифицированного пользователя"""
-        user = self.db.get_user_by_telegram_id(telegram_id)
+        user = await self.db.get_user_by_telegram_id(telegram_id)
         if not user or not user['is_verified']:
             return None
         return user
@@ -53,17 +58,27 @@ class BaseHandler(ABC):
     
     def create_main_menu_keyboard(self, user: Dict = None) -> InlineKeyboardMarkup:
         """Создание главного inline меню"""
-        keyboard = [
-            [InlineKeyboardButton("🆕 Создать аккаунт", callback_data="create_account"), InlineKeyboardButton("🔗 Связать аккаунт", callback_data="link_account")],
-            [InlineKeyboardButton("📞 Поддержка", callback_data="support"), InlineKeyboardButton("ℹ️ Помощь", callback_data="help")]
-        ]
+        head, tail = keyboard_registry.get("main_menu_rows", lambda: (
+            (
+                (InlineKeyboardButton("🆕 Создать аккаунт", callback_data="create_account"), InlineKeyboardButton("🔗 Связать аккаунт", callback_data="link_account")),
+            ),
+            (
+                (InlineKeyboardButton("📞 Поддержка", callback_data="support"), InlineKeyboardButton("ℹ️ Помощь", callback_data="help")),
+                (InlineKeyboardButton("📱 Скачать приложение", callback_data="download_app"),),
+            ),
+        ))
         if user and user.get('is_verified'):
-            keyboard.insert(1, [InlineKeyboardButton("🔗 Ссылка подписки", callback_data=f"get_subscription_{user['marzban_username']}")])
-        keyboard.append([InlineKeyboardButton("📱 Скачать приложение", callback_data="download_app")])
-        return InlineKeyboardMarkup(keyboard)
+            # Единственная динамическая кнопка — ссылка подписки конкретного аккаунта
+            subscription_row = (InlineKeyboardButton("🔗 Ссылка подписки", callback_data=f"get_subscription_{user['marzban_username']}"),)
+            return InlineKeyboardMarkup(head + (subscription_row,) + tail)
+        return keyboard_registry.get("main_menu", lambda: InlineKeyboardMarkup(head + tail))
     
     def create_reply_keyboard(self, user: Dict = None, is_admin: bool = False) -> ReplyKeyboardMarkup:
         """Создание постоянного нижнего меню"""
+        key = ("reply", bool(user), bool(user) and is_admin)
+        return keyboard_registry.get(key, lambda: self._build_reply_keyboard(user, is_admin))
+    
+    def _build_reply_keyboard(self, user: Dict = None, is_admin: bool = False) -> ReplyKeyboardMarkup:
         if not user:
             keyboard = [
                 ["🆕 Создать аккаунт", "🔗 Связать аккаунт"],
@@ -86,6 +101,9 @@ class BaseHandler(ABC):
     
     def create_admin_keyboard(self) -> ReplyKeyboardMarkup:
         """Создание админ клавиатуры"""
+        return keyboard_registry.get("admin", self._build_admin_keyboard)
+    
+    def _build_admin_keyboard(self) -> ReplyKeyboardMarkup:
         keyboard = [
             ["📊 Статистика", "👥 Новые пользователи"],
             ["💰 Ожидающие платежи", "🔗 Ссылки для привязки"],
@@ -132,6 +150,14 @@ class BaseHandler(ABC):
                 reply_markup=inline_keyboard or reply_keyboard
             )
     
+    def back_button_row(self, callback_data: str = "main_menu") -> tuple:
+        """Строка с кнопкой «Назад» (общая для всех клавиатур)"""
+        return keyboard_registry.get(("back", callback_data), lambda: (InlineKeyboardButton("◀️ Назад", callback_data=callback_data),))
+    
+    def back_keyboard(self, callback_data: str = "main_menu") -> InlineKeyboardMarkup:
+        """Клавиатура из одной кнопки «Назад»"""
+        return keyboard_registry.get(("back_markup", callback_data), lambda: InlineKeyboardMarkup([self.back_button_row(callback_data)]))
+    
     def get_user_state(self, user_id: int) -> Dict:
         """Получение состояния пользователя"""
         return user_states.get(user_id, {})
@@ -1,10 +1,13 @@
 from datetime import datetime
+from typing import Tuple
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from .base_handler import BaseHandler
-from plans import PLANS, Plan
-from payment_methods import PAYMENT_METHODS, PaymentMethodData
+from catalog import catalog
+from plans import Plan
+from payment_methods import PaymentMethodData
+from keyboards import keyboard_registry
 from texts import get_json
 
 class PaymentHandlers(BaseHandler):
@@ -13,11 +16,21 @@ class PaymentHandlers(BaseHandler):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.messages = get_json("handlers.payment_messages")
+        # Заявки, которые прямо сейчас одобряются (защита от двойного продления)
+        self._requests_in_progress = set()
+    
+    def register_callbacks(self, router):
+        router.register("payment", lambda update, context: self.show_payment_accounts(update.callback_query))
+        router.register("payacc_{username}", lambda update, context, username: self.show_payment_plans_for_account(update.callback_query, username))
+        router.register("plan_{plan_id}_{username?}", lambda update, context, plan_id, username: self.process_payment_plan(update.callback_query, plan_id, username))
+        router.register("paid_{plan_id}_{username}", self.payment_claim_callback)
+        router.register("pending_approve_{request_id:int}", lambda update, context, request_id: self.approve_request_callback(update.callback_query, context, request_id), admin_only=True, answer=False)
+        router.register("pending_reject_{request_id:int}", lambda update, context, request_id: self.reject_request_callback(update.callback_query, request_id), admin_only=True, answer=False)
     
     async def show_payment_accounts(self, query):
         """Показать список аккаунтов для оплаты"""
         user_id = query.from_user.id
-        accounts = self.db.get_users_by_telegram_id(user_id)
+        accounts = await self.db.get_users_by_telegram_id(user_id)
         if not accounts:
             await query.edit_message_text(self.messages["accounts"]["no_accounts"])
             return
@@ -28,7 +41,7 @@ class PaymentHandlers(BaseHandler):
             keyboard.append([
                 InlineKeyboardButton(text, callback_data=f"payacc_{acc['marzban_username']}")
             ])
-        keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="main_menu")])
+        keyboard.append(self.back_button_row())
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(
             self.messages["accounts"]["select_account"],
@@ -38,87 +51,67 @@ class PaymentHandlers(BaseHandler):
     async def show_payment_plans_for_account(self, query, marzban_username: str):
         """Показать тарифы для выбранного аккаунта"""
         message = self.messages["plans"]["for_account"].format(username=marzban_username)
-        keyboard = []
-        
-        for plan in PLANS:
-            price_per_month = plan.price / (plan.duration_days / 30)
-            plan_format = self.messages["plans"]["format"]
-            
-            if plan.description:
-                plan_text = plan_format["with_description"].format(
-                    name=plan.name,
-                    price=plan.price,
-                    description=plan.description
-                )
-            elif plan.duration_days > 30:
-                plan_text = plan_format["with_monthly"].format(
-                    name=plan.name,
-                    price=plan.price,
-                    price_per_month=price_per_month
-                )
-            else:
-                plan_text = plan_format["base"].format(
-                    name=plan.name,
-                    price=plan.price
-                )
-                
-            keyboard.append([
-                InlineKeyboardButton(plan_text, callback_data=f"plan_{plan.id}_{marzban_username}")
-            ])
-            
-        keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="payment")])
+        # Надписи тарифов общие, в callback_data подставляется только логин
+        keyboard = [
+            (InlineKeyboardButton(plan_text, callback_data=f"plan_{plan_id}_{marzban_username}"),)
+            for plan_id, plan_text in self._plan_labels()
+        ]
+        keyboard.append(self.back_button_row("payment"))
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(message, parse_mode='Markdown', reply_markup=reply_markup)
 
+    def _plan_labels(self) -> tuple:
+        """Пары (id тарифа, надпись кнопки) — строятся один раз"""
+        snapshot = catalog.current
+        return keyboard_registry.get(
+            ("plan_labels", snapshot.version),
+            lambda: tuple((plan.id, self._plan_button_text(plan)) for plan in snapshot.plans)
+        )
+
+    def _plan_button_text(self, plan: Plan) -> str:
+        plan_format = self.messages["plans"]["format"]
+        if plan.description:
+            return plan_format["with_description"].format(
+                name=plan.name,
+                price=plan.price,
+                description=plan.description
+            )
+        if plan.duration_days > 30:
+            return plan_format["with_monthly"].format(
+                name=plan.name,
+                price=plan.price,
+                price_per_month=plan.price / (plan.duration_days / 30)
+            )
+        return plan_format["base"].format(
+            name=plan.name,
+            price=plan.price
+        )
+
     async def show_payment_plans(self, query):
         """Показать планы подписки"""
         message = self.messages["plans"]["header"]
-        keyboard = []
-        
-        for plan in PLANS:
-            price_per_month = plan.price / (plan.duration_days / 30)
-            plan_format = self.messages["plans"]["format"]
-            
-            if plan.description:
-                plan_text = plan_format["with_description"].format(
-                    name=plan.name,
-                    price=plan.price,
-                    description=plan.description
-                )
-            elif plan.duration_days > 30:
-                plan_text = plan_format["with_monthly"].format(
-                    name=plan.name,
-                    price=plan.price,
-                    price_per_month=price_per_month
-                )
-            else:
-                plan_text = plan_format["base"].format(
-                    name=plan.name,
-                    price=plan.price
-                )
-                
-            keyboard.append([InlineKeyboardButton(plan_text, callback_data=f"plan_{plan.id}")])
-            
-        keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="main_menu")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = keyboard_registry.get(("plans", catalog.version), lambda: InlineKeyboardMarkup(
+            [(InlineKeyboardButton(plan_text, callback_data=f"plan_{plan_id}"),) for plan_id, plan_text in self._plan_labels()]
+            + [self.back_button_row()]
+        ))
         await query.edit_message_text(message, parse_mode='Markdown', reply_markup=reply_markup)
 
     async def process_payment_plan(self, query, plan_id: str, marzban_username: str = None):
-        plan = next((p for p in PLANS if str(p.id) == str(plan_id)), None)
+        plan = catalog.get_plan(plan_id)
         if not plan:
             await query.edit_message_text(self.messages["payment"]["errors"]["invalid_plan"])
-            self.logger.error(f"План {plan_id} не найден. Доступные планы: {[p.id for p in PLANS]}")
+            self.logger.error(f"План {plan_id} не найден. Доступные планы: {[p.id for p in catalog.plans]}")
             return
 
         user_id = query.from_user.id
         if marzban_username:
-            accounts = self.db.get_users_by_telegram_id(user_id)
+            accounts = await self.db.get_users_by_telegram_id(user_id)
             user = next((u for u in accounts if u['marzban_username'] == marzban_username), None)
         else:
             user_state = self.get_user_state(user_id)
             active_account = user_state.get('active_account')
             if active_account:
-                accounts = self.db.get_users_by_telegram_id(user_id)
+                accounts = await self.db.get_users_by_telegram_id(user_id)
                 user = next((u for u in accounts if u['marzban_username'] == active_account), None)
             else:
                 user = await self.get_verified_user(user_id)
@@ -131,7 +124,7 @@ class PaymentHandlers(BaseHandler):
         method_formats = payment_details["methods"]
         
         methods_text = []
-        for method in PAYMENT_METHODS:
+        for method in catalog.payment_methods:
             if method.id == "card":
                 methods_text.append(method_formats["card"].format(details=method.details))
             elif method.id == "qiwi":
@@ -158,16 +151,26 @@ class PaymentHandlers(BaseHandler):
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(message, parse_mode='Markdown', reply_markup=reply_markup)
     
+    async def payment_claim_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, plan_id: str, username: str):
+        """Кнопка «Я оплатил»: заявка создается только для собственного аккаунта"""
+        query = update.callback_query
+        accounts = await self.db.get_users_by_telegram_id(query.from_user.id)
+        user = next((u for u in accounts if u['marzban_username'] == username), None)
+        if not user:
+            await query.edit_message_text(self.messages["payment"]["errors"]["user_not_found"])
+            return
+        await self.handle_payment_claim(query, plan_id, user, context)
+    
     async def handle_payment_claim(self, query, plan_id: str, user: dict, context: ContextTypes.DEFAULT_TYPE):
         """Обработка заявки об оплате"""
-        plan = next((p for p in PLANS if str(p.id) == str(plan_id)), None)
+        plan = catalog.get_plan(plan_id)
         if not plan:
-            self.logger.error(f"План {plan_id} не найден. Доступные планы: {[p.id for p in PLANS]}")
+            self.logger.error(f"План {plan_id} не найден. Доступные планы: {[p.id for p in catalog.plans]}")
             await query.edit_message_text("❌ Неверный план подписки.")
             return
         
         # Создаем заявку на оплату в базе данных
-        request_id = self.db.create_payment_request(
+        request_id = await self.db.create_payment_request(
             telegram_id=user['telegram_id'],
             marzban_username=user['marzban_username'],
             plan_id=str(plan.id),  # Преобразуем в строку для совместимости
@@ -252,7 +255,7 @@ class PaymentHandlers(BaseHandler):
             return
         
         # Сохраняем чек в базу данных
-        success = self.db.add_receipt_to_request(request_id, file_id, file_type)
+        success = await self.db.add_receipt_to_request(request_id, file_id, file_type)
         
         if not success:
             await update.message.reply_text("❌ Ошибка сохранения чека. Попробуйте еще раз.")
@@ -275,7 +278,7 @@ class PaymentHandlers(BaseHandler):
         self.clear_user_state(user_id)
         
         # Получаем информацию о плане
-        plan = next((p for p in PLANS if str(p.id) == str(plan_id)), None)
+        plan = catalog.get_plan(plan_id)
         plan_name = plan.name if plan else f"План #{plan_id}"
         plan_price = plan.price if plan else "N/A"
         plan_duration = plan.duration_days if plan else "N/A"
@@ -344,7 +347,7 @@ class PaymentHandlers(BaseHandler):
             await update.message.reply_text(
                 "Использование: `/confirm_payment username plan_id`\n\n"
                 "Пример: `/confirm_payment user123 1`\n\n"
-                f"Доступные планы: {', '.join(str(p.id) for p in PLANS)}",
+                f"Доступные планы: {', '.join(str(p.id) for p in catalog.plans)}",
                 parse_mode='Markdown'
             )
             return
@@ -352,26 +355,28 @@ class PaymentHandlers(BaseHandler):
         username = context.args[0]
         plan_id = context.args[1]
         
-        plan = next((p for p in PLANS if str(p.id) == str(plan_id)), None)
+        plan = catalog.get_plan(plan_id)
         if not plan:
             await update.message.reply_text(
                 f"❌ Неверный план подписки: {plan_id}\n\n"
-                f"Доступные планы: {', '.join(str(p.id) for p in PLANS)}"
+                f"Доступные планы: {', '.join(str(p.id) for p in catalog.plans)}"
             )
             return
         
         # Продлеваем подписку в Marzban
         if self.marzban.extend_user_subscription(username, plan.duration_days):
             # Получаем пользователя для записи платежа
-            user = self.db.get_user_by_marzban_username(username)
+            user = await self.db.get_user_by_marzban_username(username)
             
             if user:
                 # Записываем платеж в базу
-                self.db.record_payment(
+                await self.db.record_payment(
                     telegram_id=user['telegram_id'] or 0,
                     marzban_username=username,
                     amount=plan.price,
-                    payment_method=str(plan.id)
+                    # Способ оплаты (карта, QIWI) в сценарии не сохраняется
+                    payment_method='',
+                    plan_id=str(plan.id)
                 )
                 
                 # Уведомляем пользователя
@@ -423,69 +428,89 @@ class PaymentHandlers(BaseHandler):
             return
         
         comment = " ".join(context.args[1:]) if len(context.args) > 1 else "Одобрено администратором"
-        
-        # Получаем заявку
-        request = self.db.get_payment_request(request_id)
+        success, text = await self._approve_request(context, request_id, update.effective_user.id, comment)
+        await update.message.reply_text(
+            text,
+            parse_mode='Markdown' if success else None,
+            reply_markup=self._main_menu_markup() if success else None
+        )
+
+    async def approve_request_callback(self, query, context: ContextTypes.DEFAULT_TYPE, request_id: int):
+        """Одобрение заявки кнопкой из списка /pending"""
+        await query.answer()
+        success, text = await self._approve_request(context, request_id, query.from_user.id, "Одобрено администратором")
+        await query.message.reply_text(text, parse_mode='Markdown' if success else None)
+
+    async def _approve_request(self, context: ContextTypes.DEFAULT_TYPE, request_id: int,
+                               admin_id: int, comment: str) -> Tuple[bool, str]:
+        """Одобрение заявки: продление в Marzban, фиксация в БД и уведомление пользователя"""
+        request = await self.db.get_payment_request(request_id)
         if not request:
-            await update.message.reply_text(f"❌ Заявка #{request_id} не найдена.")
-            return
+            return False, f"❌ Заявка #{request_id} не найдена."
         
         if request['status'] != 'pending':
-            await update.message.reply_text(f"❌ Заявка #{request_id} уже обработана (статус: {request['status']}).")
-            return
+            return False, f"❌ Заявка #{request_id} уже обработана (статус: {request['status']})."
         
-        # Одобряем заявку
-        success = self.db.approve_payment_request(request_id, update.effective_user.id, comment)
-        if not success:
-            await update.message.reply_text(f"❌ Ошибка одобрения заявки #{request_id}.")
-            return
+        plan = catalog.get_plan(request['plan_id'])
+        if not plan:
+            return False, f"❌ План {request['plan_id']} для заявки #{request_id} не найден."
         
-        # Получаем план и продлеваем подписку в Marzban
-        plan = next((p for p in PLANS if str(p.id) == str(request['plan_id'])), None)
-        if plan and self.marzban.extend_user_subscription(request['marzban_username'], plan.duration_days):
-            # Записываем платеж в историю
-            self.db.record_payment(
-                telegram_id=request['telegram_id'],
-                marzban_username=request['marzban_username'],
-                amount=request['amount'],
-                payment_method=str(plan.id),
-                status='completed'
-            )
-            
-            # Уведомляем пользователя
-            try:
-                user_message = f"✅ **ОПЛАТА ПОДТВЕРДЖЕНА!**\n\n"
-                user_message += f"🆔 Заявка #{request_id}\n"
-                user_message += f"📋 План: {plan.name}\n"
-                user_message += f"💰 Сумма: {plan.price} руб.\n"
-                user_message += f"📅 Подписка продлена на {plan.duration_days} дней\n\n"
-                if comment != "Одобрено администратором":
-                    user_message += f"💬 Комментарий: {comment}\n\n"
-                user_message += f"🎉 Спасибо за оплату!"
-                
-                await context.bot.send_message(
-                    chat_id=request['telegram_id'],
-                    text=user_message,
-                    parse_mode='Markdown',
-                    reply_markup=self._main_menu_markup()
+        if request_id in self._requests_in_progress:
+            return False, f"⏳ Заявка #{request_id} уже обрабатывается."
+        
+        self._requests_in_progress.add(request_id)
+        try:
+            # Сначала продлеваем подписку в Marzban: при ошибке заявка остается в ожидании
+            if not self.marzban.extend_user_subscription(request['marzban_username'], plan.duration_days):
+                return False, (
+                    f"❌ Ошибка продления подписки для {request['marzban_username']}\n"
+                    f"Заявка #{request_id} осталась в ожидании, повторите /approve позже."
                 )
-            except Exception as e:
-                self.logger.error(f"Ошибка отправки уведомления пользователю {request['marzban_username']}: {e}")
             
-            await update.message.reply_text(
-                f"✅ **Заявка #{request_id} одобрена!**\n\n"
-                f"👤 Пользователь: `{request['marzban_username']}`\n"
-                f"📋 План: {plan.name}\n"
-                f"📅 Подписка продлена на {plan.duration_days} дней\n"
-                f"💰 Сумма: {plan.price} руб.",
+            # Одобрение заявки и запись платежа фиксируются одним commit
+            success = await self.db.complete_payment_request(
+                request_id,
+                admin_id,
+                payment_method='',  # способ оплаты в заявке не сохраняется
+                comment=comment
+            )
+        finally:
+            self._requests_in_progress.discard(request_id)
+        
+        if not success:
+            self.logger.error(f"Подписка {request['marzban_username']} продлена, но заявка #{request_id} не сохранена")
+            return False, (
+                f"❌ Ошибка одобрения заявки #{request_id}.\n"
+                f"Подписка {request['marzban_username']} продлена, но заявка и платеж не сохранены."
+            )
+        
+        # Уведомляем пользователя
+        try:
+            user_message = f"✅ **ОПЛАТА ПОДТВЕРДЖЕНА!**\n\n"
+            user_message += f"🆔 Заявка #{request_id}\n"
+            user_message += f"📋 План: {plan.name}\n"
+            user_message += f"💰 Сумма: {plan.price} руб.\n"
+            user_message += f"📅 Подписка продлена на {plan.duration_days} дней\n\n"
+            if comment != "Одобрено администратором":
+                user_message += f"💬 Комментарий: {comment}\n\n"
+            user_message += f"🎉 Спасибо за оплату!"
+            
+            await context.bot.send_message(
+                chat_id=request['telegram_id'],
+                text=user_message,
                 parse_mode='Markdown',
                 reply_markup=self._main_menu_markup()
             )
-        else:
-            await update.message.reply_text(
-                f"❌ Ошибка продления подписки для {request['marzban_username']}\n"
-                f"Заявка #{request_id} помечена как одобренная, но подписка не продлена."
-            )
+        except Exception as e:
+            self.logger.error(f"Ошибка отправки уведомления пользователю {request['marzban_username']}: {e}")
+        
+        return True, (
+            f"✅ **Заявка #{request_id} одобрена!**\n\n"
+            f"👤 Пользователь: `{request['marzban_username']}`\n"
+            f"📋 План: {plan.name}\n"
+            f"📅 Подписка продлена на {plan.duration_days} дней\n"
+            f"💰 Сумма: {plan.price} руб."
+        )
 
     async def reject_payment_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда отклонения платежа админом"""
@@ -507,25 +532,47 @@ class PaymentHandlers(BaseHandler):
             return
         
         reason = " ".join(context.args[1:])
-        
-        # Получаем заявку
-        request = self.db.get_payment_request(request_id)
+        success, text = await self._reject_request(context, request_id, update.effective_user.id, reason)
+        await update.message.reply_text(text, parse_mode='Markdown' if success else None)
+
+    async def reject_request_callback(self, query, request_id: int):
+        """Кнопка отклонения из списка /pending: запрашиваем причину следующим сообщением"""
+        await query.answer()
+        self.set_user_state(query.from_user.id, {
+            'state': 'waiting_reject_reason',
+            'request_id': request_id
+        })
+        await query.message.reply_text(f"✍️ Отправьте причину отклонения заявки #{request_id}:")
+
+    async def handle_reject_reason(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Получение причины отклонения после нажатия кнопки"""
+        admin_id = update.effective_user.id
+        state = self.get_user_state(admin_id)
+        self.clear_user_state(admin_id)
+        
+        success, text = await self._reject_request(context, state['request_id'], admin_id, update.message.text.strip())
+        await update.message.reply_text(text, parse_mode='Markdown' if success else None)
+
+    async def _reject_request(self, context: ContextTypes.DEFAULT_TYPE, request_id: int,
+                              admin_id: int, reason: str) -> Tuple[bool, str]:
+        """Отклонение заявки и уведомление пользователя"""
+        request = await self.db.get_payment_request(request_id)
         if not request:
-            await update.message.reply_text(f"❌ Заявка #{request_id} не найдена.")
-            return
+            return False, f"❌ Заявка #{request_id} не найдена."
         
         if request['status'] != 'pending':
-            await update.message.reply_text(f"❌ Заявка #{request_id} уже обработана.")
-            return
+            return False, f"❌ Заявка #{request_id} уже обработана."
+        
+        if request_id in self._requests_in_progress:
+            return False, f"⏳ Заявка #{request_id} уже обрабатывается."
         
         # Отклоняем заявку
-        success = self.db.reject_payment_request(request_id, update.effective_user.id, reason)
+        success = await self.db.reject_payment_request(request_id, admin_id, reason)
         if not success:
-            await update.message.reply_text(f"❌ Ошибка отклонения заявки #{request_id}.")
-            return
+            return False, f"❌ Ошибка отклонения заявки #{request_id}."
         
         # Получаем план для отображения в сообщении
-        plan = next((p for p in PLANS if str(p.id) == str(request['plan_id'])), None)
+        plan = catalog.get_plan(request['plan_id'])
         plan_name = plan.name if plan else f"План #{request['plan_id']}"
         
         # Уведомляем пользователя
@@ -545,11 +592,10 @@ class PaymentHandlers(BaseHandler):
         except Exception as e:
             self.logger.error(f"Ошибка отправки уведомления пользователю {request['marzban_username']}: {e}")
         
-        await update.message.reply_text(
+        return True, (
             f"❌ **Заявка #{request_id} отклонена**\n\n"
             f"👤 Пользователь: `{request['marzban_username']}`\n"
-            f"💬 Причина: {reason}",
-            parse_mode='Markdown'
+            f"💬 Причина: {reason}"
         )
     
     def _main_menu_markup(self):
@@ -1,5 +1,4 @@
 import re
-from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
@@ -17,6 +16,12 @@ class RegistrationHandlers(BaseHandler):
         import logging
         logging.getLogger(__name__).info(f"Loaded registration messages: {self.messages}")
     
+    def register_callbacks(self, router):
+        for pattern in ("create_account", "register_new"):
+            router.register(pattern, lambda update, context: self.start_registration_callback(update.callback_query, context))
+        for pattern in ("link_account", "link_existing"):
+            router.register(pattern, lambda update, context: self.link_existing_callback(update.callback_query))
+    
     def _get_user_id(self, update):
         is_callback = hasattr(update, 'callback_query') and update.callback_query is not None
         return update.callback_query.from_user.id if is_callback else update.effective_user.id
@@ -105,7 +110,7 @@ class RegistrationHandlers(BaseHandler):
             return
         
         # Создаем запись в базе данных бота
-        db_success = self.db.create_new_user_record(
+        db_success = await self.db.create_new_user_record(
             username=username,
             telegram_id=user_id,
             telegram_username=update.effective_user.username
@@ -135,12 +140,8 @@ class RegistrationHandlers(BaseHandler):
         
         # Уведомляем администраторов о новой регистрации
         if self.config.ADMIN_NOTIFICATIONS.get("new_user_registration", True):
-            admin_message = get_text("admin.ADMIN_NEW_USER_MESSAGE",
-                username=username,
-                telegram_username=update.effective_user.username or 'N/A',
-                user_id=user_id,
-                trial_days=trial_days,
-                now=datetime.now().strftime('%d.%m.%Y %H:%M')
+            admin_message = format_admin_notification(
+                username, user_id, update.effective_user.username, trial_days
             )
             
             for admin_id in self.config.ADMIN_IDS:
@@ -148,11 +149,11 @@ class RegistrationHandlers(BaseHandler):
                     await context.bot.send_message(
                         chat_id=admin_id,
                         text=admin_message,
-                        parse_mode='Markdown'
+                        parse_mode='HTML'
                     )
                 except Exception as e:
                     self.logger.error(
-                        get_text("admin.ADMIN_NOTIFICATION_ERROR",
+                        get_text("messages.errors.ADMIN_NOTIFICATION_ERROR",
                             admin_id=admin_id,
                             error=str(e)
                         )
@@ -12,6 +12,27 @@ class SubscriptionHandlers(BaseHandler):
         self.messages = get_json("handlers.subscription_messages")
         print("Loaded subscription messages:", self.messages)
     
+    def register_callbacks(self, router):
+        router.register("get_subscription_{username}", self.subscription_callback, answer=False)
+        router.register("test_sub_{username}", self.test_subscription_callback, admin_only=True, answer=False)
+    
+    async def subscription_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, username: str):
+        """Кнопка ссылки подписки: пользователь получает ссылку только своего аккаунта"""
+        query = update.callback_query
+        if not self.is_admin(query.from_user.id):
+            accounts = await self.db.get_users_by_telegram_id(query.from_user.id)
+            if not any(account['marzban_username'] == username for account in accounts):
+                await query.answer(self.messages["errors"]["account_not_linked"], show_alert=True)
+                return
+        await self.handle_subscription_callback(query, username)
+    
+    async def test_subscription_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, username: str):
+        """Кнопка тестирования ссылок подписки (для админов)"""
+        query = update.callback_query
+        await query.answer(self.messages["subscription"]["testing"].format(username=username))
+        test_results = self.marzban.test_subscription_url(username)
+        await query.message.reply_text(self._format_test_results(test_results))
+    
     async def get_user_subscription_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда получения ссылки подписки пользователя"""
         # Определяем, вызвано ли через callback или команду
@@ -106,8 +127,10 @@ class SubscriptionHandlers(BaseHandler):
         
         # Тестируем различные форматы ссылок
         test_results = self.marzban.test_subscription_url(username)
-        
-        # Форматируем результаты
+        await update.message.reply_text(self._format_test_results(test_results))
+
+    def _format_test_results(self, test_results: dict) -> str:
+        """Форматирование результатов тестирования ссылок подписки"""
         result_messages = self.messages["subscription"]["test_results"]
         message = result_messages["header"]
         
@@ -131,8 +154,7 @@ class SubscriptionHandlers(BaseHandler):
             working=working_count,
             total=total_count
         )
-        
-        await update.message.reply_text(message)
+        return message
 
     async def _send_subscription_info(self, message, username: str, user_id: int):
         """Отправка информации о подписке"""
@@ -16,6 +16,13 @@ class UserHandlers(BaseHandler):
         self.menu_messages = self.messages["menu"]
         self.status_messages = self.messages["status"]
 
+    def register_callbacks(self, router):
+        router.register("main_menu", lambda update, context: self.main_menu_callback(update.callback_query, update.effective_user.id))
+        router.register("status", self.status_command)
+        router.register("support", lambda update, context: self.support_callback(update.callback_query, context))
+        router.register("help", lambda update, context: self.help_callback(update.callback_query))
+        router.register("download_app", lambda update, context: self.download_app_callback(update.callback_query))
+
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда /start"""
         telegram_id = update.effective_user.id
@@ -29,6 +36,7 @@ class UserHandlers(BaseHandler):
         user = await self.get_verified_user(telegram_id)
         
         if user:
+            await self.db.touch_last_seen(telegram_id)
             inline_keyboard = self.create_main_menu_keyboard(user)
             reply_keyboard = self.create_reply_keyboard(user, self.is_admin(telegram_id))
             message = format_welcome_message(first_name, user)
@@ -44,7 +52,7 @@ class UserHandlers(BaseHandler):
         user_state = self.get_user_state(telegram_id)
         active_account = user_state.get('active_account')
         
-        accounts = self.db.get_users_by_telegram_id(telegram_id)
+        accounts = await self.db.get_users_by_telegram_id(telegram_id)
         if not accounts:
             message_obj = update.callback_query.message if update.callback_query else update.message
             await self._show_account_not_found(message_obj)
@@ -79,15 +87,19 @@ class UserHandlers(BaseHandler):
     
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда /help"""
-        is_admin_user = self.is_admin(update.effective_user.id)
+        await update.message.reply_text(self._help_text(update.effective_user.id), parse_mode='Markdown')
 
-        if is_admin_user:
-            text = get_text("admin.commands")
-        else:
-            text = "Этот бот поможет вам управлять вашей VPN подпиской.\n\n"
-            text += "Используйте кнопки меню для проверки статуса, управления подпиской и оплаты."
-        
-        await update.message.reply_text(text, parse_mode='Markdown')
+    async def help_callback(self, query):
+        """Кнопка «Помощь» в inline меню"""
+        reply_markup = self.back_keyboard()
+        await query.edit_message_text(self._help_text(query.from_user.id), parse_mode='Markdown', reply_markup=reply_markup)
+
+    def _help_text(self, user_id: int) -> str:
+        if self.is_admin(user_id):
+            return get_text("admin.commands")
+        text = "Этот бот поможет вам управлять вашей VPN подпиской.\n\n"
+        text += "Используйте кнопки меню для проверки статуса, управления подпиской и оплаты."
+        return text
 
     async def _handle_invitation_link(self, update: Update, invite_code: str, telegram_id: int, telegram_username: str):
         """Обработка ссылки приглашения"""
@@ -98,7 +110,7 @@ class UserHandlers(BaseHandler):
         
         marzban_username = "_".join(parts[1:-1])
         
-        if self.db.link_telegram_account(marzban_username, telegram_id, telegram_username):
+        if await self.db.link_telegram_account(marzban_username, telegram_id, telegram_username):
             self.marzban.sync_telegram_id_to_marzban_notes(marzban_username, telegram_id, telegram_username)
             await update.message.reply_text(get_text("messages.ACCOUNT_LINKED"))
             await self.start_command(update, ContextTypes.DEFAULT_TYPE)
@@ -150,7 +162,7 @@ class UserHandlers(BaseHandler):
     async def download_app_callback(self, query_or_update: Update):
         """Обработчик для кнопки 'Скачать приложение'"""
         text = get_text("user.apps.INFO_MESSAGE", default="Информация о приложениях.")
-        keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Назад", callback_data="main_menu")]])
+        keyboard = self.back_keyboard()
         
         target_message = query_or_update.message if isinstance(query_or_update, Update) else query_or_update.message
         
@@ -161,7 +173,7 @@ class UserHandlers(BaseHandler):
 
     async def support_callback(self, query, context=None):
         """Обработка колбэка поддержки"""
-        reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Назад", callback_data="main_menu")]])
+        reply_markup = self.back_keyboard()
         await query.edit_message_text(get_json("handlers.user_messages")["support_info"], reply_markup=reply_markup)
 
     async def _show_account_not_found(self, message: Update.message):
@@ -0,0 +1,31 @@
+import logging
+from typing import Any, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+class KeyboardRegistry:
+    """Кэш клавиатур со статической раскладкой
+
+    Объекты python-telegram-bot (кнопки и разметка) неизменяемы после создания,
+    поэтому один экземпляр можно отправлять в ответ сколько угодно раз. Каждая
+    раскладка строится при первом запросе по ключу (роль, статус пользователя и т.п.),
+    на каждый ответ собираются только динамические кнопки.
+    """
+
+    def __init__(self):
+        self._cache: Dict[Hashable, Any] = {}
+
+    def get(self, key: Hashable, builder: Callable[[], Any]) -> Any:
+        """Клавиатура (или набор кнопок) по ключу; builder вызывается только при первом запросе"""
+        markup = self._cache.get(key)
+        if markup is None:
+            markup = self._cache[key] = builder()
+        return markup
+
+    def clear(self):
+        """Сброс кэша (например, после изменения тарифов)"""
+        logger.info(f"Кэш клавиатур сброшен: {len(self._cache)} раскладок")
+        self._cache.clear()
+
+# Общий реестр для всех обработчиков
+keyboard_registry = KeyboardRegistry()
@@ -17,16 +17,19 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters
+from telegram.request import BaseRequest
 
 # Импортируем наши модули
 from database_manager import DatabaseManager
+from db_profiler import QueryStats
+from async_database_manager import AsyncDatabaseManager
 from marzban_api import MarzbanAPI
 from bot_coordinator import BotCoordinator
 from config import get_config
-from plans import PLANS
-from payment_methods import PAYMENT_METHODS
-from messages import MESSAGES
-from enums import UserStatus, PaymentMethod, UserRole
+from catalog import catalog
+from monitoring import MetricsServer, call_flow, instrument_application, latency, metrics
+from monitoring.profiler import profiler
+from monitoring.telegram_request import TracingRequest
 from texts import get_text
 
 # Получаем конфигурацию
@@ -72,16 +75,22 @@ class PaymentBot:
     """Класс главного бота с модульной архитектурой"""
     config: object
     db_manager: Optional[DatabaseManager]
+    async_db: Optional[AsyncDatabaseManager]
     marzban_api: Optional[MarzbanAPI]
     coordinator: Optional[BotCoordinator]
     application: Optional[Application]
     
-    def __init__(self) -> None:
+    def __init__(self, request: Optional[BaseRequest] = None) -> None:
+        # request — транспорт Bot API вместо HTTP (нагрузочный стенд benchmarks/load_generator.py)
+        self.request = request
         self.config = config
         self.db_manager = None
+        self.async_db = None
         self.marzban_api = None
         self.coordinator = None
         self.application = None
+        self._background_tasks = []
+        self.metrics_server = None
         
     async def initialize(self):
         """Инициализация компонентов бота"""
@@ -94,9 +103,23 @@ class PaymentBot:
             logger.error("❌ Конфигурация содержит ошибки")
             return False
         
+        # Тарифы читаются при первом обращении; ошибку в файлах показываем при запуске, а не на первом /buy
+        try:
+            plans = catalog.plans
+            logger.info(f"✅ Тарифы загружены: {len(plans)} тарифов, {len(catalog.payment_methods)} способов оплаты")
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logger.error(f"❌ Ошибка загрузки тарифов и способов оплаты: {e}")
+            return False
+        
         # Инициализируем базу данных
         try:
-            self.db_manager = DatabaseManager(self.config.DATABASE_PATH)
+            self.db_manager = DatabaseManager(
+                self.config.DATABASE_PATH,
+                mapping_cache_size=self.config.CACHE['mapping_max_entries'],
+                archive_path=self.config.ARCHIVE['path'] if self.config.ARCHIVE['enabled'] else None,
+                query_stats=QueryStats(self.config.DATABASE_PROFILING['slow_query_threshold'])
+                if self.config.DATABASE_PROFILING['enabled'] else None
+            )
             logger.info("✅ База данных инициализирована")
         except Exception as e:
             logger.error(f"❌ Ошибка инициализации базы данных: {e}")
@@ -107,7 +130,9 @@ class PaymentBot:
             self.marzban_api = MarzbanAPI(
                 self.config.MARZBAN_URL,
                 self.config.MARZBAN_USERNAME, 
-                self.config.MARZBAN_PASSWORD
+                self.config.MARZBAN_PASSWORD,
+                connect_retries=self.config.MARZBAN_CLIENT['connect_retries'],
+                slow_call_threshold=self.config.MARZBAN_CLIENT['slow_call_threshold']
             )
             
             # Проверяем подключение
@@ -121,16 +146,30 @@ class PaymentBot:
             return False
         
         # Автоматический импорт пользователей если база пуста
-        await self._auto_import_users()
+        with call_flow("синхронизация пользователей"):
+            await self._auto_import_users()
+        
+        # Заполняем кеш связей Telegram ↔ Marzban
+        self.db_manager.warm_mapping_cache()
+        
+        # Все обращения обработчиков к SQLite идут через выделенный поток БД
+        self.async_db = AsyncDatabaseManager(self.db_manager)
         
         # Инициализируем координатор обработчиков
-        self.coordinator = BotCoordinator(self.db_manager, self.marzban_api)
+        self.coordinator = BotCoordinator(self.async_db, self.marzban_api)
         
-        # Создаем приложение Telegram
-        self.application = Application.builder().token(self.config.TELEGRAM_TOKEN).build()
+        # Создаем приложение Telegram; запросы обработчиков к Bot API попадают в трейсы
+        # (размер пула как у клиента по умолчанию)
+        self.application = (
+            Application.builder()
+            .token(self.config.TELEGRAM_TOKEN)
+            .request(self.request or TracingRequest(connection_pool_size=256))
+            .build()
+        )
         
         # Регистрируем обработчики команд
         self._register_handlers()
+        self._register_metrics()
         
         logger.info("✅ Бот инициализирован успешно")
         return True
@@ -196,9 +235,6 @@ class PaymentBot:
         self.application.add_handler(CommandHandler("subscription", self.coordinator.subscription_command))
         self.application.add_handler(CommandHandler("sub", self.coordinator.subscription_command))  # Короткий алиас
         self.application.add_handler(CommandHandler("test_subscription", self.coordinator.test_subscription_command))
-        self.application.add_handler(CommandHandler("diagnose_subscription", self.coordinator.diagnose_subscription_command))
-        self.application.add_handler(CommandHandler("fix_subscription", self.coordinator.fix_subscription_command))
-        self.application.add_handler(CommandHandler("quick_fix", self.coordinator.quick_fix_command))
         
         # Административные команды
         self.application.add_handler(CommandHandler("admin_links", self.coordinator.admin_links_command))
@@ -207,6 +243,15 @@ class PaymentBot:
         self.application.add_handler(CommandHandler("pending", self.coordinator.pending_payments_command))
         self.application.add_handler(CommandHandler("new_users", self.coordinator.new_users_command))
         self.application.add_handler(CommandHandler("delete_user", self.coordinator.delete_user_command))
+        self.application.add_handler(CommandHandler("export", self.coordinator.export_command))
+        self.application.add_handler(CommandHandler("analytics", self.coordinator.analytics_command))
+        self.application.add_handler(CommandHandler("backup", self.coordinator.backup_command))
+        self.application.add_handler(CommandHandler("find", self.coordinator.find_command))
+        self.application.add_handler(CommandHandler("reload_plans", self.coordinator.reload_plans_command))
+        self.application.add_handler(CommandHandler("perf", self.coordinator.perf_command))
+        self.application.add_handler(CommandHandler("db_stats", self.coordinator.db_stats_command))
+        self.application.add_handler(CommandHandler("profile", self.coordinator.profile_command))
+        self.application.add_handler(CommandHandler("memory", self.coordinator.memory_command))
         
         # Команды обработки платежей
         self.application.add_handler(CommandHandler("confirm_payment", self.coordinator.confirm_payment_command))
@@ -223,6 +268,9 @@ class PaymentBot:
         # Обработчик кнопок
         self.application.add_handler(CallbackQueryHandler(self.coordinator.button_callback))
         
+        # Замер задержек всех обработчиков (/perf)
+        instrument_application(self.application, latency)
+        
         # Обработчик ошибок
         self.application.add_error_handler(self.coordinator.error_handler)
     
@@ -257,6 +305,16 @@ class PaymentBot:
                     drop_pending_updates=True
                 )
                 
+                self._start_background_tasks()
+                if self.config.MONITORING['metrics_enabled']:
+                    self.metrics_server = MetricsServer(
+                        metrics,
+                        self.config.MONITORING['metrics_host'],
+                        self.config.MONITORING['metrics_port']
+                    )
+                    await self.metrics_server.start()
+                self._install_profiling_signals()
+                
                 logger.info("✅ Бот успешно запущен и ожидает сообщения...")
                 
                 # Ждем до получения сигнала остановки
@@ -273,6 +331,9 @@ class PaymentBot:
             traceback.print_exc()
         finally:
             logger.info("🔄 Остановка бота...")
+            await self._stop_background_tasks()
+            if self.metrics_server:
+                await self.metrics_server.stop()
             try:
                 if hasattr(self.application, 'updater') and self.application.updater.running:
                     await self.application.updater.stop()
@@ -280,6 +341,124 @@ class PaymentBot:
                     await self.application.stop()
             except Exception as e:
                 logger.error(f"Ошибка при остановке: {e}")
+            if self.async_db:
+                self.async_db.close()
+    
+    def _register_metrics(self):
+        """Показатели, которые считываются из объектов бота при запросе /metrics"""
+        metrics.gauge("bot_db_queue_depth", "Database calls waiting or running in the database thread.",
+                      lambda: self.async_db.queue_depth)
+        metrics.gauge("bot_update_queue_depth", "Telegram updates waiting to be processed.",
+                      lambda: self.application.update_queue.qsize())
+
+        def mapping_cache_metrics():
+            stats = self.db_manager.mapping_cache.stats()
+            yield "bot_mapping_cache_hits", "counter", "Mapping cache hits.", [("_total", {}, stats['hits'])]
+            yield "bot_mapping_cache_misses", "counter", "Mapping cache misses.", [("_total", {}, stats['misses'])]
+            yield "bot_mapping_cache_evictions", "counter", "Mapping cache evictions.", [("_total", {}, stats['evictions'])]
+            yield "bot_mapping_cache_entries", "gauge", "Telegram users in the mapping cache.", [("", {}, stats['entries'])]
+            yield "bot_mapping_cache_hit_ratio", "gauge", "Mapping cache hit ratio since start.", [("", {}, stats['hit_ratio'])]
+        metrics.collector(mapping_cache_metrics)
+
+        if self.db_manager.query_stats is not None:
+            def query_metrics():
+                totals = self.db_manager.query_stats.totals()
+                yield "bot_db_statements", "counter", "SQL statements executed.", [("_total", {}, totals['statements'])]
+                yield "bot_db_statement_seconds", "counter", "Time spent executing SQL and reading rows.", [("_total", {}, totals['seconds'])]
+                yield "bot_db_slow_statements", "counter", "SQL statements over the slow query threshold.", [("_total", {}, totals['slow'])]
+            metrics.collector(query_metrics)
+    
+    def _start_background_tasks(self):
+        """Запуск периодических фоновых задач"""
+        # Сверка читает базу и пишет в кеш, поэтому идет в потоке БД вместе с записями обработчиков:
+        # иначе запись между чтением и сравнением вернула бы в кеш устаревшие данные
+        self._background_tasks.append(asyncio.create_task(self._run_periodic(
+            "сверка кеша связей",
+            self.config.CACHE['mapping_verify_interval'],
+            self.db_manager.verify_mapping_cache,
+            self.config.CACHE['mapping_verify_sample'],
+            db_thread=True
+        )))
+        if self.config.ARCHIVE['enabled']:
+            self._background_tasks.append(asyncio.create_task(self._run_periodic(
+                "архивация платежей",
+                self.config.ARCHIVE['interval'],
+                self.db_manager.archive_old_payments,
+                self.config.ARCHIVE['horizon_days'],
+                self.config.ARCHIVE['batch_size']
+            )))
+        if self.config.BACKUP['enabled']:
+            self._background_tasks.append(asyncio.create_task(self._run_periodic(
+                "резервное копирование",
+                self.config.BACKUP['interval'],
+                self.coordinator.admin_handlers.backup_manager.create_backup
+            )))
+        if self.config.CATALOG['reload_interval'] > 0:
+            self._background_tasks.append(asyncio.create_task(self._run_periodic(
+                "проверка файлов тарифов",
+                self.config.CATALOG['reload_interval'],
+                catalog.reload_if_changed
+            )))
+    
+    def _install_profiling_signals(self):
+        """SIGUSR1 — профиль event loop, SIGUSR2 — снимок памяти (как /profile и /memory, результат в лог)"""
+        if not hasattr(signal, 'SIGUSR1'):
+            return  # Windows
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGUSR1, lambda: self._background_tasks.append(
+            asyncio.create_task(self._profile_on_signal())))
+        loop.add_signal_handler(signal.SIGUSR2, lambda: self._background_tasks.append(
+            asyncio.create_task(self._memory_on_signal())))
+    
+    async def _profile_on_signal(self):
+        logger = logging.getLogger(__name__)
+        monitoring = self.config.MONITORING
+        if profiler.busy:
+            logger.warning("SIGUSR1: профилирование уже идет")
+            return
+        try:
+            path, rows = await profiler.profile(monitoring['profile_default_seconds'], 'tottime', monitoring['profile_top'])
+        except OSError as e:
+            logger.error(f"SIGUSR1: не удалось сохранить профиль: {e}")
+            return
+        logger.info(f"SIGUSR1: профиль {path}, самые затратные функции:")
+        for row in rows:
+            logger.info(f"  {row['ncalls']:>8} вызовов {row['tottime'] * 1000:>9.1f} мс своих "
+                        f"{row['cumtime'] * 1000:>9.1f} мс всего  {row['function']}")
+    
+    async def _memory_on_signal(self):
+        logger = logging.getLogger(__name__)
+        report = await asyncio.to_thread(profiler.memory_snapshot, self.config.MONITORING['memory_top'])
+        if report is None:
+            logger.info("SIGUSR2: tracemalloc включен, рост памяти покажет следующий сигнал")
+            return
+        logger.info(f"SIGUSR2: снимок {report['path']}, сейчас {report['current'] / 1048576:.1f} МБ, "
+                    f"пик {report['peak'] / 1048576:.1f} МБ, рост с предыдущего снимка:")
+        for row in report['top']:
+            logger.info(f"  {row['size_diff'] / 1024:>+9.1f} КБ ({row['count_diff']:+} блоков)  {row['location']}")
+    
+    async def _stop_background_tasks(self):
+        """Остановка фоновых задач"""
+        for task in self._background_tasks:
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        self._background_tasks.clear()
+    
+    async def _run_periodic(self, name: str, interval: float, func, *args, db_thread: bool = False):
+        """Периодический запуск синхронной функции в отдельном потоке (db_thread=True — в потоке БД)"""
+        logger = logging.getLogger(__name__)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # to_thread копирует контекст, вызовы Marzban из потока попадают в учет задачи
+                with call_flow(name):
+                    if db_thread:
+                        result = await self.async_db.run(func, *args)
+                    else:
+                        result = await asyncio.to_thread(func, *args)
+                logger.debug(f"Фоновая задача '{name}' выполнена: {result}")
+            except Exception as e:
+                logger.error(f"Ошибка фоновой задачи '{name}': {e}")
     
     async def shutdown(self):
         """Корректное завершение работы"""
@@ -292,7 +471,7 @@ def print_banner():
 
 def signal_handler(signum, frame):
     """Обработчик сигналов для корректной остановки"""
-    print(get_text("messages/BOT_STOPPED", signum=signum))
+    print(get_text("messages.BOT_STOPPED", signum=signum))
     shutdown_event.set()
 
 async def main():
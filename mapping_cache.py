@@ -0,0 +1,101 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, List
+
+from db_records import UserMapping
+
+class UserMappingCache:
+    """In-process кеш связей telegram_id → аккаунты и marzban_username → telegram_id
+
+    Хранит неизменяемые записи UserMapping, поэтому отдает их без копирования.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._by_telegram_id: "OrderedDict[int, List[UserMapping]]" = OrderedDict()
+        self._by_username: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_accounts(self, telegram_id: int) -> Optional[List[UserMapping]]:
+        """Аккаунты пользователя из кеша (None — промах, [] — известно, что аккаунтов нет)"""
+        with self._lock:
+            accounts = self._by_telegram_id.get(telegram_id)
+            if accounts is None:
+                self.misses += 1
+                return None
+            self._by_telegram_id.move_to_end(telegram_id)
+            self.hits += 1
+            return list(accounts)
+
+    def set_accounts(self, telegram_id: int, accounts: List[UserMapping]):
+        """Запись (или замена) аккаунтов пользователя"""
+        with self._lock:
+            self._drop(telegram_id)
+            self._by_telegram_id[telegram_id] = list(accounts)
+            for account in accounts:
+                self._by_username[account['marzban_username']] = telegram_id
+            while len(self._by_telegram_id) > self.max_entries:
+                evicted_id, evicted = self._by_telegram_id.popitem(last=False)
+                self._forget_usernames(evicted_id, evicted)
+                self.evictions += 1
+
+    def get_telegram_id(self, marzban_username: str) -> Optional[int]:
+        """Telegram ID, к которому привязан аккаунт (если связь закеширована)"""
+        with self._lock:
+            return self._by_username.get(marzban_username)
+
+    def invalidate_telegram_id(self, telegram_id: int):
+        """Удаление записи пользователя из кеша"""
+        with self._lock:
+            self._drop(telegram_id)
+
+    def invalidate_username(self, marzban_username: str):
+        """Удаление из кеша записи, содержащей указанный аккаунт"""
+        with self._lock:
+            telegram_id = self._by_username.get(marzban_username)
+            if telegram_id is not None:
+                self._drop(telegram_id)
+
+    def cached_telegram_ids(self) -> List[int]:
+        """Список закешированных Telegram ID"""
+        with self._lock:
+            return list(self._by_telegram_id.keys())
+
+    def peek_accounts(self, telegram_id: int) -> Optional[List[UserMapping]]:
+        """Чтение без учета в статистике и без изменения порядка вытеснения"""
+        with self._lock:
+            accounts = self._by_telegram_id.get(telegram_id)
+            return None if accounts is None else list(accounts)
+
+    def clear(self):
+        """Полная очистка кеша"""
+        with self._lock:
+            self._by_telegram_id.clear()
+            self._by_username.clear()
+
+    def stats(self) -> Dict:
+        """Статистика кеша"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._by_telegram_id),
+                'usernames': len(self._by_username),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / total if total else 0.0
+            }
+
+    def _drop(self, telegram_id: int):
+        accounts = self._by_telegram_id.pop(telegram_id, None)
+        if accounts is not None:
+            self._forget_usernames(telegram_id, accounts)
+
+    def _forget_usernames(self, telegram_id: int, accounts: List[UserMapping]):
+        for account in accounts:
+            if self._by_username.get(account['marzban_username']) == telegram_id:
+                del self._by_username[account['marzban_username']]
@@ -1,26 +1,55 @@
 import requests
 import logging
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List, Any, Tuple
 from enums import UserStatus
-from text_constants import SUBSCRIPTION_FORMATS, API_PROVIDED_DESCRIPTION, NO_VPN_CONFIG_ERROR, API_PROVIDED_SOURCE
+import text_constants
+from monitoring.calls import record_call
+from monitoring.metrics import metrics
+from monitoring.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+MARZBAN_REQUESTS = metrics.counter(
+    "marzban_requests", "Marzban HTTP requests by endpoint and response status.", ("method", "endpoint", "status")
+)
+MARZBAN_REQUEST_DURATION = metrics.histogram(
+    "marzban_request_duration_seconds", "Marzban HTTP request latency in seconds.", ("method", "endpoint")
+)
+MARZBAN_TOKEN_REFRESHES = metrics.counter(
+    "marzban_token_refreshes", "Marzban admin token requests by result.", ("result",)
+)
+
 class MarzbanAPI:
-    def __init__(self, base_url: str, username: str, password: str):
+    def __init__(self, base_url: str, username: str, password: str,
+                 connect_retries: int = 1, slow_call_threshold: float = 1.0):
         self.base_url: str = base_url.rstrip('/')
         self.username: str = username
         self.password: str = password
         self.token: Optional[str] = None
         self.token_expires: Optional[datetime] = None
         self._cached_subscription_format: Optional[str] = None  # Кешируем рабочий формат
+        self.slow_call_threshold = slow_call_threshold
+        
+        # Общая сессия держит keep-alive соединения; повторяются только ошибки соединения,
+        # когда запрос еще не дошел до Marzban (read=0), поэтому POST/PUT не выполнятся дважды
+        self.session = requests.Session()
+        adapter = HTTPAdapter(max_retries=Retry(
+            total=connect_retries, connect=connect_retries, read=0, status=0, other=0,
+            allowed_methods=None, raise_on_status=False
+        ))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
     
     def authenticate(self) -> bool:
         """Аутентификация и получение токена"""
         try:
             # Используем правильный эндпоинт для авторизации
-            response = requests.post(
+            response = self._request(
+                "POST", "/api/admin/token",
                 f"{self.base_url}/api/admin/token",
                 data={"username": self.username, "password": self.password},
                 timeout=30
@@ -31,13 +60,42 @@ class MarzbanAPI:
             self.token = token_data['access_token']
             self.token_expires = datetime.now() + timedelta(minutes=25)
             
+            MARZBAN_TOKEN_REFRESHES.labels("success").inc()
             logger.info("Успешная аутентификация в Marzban")
             return True
             
         except requests.exceptions.RequestException as e:
+            MARZBAN_TOKEN_REFRESHES.labels("error").inc()
             logger.error(f"Ошибка аутентификации Marzban: {e}")
             return False
     
+    def _request(self, method: str, endpoint: str, url: str, **kwargs) -> requests.Response:
+        """HTTP-запрос к Marzban с учетом в метриках и в потоке вызовов операции
+
+        endpoint — шаблон пути без логина пользователя (например, "/api/user/{username}"),
+        чтобы число временных рядов не зависело от числа пользователей.
+        """
+        status, size, retries = "error", 0, 0
+        started = time.perf_counter()
+        span = tracer.span(f"marzban {method} {endpoint}")
+        try:
+            with span:
+                response = self.session.request(method, url, **kwargs)
+                status = str(response.status_code)
+                size = len(response.content)
+                retry_state = getattr(response.raw, 'retries', None)
+                retries = len(retry_state.history) if retry_state else 0
+                span.set(status=status, bytes=size, retries=retries)
+            return response
+        except requests.exceptions.ConnectionError:
+            retries = self.session.get_adapter(url).max_retries.connect or 0
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            MARZBAN_REQUEST_DURATION.labels(method, endpoint).observe(duration)
+            MARZBAN_REQUESTS.labels(method, endpoint, status).inc()
+            record_call(method, endpoint, status, duration, size, retries, self.slow_call_threshold)
+    
     def get_user_subscription_url(self, username: str) -> Optional[str]:
         """Получение ссылки подписки пользователя через API"""
         if not self._ensure_authenticated():
@@ -45,7 +103,8 @@ class MarzbanAPI:
         
         try:
             # Используем правильный эндпоинт для получения данных пользователя
-            response = requests.get(
+            response = self._request(
+                "GET", "/api/user/{username}",
                 f"{self.base_url}/api/user/{username}",
                 headers=self.get_headers(),
                 timeout=30
@@ -89,7 +148,7 @@ class MarzbanAPI:
     def _test_url(self, url: str) -> bool:
         """Быстрая проверка работоспособности URL"""
         try:
-            response = requests.head(url, timeout=5)
+            response = self._request("HEAD", "subscription", url, timeout=5)
             return response.status_code == 200
         except:
             return False
@@ -97,7 +156,7 @@ class MarzbanAPI:
     def get_subscription_formats(self, username: str) -> List[Dict[str, str]]:
         """Получение всех возможных форматов ссылок подписки"""
         formats = []
-        for fmt in SUBSCRIPTION_FORMATS:
+        for fmt in text_constants.SUBSCRIPTION_FORMATS:
             formats.append({
                 "name": fmt["name"],
                 "url": fmt["url"].format(base_url=self.base_url, username=username, token=self.token),
@@ -119,8 +178,8 @@ class MarzbanAPI:
                 "url": api_subscription_url,
                 "status_code": 200,
                 "works": True,
-                "source": API_PROVIDED_SOURCE,
-                "description": API_PROVIDED_DESCRIPTION
+                "source": text_constants.API_PROVIDED_SOURCE,
+                "description": text_constants.API_PROVIDED_DESCRIPTION
             }
             logger.info(f"✅ API предоставил ссылку: {api_subscription_url}")
         
@@ -131,11 +190,11 @@ class MarzbanAPI:
             
             try:
                 # Тестируем HEAD запрос
-                response = requests.head(url, timeout=10, allow_redirects=True)
+                response = self._request("HEAD", "subscription", url, timeout=10, allow_redirects=True)
                 
                 if response.status_code == 200:
                     # Дополнительно проверяем GET запрос для подтверждения
-                    get_response = requests.get(url, timeout=10, allow_redirects=True)
+                    get_response = self._request("GET", "subscription", url, timeout=10, allow_redirects=True)
                     
                     # Проверяем, что ответ содержит конфигурацию VPN
                     content = get_response.text.lower()
@@ -159,7 +218,7 @@ class MarzbanAPI:
                             "url": url,
                             "status_code": response.status_code,
                             "works": False,
-                            "error": NO_VPN_CONFIG_ERROR,
+                            "error": text_constants.NO_VPN_CONFIG_ERROR,
                             "description": format_info["description"]
                         }
                 else:
@@ -246,7 +305,7 @@ class MarzbanAPI:
     def verify_subscription_url(self, url: str) -> Dict[str, Any]:
         """Детальная проверка ссылки подписки"""
         try:
-            response = requests.get(url, timeout=10)
+            response = self._request("GET", "subscription", url, timeout=10)
             
             if response.status_code != 200:
                 return {
@@ -276,7 +335,7 @@ class MarzbanAPI:
             if not found_protocols:
                 return {
                     "valid": False,
-                    "error": NO_VPN_CONFIG_ERROR,
+                    "error": text_constants.NO_VPN_CONFIG_ERROR,
                     "content_preview": content[:200] if content else "Пустой ответ",
                     "content_length": len(content)
                 }
@@ -330,7 +389,8 @@ class MarzbanAPI:
                 expire_date = datetime.now() + timedelta(days=trial_days)
                 user_data["expire"] = int(expire_date.timestamp())
             logger.info(f"Создание пользователя {username} с настройками: {user_data}")
-            response = requests.post(
+            response = self._request(
+                "POST", "/api/user",
                 f"{self.base_url}/api/user",
                 headers=self.get_headers(),
                 json=user_data,
@@ -339,7 +399,6 @@ class MarzbanAPI:
             if response.status_code == 200:
                 logger.info(f"Пользователь {username} создан успешно")
                 self._cached_subscription_format = None
-                import time
                 for attempt in range(3):
                     user_info = self.get_user(username)
                     if user_info:
@@ -384,7 +443,8 @@ class MarzbanAPI:
             
             logger.info(f"Обновление примечания для {username}: {new_note}")
             
-            response = requests.patch(
+            response = self._request(
+                "PATCH", "/api/user/{username}",
                 f"{self.base_url}/api/user/{username}",
                 headers=self.get_headers(),
                 json=update_data,
@@ -406,7 +466,8 @@ class MarzbanAPI:
                 if 'data_limit' in current_user:
                     full_update_data['data_limit'] = current_user['data_limit']
                 
-                response = requests.put(
+                response = self._request(
+                    "PUT", "/api/user/{username}",
                     f"{self.base_url}/api/user/{username}",
                     headers=self.get_headers(),
                     json=full_update_data,
@@ -455,7 +516,8 @@ class MarzbanAPI:
             return None
         
         try:
-            response = requests.get(
+            response = self._request(
+                "GET", "/api/users",
                 f"{self.base_url}/api/users",
                 headers=self.get_headers(),
                 params={'offset': offset, 'limit': limit},
@@ -476,7 +538,8 @@ class MarzbanAPI:
             return None
         
         try:
-            response = requests.get(
+            response = self._request(
+                "GET", "/api/user/{username}",
                 f"{self.base_url}/api/user/{username}",
                 headers=self.get_headers(),
                 timeout=30
@@ -569,7 +632,8 @@ class MarzbanAPI:
             
             logger.debug(f"Обновление пользователя {username} с данными: {update_data}")
             
-            response = requests.put(
+            response = self._request(
+                "PUT", "/api/user/{username}",
                 f"{self.base_url}/api/user/{username}",
                 headers=self.get_headers(),
                 json=update_data,
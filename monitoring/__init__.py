@@ -0,0 +1,14 @@
+from .calls import call_flow
+from .http_server import MetricsServer
+from .latency import LatencyRecorder, instrument_application, latency
+from .metrics import MetricsRegistry, metrics
+
+__all__ = [
+    'LatencyRecorder',
+    'MetricsRegistry',
+    'MetricsServer',
+    'call_flow',
+    'instrument_application',
+    'latency',
+    'metrics',
+]
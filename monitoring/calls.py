@@ -0,0 +1,93 @@
+import contextvars
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+FLOW_CALLS = metrics.histogram(
+    "marzban_flow_calls", "Marzban requests made while handling one bot operation.", ("flow",),
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24)
+)
+FLOW_DURATION = metrics.histogram(
+    "marzban_flow_duration_seconds", "Total Marzban request time within one bot operation.", ("flow",)
+)
+REQUEST_RETRIES = metrics.counter(
+    "marzban_request_retries", "Connection retries of Marzban requests.", ("method", "endpoint")
+)
+RESPONSE_BYTES = metrics.counter(
+    "marzban_response_bytes", "Bytes received from Marzban.", ("method", "endpoint")
+)
+
+class CallFlow:
+    """Вызовы Marzban в рамках одной операции бота (команда, кнопка, фоновая задача)"""
+    __slots__ = ('name', 'calls', 'duration', 'bytes', 'retries', 'endpoints')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.duration = 0.0
+        self.bytes = 0
+        self.retries = 0
+        self.endpoints = Counter()
+
+    def summary(self) -> str:
+        endpoints = ", ".join(f"{endpoint} ×{count}" for endpoint, count in self.endpoints.most_common())
+        retries = f", повторов {self.retries}" if self.retries else ""
+        return (
+            f"{self.name}: запросов к Marzban — {self.calls}, {self.duration * 1000:.0f} мс, "
+            f"{self.bytes} байт{retries} ({endpoints})"
+        )
+
+_current_flow: contextvars.ContextVar[Optional[CallFlow]] = contextvars.ContextVar('marzban_call_flow', default=None)
+
+@contextmanager
+def call_flow(name: str) -> Iterator[CallFlow]:
+    """Учет вызовов Marzban внутри операции
+
+    Вложенная операция (например, маршрут кнопки внутри общего обработчика
+    callback_query) не заводит отдельный учет, а уточняет имя внешней.
+    """
+    flow = _current_flow.get()
+    if flow is not None:
+        flow.name = name
+        yield flow
+        return
+
+    flow = CallFlow(name)
+    token = _current_flow.set(flow)
+    try:
+        yield flow
+    finally:
+        _current_flow.reset(token)
+        if flow.calls:
+            FLOW_CALLS.labels(flow.name).observe(flow.calls)
+            FLOW_DURATION.labels(flow.name).observe(flow.duration)
+            logger.info(f"Поток {flow.summary()}")
+
+def record_call(method: str, endpoint: str, status: str, duration: float, size: int, retries: int,
+                slow_threshold: float = 1.0):
+    """Учет одного HTTP-запроса к Marzban; запросы дольше slow_threshold секунд пишутся в лог"""
+    label = f"{method} {endpoint}"
+    if retries:
+        REQUEST_RETRIES.labels(method, endpoint).inc(retries)
+    if size:
+        RESPONSE_BYTES.labels(method, endpoint).inc(size)
+
+    flow = _current_flow.get()
+    if flow is not None:
+        flow.calls += 1
+        flow.duration += duration
+        flow.bytes += size
+        flow.retries += retries
+        flow.endpoints[label] += 1
+
+    if duration >= slow_threshold:
+        context = f" в операции {flow.name}" if flow is not None else ""
+        logger.warning(
+            f"Медленный вызов Marzban{context}: {label} → {status}, "
+            f"{duration * 1000:.0f} мс, {size} байт, повторов {retries}"
+        )
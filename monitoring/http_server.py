@@ -0,0 +1,48 @@
+import logging
+from typing import Optional
+
+from .metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+class MetricsServer:
+    """HTTP-эндпоинт /metrics для Prometheus (aiohttp, в том же event loop, что и бот)"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self) -> bool:
+        try:
+            from aiohttp import web
+        except ImportError:
+            logger.warning("aiohttp не установлен, эндпоинт метрик не запущен")
+            return False
+
+        async def handle_metrics(request):
+            return web.Response(
+                body=self.registry.render().encode('utf-8'),
+                headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+            )
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.host, self.port).start()
+        except OSError as e:
+            logger.error(f"Не удалось открыть порт метрик {self.host}:{self.port}: {e}")
+            await self._runner.cleanup()
+            self._runner = None
+            return False
+
+        logger.info(f"📈 Метрики доступны на http://{self.host}:{self.port}/metrics")
+        return True
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
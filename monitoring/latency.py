@@ -0,0 +1,194 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from config import get_config
+from .calls import call_flow
+from .metrics import histogram_samples, metrics
+from .tracing import tracer
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы в секундах: от 1 мс до ~2 мин с шагом 25%,
+# поэтому ошибка перцентиля не больше одной корзины (~25%)
+_BOUNDS: List[float] = []
+_bound = 0.001
+while _bound < 120:
+    _BOUNDS.append(_bound)
+    _bound *= 1.25
+
+class _Bucket:
+    """Статистика операции за один интервал времени"""
+    __slots__ = ('counts', 'errors', 'total')
+
+    def __init__(self):
+        self.counts = [0] * (len(_BOUNDS) + 1)
+        self.errors = 0
+        self.total = 0.0
+
+class LatencyRecorder:
+    """Гистограммы задержек по операциям в памяти
+
+    Время делится на интервалы по bucket_seconds; каждая операция хранит
+    гистограммы только за последние max_window секунд, поэтому объем памяти
+    не растет со временем. Перцентили за окно считаются слиянием интервалов.
+    """
+
+    def __init__(self, bucket_seconds: int = 10, max_window: int = 3600):
+        self.bucket_seconds = bucket_seconds
+        self.max_buckets = max_window // bucket_seconds + 1
+        self._buckets: Dict[str, Dict[int, _Bucket]] = {}
+        self._totals: Dict[str, _Bucket] = {}  # накопительно с запуска, для /metrics
+        self._in_flight: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _bucket_index(self) -> int:
+        return int(time.monotonic() // self.bucket_seconds)
+
+    def start(self, name: str):
+        with self._lock:
+            self._in_flight[name] = self._in_flight.get(name, 0) + 1
+
+    def finish(self, name: str, duration: float, error: bool = False):
+        self.record(name, duration, error)
+        with self._lock:
+            self._in_flight[name] -= 1
+
+    def record(self, name: str, duration: float, error: bool = False):
+        """Учет одного выполнения операции длительностью duration секунд"""
+        index = self._bucket_index()
+        with self._lock:
+            buckets = self._buckets.setdefault(name, {})
+            bucket = buckets.get(index)
+            if bucket is None:
+                bucket = buckets[index] = _Bucket()
+                # Новый интервал начинается редко: заодно выбрасываем устаревшие
+                for old in [i for i in buckets if i <= index - self.max_buckets]:
+                    del buckets[old]
+            totals = self._totals.get(name)
+            if totals is None:
+                totals = self._totals[name] = _Bucket()
+            bin_index = bisect.bisect_left(_BOUNDS, duration)
+            for target in (bucket, totals):
+                target.counts[bin_index] += 1
+                target.total += duration
+                if error:
+                    target.errors += 1
+
+    def snapshot(self, window: int) -> Dict[str, Dict]:
+        """Сводка по операциям за последние window секунд"""
+        since = self._bucket_index() - window // self.bucket_seconds
+        result = {}
+        with self._lock:
+            for name, buckets in self._buckets.items():
+                counts = [0] * (len(_BOUNDS) + 1)
+                errors, total = 0, 0.0
+                for index, bucket in buckets.items():
+                    if index <= since:
+                        continue
+                    counts = [a + b for a, b in zip(counts, bucket.counts)]
+                    errors += bucket.errors
+                    total += bucket.total
+                count = sum(counts)
+                in_flight = self._in_flight.get(name, 0)
+                if not count and not in_flight:
+                    continue
+                result[name] = {
+                    'count': count,
+                    'errors': errors,
+                    'in_flight': in_flight,
+                    'avg': total / count if count else 0.0,
+                    'p50': _percentile(counts, count, 0.50),
+                    'p95': _percentile(counts, count, 0.95),
+                    'p99': _percentile(counts, count, 0.99),
+                }
+        return result
+
+    def collect(self, prefix: str = "bot_handler"):
+        """Семейства метрик Prometheus: накопительные гистограммы, ошибки и выполняющиеся вызовы"""
+        # Для экспорта корзины объединяются по 4 (шаг границ ~2.4x вместо 1.25x)
+        step = 4
+        bounds = [float(f"{_BOUNDS[min(i + step, len(_BOUNDS)) - 1]:.4g}") for i in range(0, len(_BOUNDS), step)]
+        durations, errors, in_flight = [], [], []
+        with self._lock:
+            for name, totals in self._totals.items():
+                labels = {"operation": name}
+                grouped = [sum(totals.counts[i:i + step]) for i in range(0, len(_BOUNDS), step)]
+                grouped.append(totals.counts[len(_BOUNDS)])
+                durations.extend(histogram_samples(labels, bounds, grouped, totals.total))
+                errors.append(("_total", labels, totals.errors))
+            for name, value in self._in_flight.items():
+                in_flight.append(("", {"operation": name}, value))
+        yield f"{prefix}_duration_seconds", "histogram", "Handler latency in seconds.", durations
+        yield f"{prefix}_errors", "counter", "Handler calls that raised an exception.", errors
+        yield f"{prefix}_in_flight", "gauge", "Handler calls currently running.", in_flight
+
+    def instrument(self, name: str, func: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        """Обертка асинхронного обработчика с учетом задержки, ошибок, числа выполняющихся вызовов,
+        обращений к Marzban и трассировкой (внешний обработчик открывает трейс апдейта)"""
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            self.start(name)
+            started = time.perf_counter()
+            error = False
+            try:
+                with call_flow(name), tracer.trace(name, **_update_attrs(args)):
+                    return await func(*args, **kwargs)
+            except BaseException:
+                error = True
+                raise
+            finally:
+                self.finish(name, time.perf_counter() - started, error)
+        return wrapper
+
+def _update_attrs(args) -> Dict[str, int]:
+    """Идентификаторы апдейта и пользователя для корневого спана"""
+    update = args[0] if args else None
+    attrs = {}
+    update_id = getattr(update, 'update_id', None)
+    if update_id is not None:
+        attrs['update_id'] = update_id
+    user = getattr(update, 'effective_user', None)
+    if user is not None:
+        attrs['user_id'] = user.id
+    return attrs
+
+def _percentile(counts: List[int], count: int, quantile: float) -> Optional[float]:
+    """Верхняя граница корзины, в которую попадает перцентиль"""
+    if not count:
+        return None
+    rank = quantile * count
+    seen = 0
+    for index, bucket_count in enumerate(counts):
+        seen += bucket_count
+        if seen >= rank:
+            return _BOUNDS[index] if index < len(_BOUNDS) else float('inf')
+    return float('inf')
+
+def handler_name(handler) -> str:
+    """Имя операции для обработчика python-telegram-bot"""
+    commands = getattr(handler, 'commands', None)
+    if commands:
+        return '/' + min(commands)
+    callback = getattr(handler.callback, '__name__', type(handler).__name__)
+    return f"{type(handler).__name__}:{callback}"
+
+def instrument_application(application, recorder: "LatencyRecorder"):
+    """Оборачивание всех зарегистрированных обработчиков приложения"""
+    wrapped = 0
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = recorder.instrument(handler_name(handler), handler.callback)
+            wrapped += 1
+    logger.info(f"Замер задержек включен для {wrapped} обработчиков")
+
+# Общий регистратор задержек
+latency = LatencyRecorder(
+    config.MONITORING['latency_bucket_seconds'],
+    max(config.MONITORING['latency_windows'].values())
+)
+metrics.collector(latency.collect)
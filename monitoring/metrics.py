@@ -0,0 +1,196 @@
+import bisect
+import math
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Границы гистограмм по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Sample = Tuple[str, Dict[str, str], float]  # (суффикс имени, метки, значение)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Дочерняя метрика для набора значений меток (в порядке labelnames)"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: ожидаются метки {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            yield "_total", dict(zip(self.labelnames, key)), child.value
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', '_lock')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными границами корзин"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, key))
+            yield from histogram_samples(labels, self.buckets, child.counts, child.sum)
+
+def histogram_samples(labels: Dict[str, str], bounds: Sequence[float], counts: Sequence[int],
+                      total: float) -> List[Sample]:
+    """Строки гистограммы: counts — количества по корзинам (последняя — выше всех границ)"""
+    samples = []
+    cumulative = 0
+    for bound, count in zip(bounds, counts):
+        cumulative += count
+        samples.append(("_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+    cumulative += counts[len(bounds)]
+    samples.append(("_bucket", {**labels, "le": "+Inf"}, cumulative))
+    samples.append(("_sum", labels, total))
+    samples.append(("_count", labels, cumulative))
+    return samples
+
+class MetricsRegistry:
+    """Метрики процесса в текстовом формате Prometheus
+
+    Счетчики и гистограммы обновляются в местах событий; значения, которые
+    уже хранятся в других объектах (кеш, очередь БД, память процесса),
+    считываются функциями-сборщиками в момент запроса /metrics.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Iterable[Sample]]]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, func: Callable[[], Optional[float]]):
+        """Датчик, значение которого считывается функцией при каждом запросе"""
+        def collect():
+            value = func()
+            if value is not None:
+                yield name, "gauge", documentation, [("", {}, value)]
+        self._collectors.append(collect)
+
+    def collector(self, func: Callable[[], Iterable[Tuple[str, str, str, Iterable[Sample]]]]):
+        """Сборщик, возвращающий семейства (имя, тип, описание, строки)"""
+        self._collectors.append(func)
+
+    def render(self) -> str:
+        lines = []
+
+        def family(name, kind, documentation, samples):
+            # В формате 0.0.4 имя в TYPE совпадает с именем строки, у счетчиков это *_total
+            header = f"{name}_total" if kind == "counter" else name
+            lines.append(f"# HELP {header} {documentation}")
+            lines.append(f"# TYPE {header} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+
+        for metric in list(self._metrics.values()):
+            family(metric.name, metric.kind, metric.documentation, metric.samples())
+        for collect in self._collectors:
+            for name, kind, documentation, samples in collect():
+                family(name, kind, documentation, samples)
+        return "\n".join(lines) + "\n"
+
+def process_rss_bytes() -> Optional[float]:
+    """Резидентная память процесса (Linux: /proc/self/statm)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+# Общий реестр метрик процесса
+metrics = MetricsRegistry()
+metrics.gauge("process_resident_memory_bytes", "Resident memory size in bytes.", process_rss_bytes)
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import os
+import sysconfig
+import tracemalloc
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from config import get_config
+
+if TYPE_CHECKING:
+    import pstats
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+PROFILE_SORTS = ('tottime', 'cumtime', 'ncalls')
+
+class ProfilerBusyError(RuntimeError):
+    """Сеанс профилирования уже идет"""
+
+def _timestamp() -> str:
+    return datetime.now().strftime('%Y%m%d_%H%M%S')
+
+class LiveProfiler:
+    """Профилирование работающего процесса по запросу (/profile, /memory, SIGUSR1/SIGUSR2)
+
+    cProfile включается в потоке event loop на заданное время, поэтому в профиль попадает
+    вся работа обработчиков под реальной нагрузкой; потоки БД и to_thread в него не входят.
+    Результаты сохраняются в каталог профилей: .prof (для pstats/snakeviz) и текстовый отчет.
+    """
+
+    def __init__(self, directory: str, max_seconds: int = 120, tracemalloc_frames: int = 1):
+        self.directory = directory
+        self.max_seconds = max_seconds
+        self.tracemalloc_frames = tracemalloc_frames
+        self._busy = False
+        self._memory_baseline: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def busy(self) -> bool:
+        return self._busy
+
+    def _path(self, prefix: str, suffix: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{prefix}_{_timestamp()}{suffix}")
+
+    async def profile(self, seconds: float, sort: str = 'tottime', limit: int = 15) -> Tuple[str, List[Dict]]:
+        """Сеанс cProfile на seconds секунд; возвращает путь к .prof и самые затратные функции"""
+        if self._busy:
+            raise ProfilerBusyError("Сеанс профилирования уже идет")
+        # cProfile и pstats нужны только здесь, их импорт не входит во время запуска бота
+        import cProfile
+        import pstats
+
+        seconds = min(seconds, self.max_seconds)
+        self._busy = True
+        profiler = cProfile.Profile()
+        try:
+            logger.info(f"Профилирование event loop на {seconds:g} с")
+            profiler.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.disable()
+        finally:
+            self._busy = False
+
+        path = self._path("profile", ".prof")
+        profiler.dump_stats(path)
+        stats = pstats.Stats(profiler)
+        with open(f"{path[:-len('.prof')]}.txt", 'w', encoding='utf-8') as f:
+            pstats.Stats(profiler, stream=f).sort_stats(sort).print_stats(100)
+        rows = self.top_functions(stats, sort, limit)
+        logger.info(f"Профиль сохранен: {path}")
+        return path, rows
+
+    @staticmethod
+    def top_functions(stats: 'pstats.Stats', sort: str = 'tottime', limit: int = 15) -> List[Dict]:
+        """Самые затратные функции профиля; sort — tottime, cumtime или ncalls"""
+        rows = []
+        for (filename, line, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            if filename == '~':
+                location = name  # встроенные функции: {method 'execute' of 'sqlite3.Cursor' objects}
+            else:
+                location = f"{_short_path(filename)}:{line}({name})"
+            rows.append({'function': location, 'ncalls': ncalls, 'tottime': tottime, 'cumtime': cumtime})
+        rows.sort(key=lambda row: row[sort], reverse=True)
+        return rows[:limit]
+
+    def memory_snapshot(self, limit: int = 10) -> Optional[Dict]:
+        """Снимок tracemalloc и разница с предыдущим
+
+        Первый вызов включает tracemalloc и запоминает базовый снимок (возвращает None);
+        следующие сравнивают с предыдущим снимком, чтобы видеть рост между вызовами.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+            self._memory_baseline = tracemalloc.take_snapshot()
+            logger.info(f"tracemalloc включен ({self.tracemalloc_frames} кадров)")
+            return None
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        path = self._path("memory", ".snapshot")
+        snapshot.dump(path)
+        diff = snapshot.compare_to(self._memory_baseline, 'lineno')
+        self._memory_baseline = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        logger.info(f"Снимок памяти сохранен: {path}")
+        return {
+            'path': path,
+            'current': current,
+            'peak': peak,
+            'top': [
+                {
+                    'location': f"{_short_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                    'size': stat.size,
+                    'size_diff': stat.size_diff,
+                    'count_diff': stat.count_diff,
+                }
+                for stat in diff[:limit]
+            ],
+        }
+
+    def stop_memory(self) -> bool:
+        """Выключение tracemalloc (он замедляет выделение памяти); False — не был включен"""
+        if not tracemalloc.is_tracing():
+            return False
+        tracemalloc.stop()
+        self._memory_baseline = None
+        logger.info("tracemalloc выключен")
+        return True
+
+def _short_path(filename: str) -> str:
+    """Путь относительно каталога проекта или site-packages"""
+    for marker in ('site-packages/', os.getcwd() + os.sep, sysconfig.get_paths()['stdlib'] + os.sep):
+        index = filename.find(marker)
+        if index != -1:
+            return filename[index + len(marker):]
+    return filename
+
+# Общий профилировщик процесса
+profiler = LiveProfiler(
+    config.MONITORING['profile_dir'],
+    config.MONITORING['profile_max_seconds'],
+    config.MONITORING['tracemalloc_frames']
+)
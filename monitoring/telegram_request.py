@@ -0,0 +1,20 @@
+from typing import Optional, Tuple
+
+from telegram.request import HTTPXRequest, RequestData
+
+from .tracing import tracer
+
+class TracingRequest(HTTPXRequest):
+    """HTTP-клиент Bot API, который добавляет вызовы Telegram в текущий трейс
+
+    Используется только для запросов обработчиков (sendMessage, editMessageText,
+    answerCallbackQuery...); getUpdates идет через отдельный клиент и не трассируется.
+    """
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         *args, **kwargs) -> Tuple[int, bytes]:
+        span = tracer.span(f"telegram {url.rsplit('/', 1)[-1]}")
+        with span:
+            code, payload = await super().do_request(url, method, request_data, *args, **kwargs)
+            span.set(status=code, bytes=len(payload))
+        return code, payload
@@ -0,0 +1,111 @@
+"""Просмотр трейсов из JSONL-файла трассировки
+
+Без аргументов выводит последние трейсы, с trace_id — каскадную диаграмму
+спанов (смещение от начала, длительность, полоса на шкале трейса).
+
+    python -m monitoring.trace_view
+    python -m monitoring.trace_view --user 123456789 --slowest
+    python -m monitoring.trace_view 9f86d081884c7d65
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+from config import get_config
+
+BAR_WIDTH = 40
+
+def load_traces(path: str) -> "OrderedDict[str, List[Dict]]":
+    """Спаны по трейсам, включая ротированные файлы (от старых к новым)"""
+    # RotatingFileHandler: traces.jsonl.1 — самая свежая копия, .N — самая старая
+    rotated = [name for name in glob.glob(f"{path}.*") if name.rsplit('.', 1)[-1].isdigit()]
+    rotated.sort(key=lambda name: int(name.rsplit('.', 1)[-1]), reverse=True)
+    traces: "OrderedDict[str, List[Dict]]" = OrderedDict()
+    for name in rotated + [path]:
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    continue  # недописанная строка при аварийной остановке
+                traces.setdefault(span['trace_id'], []).append(span)
+    return traces
+
+def _root(spans: List[Dict]) -> Dict:
+    return next((span for span in spans if span.get('parent_id') is None), spans[0])
+
+def print_list(traces, user_id=None, limit=20, slowest=False):
+    rows = []
+    for trace_id, spans in traces.items():
+        root = _root(spans)
+        attrs = root.get('attrs', {})
+        if user_id is not None and attrs.get('user_id') != user_id:
+            continue
+        rows.append((trace_id, root, attrs, len(spans)))
+    if slowest:
+        rows.sort(key=lambda row: row[1]['duration_ms'], reverse=True)
+    else:
+        rows = rows[::-1]
+    for trace_id, root, attrs, count in rows[:limit]:
+        started = datetime.fromtimestamp(root['start']).strftime('%d.%m %H:%M:%S')
+        error = f"  ❌ {attrs['error']}" if 'error' in attrs else ""
+        print(f"{trace_id}  {started}  {root['duration_ms']:>9.1f} мс  {count:>3} спанов  "
+              f"user={attrs.get('user_id', '-')}  {root['name']}{error}")
+    if not rows:
+        print("Трейсы не найдены")
+
+def print_waterfall(spans: List[Dict]):
+    root = _root(spans)
+    origin = root['start']
+    total = max(root['duration_ms'], 0.001)
+    children = defaultdict(list)
+    for span in spans:
+        children[span.get('parent_id')].append(span)
+
+    print(f"Трейс {root['trace_id']}: {root['name']}, {root['duration_ms']:.1f} мс, {root.get('attrs', {})}")
+
+    def walk(span, depth):
+        offset = (span['start'] - origin) * 1000
+        begin = min(int(offset / total * BAR_WIDTH), BAR_WIDTH - 1)
+        width = max(1, round(span['duration_ms'] / total * BAR_WIDTH))
+        bar = ' ' * begin + '█' * min(width, BAR_WIDTH - begin)
+        attrs = {key: value for key, value in span.get('attrs', {}).items()
+                 if key not in ('update_id', 'user_id')}
+        details = ' ' + ' '.join(f"{key}={value}" for key, value in attrs.items()) if attrs else ''
+        label = f"{'  ' * depth}{span['name']}"
+        print(f"{offset:>8.1f} {span['duration_ms']:>8.1f} мс |{bar:<{BAR_WIDTH}}| {label}{details}")
+        for child in sorted(children.get(span['span_id'], []), key=lambda item: item['start']):
+            walk(child, depth + 1)
+
+    walk(root, 0)
+
+def main():
+    monitoring = get_config().MONITORING
+    parser = argparse.ArgumentParser(description="Просмотр трейсов обработки апдейтов")
+    parser.add_argument("trace_id", nargs="?", help="трейс для каскадной диаграммы")
+    parser.add_argument("--file", default=monitoring['trace_path'], help="файл трассировки")
+    parser.add_argument("--user", type=int, help="только трейсы пользователя Telegram")
+    parser.add_argument("--slowest", action="store_true", help="сортировка по длительности")
+    parser.add_argument("-n", "--limit", type=int, default=20, help="число трейсов в списке")
+    args = parser.parse_args()
+
+    traces = load_traces(args.file)
+    if args.trace_id is None:
+        print_list(traces, args.user, args.limit, args.slowest)
+        return 0
+    spans = traces.get(args.trace_id)
+    if spans is None:
+        print(f"Трейс {args.trace_id} не найден в {args.file}")
+        return 1
+    print_waterfall(spans)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+from config import get_config
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+class _Trace:
+    """Собранные спаны одного трейса; записываются в файл одной порцией по завершении корня"""
+    __slots__ = ('trace_id', 'spans')
+
+    def __init__(self):
+        self.trace_id = f"{random.getrandbits(64):016x}"
+        self.spans: List[Dict[str, Any]] = []
+
+class Span:
+    """Интервал операции внутри трейса; используется как контекстный менеджер"""
+    __slots__ = ('tracer', 'trace', 'span_id', 'parent_id', 'name', 'attrs', 'start', '_started', '_token')
+
+    def __init__(self, tracer: "Tracer", trace: _Trace, name: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(32):08x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """Атрибуты, известные только после выполнения (статус ответа, число строк)"""
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._started
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.trace.spans.append({
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': round(self.start, 6),
+            'duration_ms': round(duration * 1000, 3),
+            'thread': threading.current_thread().name,
+            **({'attrs': self.attrs} if self.attrs else {}),
+        })
+        if self.parent_id is None:
+            self.tracer.export(self.trace)
+        return False
+
+class _NoopSpan:
+    """Заглушка для операций вне трейса: ничего не замеряет и не пишет"""
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP = _NoopSpan()
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar('trace_span', default=None)
+
+class Tracer:
+    """Трассировка обработки апдейтов в локальный JSONL-файл
+
+    Трейс начинается для доли sample_rate апдейтов; вызовы БД, Marzban и Telegram
+    внутри него становятся дочерними спанами. Вне трейса span() возвращает
+    общую заглушку, поэтому при низкой доле выборки накладные расходы — одно
+    чтение ContextVar на вызов.
+    """
+
+    def __init__(self, path: str, sample_rate: float = 0.0, max_bytes: int = 10 * 1024 * 1024,
+                 backup_count: int = 3):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._writer: Optional[logging.Logger] = None
+
+    def _get_writer(self) -> logging.Logger:
+        if self._writer is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes,
+                                          backupCount=self.backup_count, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            writer = logging.getLogger('bot.traces')
+            writer.propagate = False
+            writer.setLevel(logging.INFO)
+            writer.addHandler(handler)
+            self._writer = writer
+        return self._writer
+
+    def trace(self, name: str, force: bool = False, **attrs):
+        """Корневой спан (новый трейс) или дочерний, если трейс уже идет"""
+        parent = _current_span.get()
+        if parent is not None:
+            return Span(self, parent.trace, name, parent.span_id, attrs)
+        if not force and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            return _NOOP
+        return Span(self, _Trace(), name, None, attrs)
+
+    def span(self, name: str, **attrs):
+        """Дочерний спан текущего трейса; вне трейса — заглушка"""
+        parent = _current_span.get()
+        if parent is None:
+            return _NOOP
+        return Span(self, parent.trace, name, parent.span_id, attrs)
+
+    def export(self, trace: _Trace):
+        try:
+            writer = self._get_writer()
+            # Корень завершается последним: записываем спаны в порядке начала
+            for span in sorted(trace.spans, key=lambda item: item['start']):
+                writer.info(json.dumps(span, ensure_ascii=False, default=str))
+        except OSError as e:
+            logger.error(f"Не удалось записать трейс {trace.trace_id}: {e}")
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace.trace_id if span is not None else None
+
+# Общий трассировщик процесса
+tracer = Tracer(
+    config.MONITORING['trace_path'],
+    config.MONITORING['trace_sample_rate'],
+    config.MONITORING['trace_max_bytes'],
+    config.MONITORING['trace_backup_count']
+)
@@ -3,6 +3,8 @@ from typing import List
 import json
 from pathlib import Path
 
+PLANS_PATH = Path(__file__).parent / "texts" / "plans.json"
+
 @dataclass(frozen=True)
 class Plan:
     id: int
@@ -11,10 +13,7 @@ class Plan:
     duration_days: int
     description: str
 
-def load_plans() -> List[Plan]:
-    plans_path = Path(__file__).parent / "texts" / "plans.json"
+def load_plans(plans_path: Path = PLANS_PATH) -> List[Plan]:
     with open(plans_path, "r", encoding="utf-8") as f:
         data = json.load(f)
         return [Plan(**plan) for plan in data["plans"]]
-
-PLANS: List[Plan] = load_plans()
@@ -1,19 +1,30 @@
 from texts import get_text, get_json
 
-# Импортируем все необходимые константы из нового менеджера
-NO_ADMIN_RIGHTS_TEXT = get_text("messages.errors.NO_ADMIN_RIGHTS")
-ADMIN_NOTIFICATION_ERROR_TEXT = get_text("messages.errors.ADMIN_NOTIFICATION_ERROR")
-UNVERIFIED_USER_TEXT = get_text("messages.errors.UNVERIFIED_USER")
-NO_VPN_CONFIG_ERROR = get_text("messages.errors.NO_VPN_CONFIG")
-INVALID_USERNAME_TEXT = get_text("messages.errors.INVALID_USERNAME")
-USERNAME_TAKEN_TEXT = get_text("messages.errors.USERNAME_TAKEN")
-ACCOUNT_CREATING_TEXT = get_text("user.registration.ACCOUNT_CREATING")
-ACCOUNT_CREATION_ERROR_TEXT = get_text("messages.errors.ACCOUNT_CREATION_ERROR")
-CONNECTION_MESSAGE_TEMPLATE = get_text("user.subscription.CONNECTION_MESSAGE")
-
-# Загружаем форматы подписок из JSON
-SUBSCRIPTION_FORMATS = get_json("templates.subscription_formats")["formats"]
+# Тексты читаются из менеджера при первом обращении к константе (text_constants.NO_VPN_CONFIG_ERROR),
+# чтобы импорт модуля не загружал все файлы texts/
+_TEXT_KEYS = {
+    "NO_ADMIN_RIGHTS_TEXT": "messages.errors.NO_ADMIN_RIGHTS",
+    "ADMIN_NOTIFICATION_ERROR_TEXT": "messages.errors.ADMIN_NOTIFICATION_ERROR",
+    "UNVERIFIED_USER_TEXT": "messages.errors.UNVERIFIED_USER",
+    "NO_VPN_CONFIG_ERROR": "messages.errors.NO_VPN_CONFIG",
+    "INVALID_USERNAME_TEXT": "messages.errors.INVALID_USERNAME",
+    "USERNAME_TAKEN_TEXT": "messages.errors.USERNAME_TAKEN",
+    "ACCOUNT_CREATING_TEXT": "user.registration.ACCOUNT_CREATING",
+    "ACCOUNT_CREATION_ERROR_TEXT": "messages.errors.ACCOUNT_CREATION_ERROR",
+    "CONNECTION_MESSAGE_TEMPLATE": "user.subscription.CONNECTION_MESSAGE",
+}
 
 # Константы для источников данных
 API_PROVIDED_DESCRIPTION = "Ссылка получена из Marzban API"
 API_PROVIDED_SOURCE = "API"
+
+def __getattr__(name):
+    if name in _TEXT_KEYS:
+        value = get_text(_TEXT_KEYS[name])
+    elif name == "SUBSCRIPTION_FORMATS":
+        # Форматы подписок из JSON
+        value = get_json("templates.subscription_formats")["formats"]
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
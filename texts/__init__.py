@@ -1,14 +1,23 @@
 import os
 import json
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 class TextManager:
-    """Менеджер для работы с текстовыми сообщениями"""
+    """Менеджер для работы с текстовыми сообщениями
+
+    Файлы читаются при первом обращении к тексту, а не при импорте модуля.
+    """
     
     def __init__(self):
         self.base_path = os.path.dirname(__file__)
-        self._cache = {}
-        self._load_all_texts()
+        self._cache: Optional[Dict[str, Any]] = None
+    
+    @property
+    def cache(self) -> Dict[str, Any]:
+        """Все тексты по полным ключам; загружаются при первом обращении"""
+        if self._cache is None:
+            self._cache = self._load_all_texts()
+        return self._cache
     
     def _load_text_file(self, path: str) -> Dict[str, str]:
         """Загрузка текстового файла с сообщениями"""
@@ -27,8 +36,9 @@ class TextManager:
         with open(path, 'r', encoding='utf-8') as f:
             return json.load(f)
     
-    def _load_all_texts(self):
+    def _load_all_texts(self) -> Dict[str, Any]:
         """Загрузка всех текстовых файлов"""
+        cache = {}
         for root, _, files in os.walk(self.base_path):
             for file in files:
                 if file.endswith('.txt'):
@@ -37,18 +47,19 @@ class TextManager:
                     messages = self._load_text_file(os.path.join(root, file))
                     for key, value in messages.items():
                         full_key = f"{category}.{key}" if category else key
-                        self._cache[full_key] = value
+                        cache[full_key] = value
                 elif file.endswith('.json'):
                     relative_path = os.path.relpath(root, self.base_path)
                     category = relative_path.replace(os.sep, '.') if relative_path != '.' else ''
                     data = self._load_json_file(os.path.join(root, file))
                     key = os.path.splitext(file)[0]
                     full_key = f"{category}.{key}" if category else key
-                    self._cache[full_key] = data
+                    cache[full_key] = data
+        return cache
     
     def get(self, key: str, **kwargs) -> str:
         """Получение текста по ключу с форматированием"""
-        text = self._cache.get(key, key)
+        text = self.cache.get(key, key)
         if kwargs:
             try:
                 return text.format(**kwargs)
@@ -60,7 +71,7 @@ class TextManager:
     
     def get_json(self, key: str) -> Dict[str, Any]:
         """Получение данных из JSON файла"""
-        return self._cache.get(key, {})
+        return self.cache.get(key, {})
 
 # Создаем глобальный экземпляр
 text_manager = TextManager()
@@ -1,19 +1,35 @@
-from .formatters import *
-from .validators import *
-from .helpers import *
+"""Вспомогательные функции бота
 
-__all__ = [
-    'format_welcome_message',
-    'format_status_message', 
-    'format_payment_plans_message',
-    'format_payment_details_message',
-    'format_user_info_message',
-    'format_statistics_message',
-    'format_admin_notification',
-    'format_pending_payments_message',
-    'validate_username',
-    'validate_payment_amount',
-    'clean_phone_number',
-    'generate_invite_code',
-    'check_file_type'
-]
+Подмодули импортируются при первом обращении к имени: `import utils.helpers`
+не тянет за собой formatters (каталог тарифов, telegram) и validators.
+"""
+import importlib
+
+_LAZY_NAMES = {
+    'format_welcome_message': 'formatters',
+    'format_status_message': 'formatters',
+    'format_payment_plans_message': 'formatters',
+    'format_payment_details_message': 'formatters',
+    'format_user_info_message': 'formatters',
+    'format_statistics_message': 'formatters',
+    'format_admin_notification': 'formatters',
+    'format_pending_payments_message': 'formatters',
+    'validate_username': 'validators',
+    'validate_payment_amount': 'validators',
+    'clean_phone_number': 'validators',
+    'generate_invite_code': 'helpers',
+    'check_file_type': 'helpers',
+}
+
+__all__ = list(_LAZY_NAMES)
+
+def __getattr__(name):
+    module = _LAZY_NAMES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES))
@@ -28,7 +28,7 @@ def format_status_message(stats: Dict, username: str, marzban_api) -> tuple:
     if not stats:
         return "❌ Ошибка получения статистики", []
     
-    messages = get_json("formatters/status_messages.json")
+    messages = get_json("formatters.status_messages")
     safe_username = escape_html(username)
     status = escape_html(stats.get('status', 'unknown')).upper()
     
@@ -196,6 +196,120 @@ def format_pending_payments_message(requests: List[Dict]) -> str:
     
     return message
 
+def format_pending_payments_page(requests: List[Dict], total: int) -> str:
+    """Форматирование одной страницы очереди заявок для inline-навигации"""
+    if not requests:
+        return "✅ Нет ожидающих заявок на оплату."
+    
+    message = f"💰 ОЖИДАЮЩИЕ ЗАЯВКИ ({total}):\n\n"
+    
+    for req in requests:
+        created_date = datetime.fromisoformat(req['created_at']).strftime('%d.%m %H:%M')
+        message += f"🆔 #{req['id']} • {req['marzban_username']}\n"
+        message += f"💰 {req['amount']} руб. ({req['plan_id']}) • 📅 {created_date}\n"
+        message += f"📎 Чек: {'✅' if req.get('receipt_file_id') else '❌'}\n\n"
+    
+    return message
+
+def format_analytics_message(title: str, buckets: List[tuple], current: Dict, previous: Dict,
+                             breakdown: List[Dict]) -> str:
+    """Форматирование трендов из дневных агрегатов (без HTML-тегов)
+
+    buckets — список (подпись, агрегаты) по дням или неделям,
+    current/previous — суммы за текущий и предыдущий период.
+    """
+    def delta(key):
+        before, now = previous.get(key, 0), current.get(key, 0)
+        if not before:
+            return ""
+        return f" ({(now - before) / before * 100:+.0f}%)"
+
+    message = f"📈 АНАЛИТИКА: {title}\n\n"
+    message += f"💰 Выручка: {current.get('revenue', 0):.0f} руб.{delta('revenue')}\n"
+    message += f"🧾 Платежей: {current.get('payments', 0)}{delta('payments')}\n"
+    message += f"✅ Одобрено: {current.get('approvals', 0)} • ❌ Отклонено: {current.get('rejections', 0)}\n"
+    message += f"🆕 Регистраций: {current.get('registrations', 0)}{delta('registrations')}\n"
+    message += f"🔗 Привязок: {current.get('links', 0)}{delta('links')}\n\n"
+
+    max_revenue = max((totals.get('revenue', 0) for _, totals in buckets), default=0)
+    message += "📊 ДИНАМИКА ВЫРУЧКИ:\n"
+    for label, totals in buckets:
+        revenue = totals.get('revenue', 0)
+        bar = '▇' * round(revenue / max_revenue * 8) if max_revenue else ''
+        message += f"{label} {bar:<8} {revenue:.0f} руб. • 🆕 {totals.get('registrations', 0)}\n"
+
+    if breakdown:
+        message += "\n📋 ПО ПЛАНАМ И СПОСОБАМ ОПЛАТЫ:\n"
+        for row in breakdown:
+            message += f"• {row['plan']} / {row['payment_method'] or '-'}: {row['payments']} шт., {row['revenue']:.0f} руб.\n"
+
+    return message
+
+def format_perf_message(window: str, stats: Dict[str, Dict]) -> str:
+    """Таблица задержек обработчиков для /perf (HTML, моноширинный блок)"""
+    if not stats:
+        return f"⏱ Задержки за {window}: вызовов не было"
+
+    def ms(value):
+        if value is None:
+            return "-"
+        return "∞" if value == float('inf') else f"{value * 1000:.0f}"
+
+    lines = [f"{'операция':<28} {'N':>6} {'ош':>4} {'акт':>3} {'p50':>6} {'p95':>6} {'p99':>6}"]
+    for name, row in sorted(stats.items(), key=lambda item: item[1]['count'], reverse=True):
+        lines.append(
+            f"{name[:28]:<28} {row['count']:>6} {row['errors']:>4} {row['in_flight']:>3} "
+            f"{ms(row['p50']):>6} {ms(row['p95']):>6} {ms(row['p99']):>6}"
+        )
+    table = escape_html("\n".join(lines))
+    return f"⏱ <b>Задержки за {window}</b> (мс, верхняя граница корзины ±25%)\n<pre>{table}</pre>"
+
+def format_query_stats_message(order_by: str, report: List[Dict], totals: Dict) -> str:
+    """Самые затратные SQL-запросы для /db_stats (HTML)"""
+    message = (
+        f"🗄 <b>SQL с запуска</b>: {totals['statements']} запросов, "
+        f"{totals['seconds'] * 1000:.0f} мс, медленных {totals['slow']}\n"
+        f"Сортировка: {order_by}\n\n"
+    )
+    for row in report:
+        slow = f", медленных {row['slow']}" if row['slow'] else ""
+        message += (
+            f"<b>{row['count']}×</b> всего {row['total'] * 1000:.0f} мс, "
+            f"ср. {row['avg'] * 1000:.1f} мс, макс. {row['max'] * 1000:.0f} мс, "
+            f"строк {row['rows']}{slow}\n"
+            f"<code>{escape_html(row['sql'][:300])}</code>\n\n"
+        )
+    return message
+
+def format_profile_message(seconds: float, sort: str, rows: List[Dict], path: str) -> str:
+    """Самые затратные функции сеанса /profile (HTML, моноширинный блок)"""
+    lines = [f"{'вызовов':>8} {'своё мс':>8} {'всего мс':>9}  функция"]
+    for row in rows:
+        lines.append(
+            f"{row['ncalls']:>8} {row['tottime'] * 1000:>8.1f} {row['cumtime'] * 1000:>9.1f}  {row['function'][-60:]}"
+        )
+    table = escape_html("\n".join(lines))
+    return (
+        f"🔬 <b>Профиль event loop за {seconds:g} с</b> (сортировка {sort})\n"
+        f"<pre>{table}</pre>\n"
+        f"Файл: <code>{escape_html(path)}</code>"
+    )
+
+def format_memory_message(report: Dict) -> str:
+    """Рост памяти между снимками tracemalloc для /memory (HTML)"""
+    lines = [f"{'рост КБ':>9} {'всего КБ':>9} {'блоков':>7}  строка"]
+    for row in report['top']:
+        lines.append(
+            f"{row['size_diff'] / 1024:>+9.1f} {row['size'] / 1024:>9.1f} {row['count_diff']:>+7}  {row['location'][-60:]}"
+        )
+    table = escape_html("\n".join(lines))
+    return (
+        f"🧠 <b>Память (tracemalloc)</b>: сейчас {report['current'] / 1048576:.1f} МБ, "
+        f"пик {report['peak'] / 1048576:.1f} МБ\n"
+        f"Рост с предыдущего снимка:\n<pre>{table}</pre>\n"
+        f"Файл: <code>{escape_html(report['path'])}</code>"
+    )
+
 def format_admin_notification(username: str, telegram_id: int, telegram_username: str, trial_days: int) -> str:
     """Форматирование уведомления админам о новой регистрации"""
     safe_username = escape_html(username)
@@ -303,7 +417,7 @@ def determine_user_status(user_data: dict) -> str:
 
 def format_timestamp(timestamp: Optional[int]) -> str:
     """Форматирование временной метки"""
-    formats = get_json("formatters/datetime_formats.json")["timestamp_formats"]
+    formats = get_json("formatters.datetime_formats")["timestamp_formats"]
     
     if not timestamp:
         return formats["not_set"]
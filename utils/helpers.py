@@ -308,7 +308,7 @@ def format_user_status(status: str) -> Dict[str, str]:
     Returns:
         dict: Отформатированный статус с эмодзи
     """
-    mappings = get_json("formatters/status_mappings.json")["user_status"]
+    mappings = get_json("formatters.status_mappings")["user_status"]
     return mappings.get(status.lower(), mappings["unknown"])
 
 def safe_divide(dividend: float, divisor: float, default: float = 0.0) -> float:
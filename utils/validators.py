@@ -4,15 +4,12 @@ from typing import Optional, Union
 from datetime import datetime
 
 from config import get_config
-from plans import PLANS
+from catalog import catalog
 from texts import TextManager, get_json
 
 config = get_config()
 logger = logging.getLogger(__name__)
 
-# Преобразуем PLANS в dict для быстрого доступа по id
-PLANS_DICT = {str(plan.id): plan for plan in PLANS}
-
 def validate_username(username: str) -> tuple[bool, str]:
     """
     Валидация имени пользователя
@@ -23,7 +20,7 @@ def validate_username(username: str) -> tuple[bool, str]:
     Returns:
         tuple: (is_valid, error_message)
     """
-    messages = get_json("validators/validation_messages.json")["username"]
+    messages = get_json("validators.validation_messages")["username"]
     
     if not username:
         return False, messages["empty"]
@@ -71,7 +68,7 @@ def validate_payment_amount(amount: Union[str, int, float]) -> tuple[bool, str]:
     Returns:
         tuple: (is_valid, error_message)
     """
-    messages = get_json("validators/validation_messages.json")["payment"]
+    messages = get_json("validators.validation_messages")["payment"]
     
     try:
         amount_float = float(amount)
@@ -223,16 +220,12 @@ def validate_plan_id(plan_id: str) -> tuple[bool, str]:
     """
     if not plan_id:
         return False, "ID плана не может быть пустым"
-    if plan_id not in PLANS_DICT:
+    plan = catalog.get_plan(plan_id)
+    if plan is None:
         return False, f"План с ID '{plan_id}' не существует"
-    plan = PLANS_DICT[plan_id]
-    required_fields = ['name', 'price', 'duration_days']
-    for field in required_fields:
-        if field not in plan:
-            return False, f"План '{plan_id}' содержит некорректные данные (отсутствует {field})"
     try:
-        price = float(plan['price'])
-        days = int(plan['duration_days'])
+        price = float(plan.price)
+        days = int(plan.duration_days)
         if price <= 0:
             return False, f"План '{plan_id}' имеет некорректную цену"
         if days <= 0: